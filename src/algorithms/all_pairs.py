@@ -0,0 +1,200 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+np = None  # NumPy is optional and imported on first use; all-pairs mode is unavailable without it
+
+
+class AllPairsRouter:
+    """Dense distance and next-hop matrices over a CompactGraph.
+
+    The matrices are built with a NumPy-vectorized Floyd-Warshall (each pivot
+    relaxes all n^2 pairs in one batched operation). Adding or strengthening a
+    link is applied incrementally in O(n^2); removing or weakening a link that
+    carries shortest paths marks the matrices stale and triggers a rebuild,
+    in a background thread unless ``background`` is False. While stale,
+    ``ready`` is False and callers should fall back to Dijkstra.
+    """
+
+    def __init__(self, graph, background=True):
+        _import_numpy()
+        self.graph = graph
+        self.background = background
+        self.distances = None  # float64[n, n]
+        self.next_hops = None  # int32[n, n], -1 where unreachable
+        self.version = 0  # bumped on every topology change
+        self.built_version = -1  # version the matrices reflect
+        self.rebuilds = 0
+        self.incremental_updates = 0
+        self.last_rebuild_seconds = 0.0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1) if background else None
+        self._pending = None
+        self.schedule_rebuild()
+
+    @property
+    def ready(self):
+        return self.built_version == self.version
+
+    def path(self, source, destination):
+        """Return the index path from source to destination, or None if unreachable."""
+        with self._lock:
+            distances, next_hops = self.distances, self.next_hops
+        n = len(next_hops)
+        if source >= n or destination >= n:
+            # Nodes added since the last build have no links yet
+            return [source] if source == destination else None
+        if next_hops[source, destination] < 0:
+            return None
+        path = [source]
+        current = source
+        while current != destination:
+            current = int(next_hops[current, destination])
+            path.append(current)
+        return path
+
+    def edge_added(self, u, v, old_weight, weight):
+        """Apply a new or re-weighted bidirectional link u <-> v."""
+        self.version += 1
+        if not self._current(self.version - 1):
+            self.schedule_rebuild()
+            return
+        if old_weight is not None and weight > old_weight and self._carries_paths(u, v, old_weight):
+            self.schedule_rebuild()
+            return
+        with self._lock:
+            self._grow(len(self.graph))
+            self._relax_edge(u, v, weight)
+            self._relax_edge(v, u, weight)
+            self.built_version = self.version
+        self.incremental_updates += 1
+
+    def edge_removed(self, u, v, weight):
+        """Apply the removal of the bidirectional link u <-> v."""
+        self.version += 1
+        if not self._current(self.version - 1) or self._carries_paths(u, v, weight):
+            self.schedule_rebuild()
+            return
+        # No shortest path used the link, so the matrices are still exact
+        self.built_version = self.version
+        self.incremental_updates += 1
+
+    def invalidate(self):
+        """Mark the matrices stale after the graph changed wholesale, and rebuild them."""
+        self.version += 1
+        self.schedule_rebuild()
+
+    def schedule_rebuild(self):
+        """Rebuild the matrices from the current graph, in the background if enabled."""
+        version = self.version
+        weights = self._weight_matrix()
+        if self._executor is None:
+            self._rebuild(version, weights)
+        else:
+            self._pending = self._executor.submit(self._rebuild, version, weights)
+
+    def wait(self):
+        """Block until any pending background rebuild has finished."""
+        pending = self._pending
+        if pending is not None:
+            pending.result()
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+
+    def memory_usage(self):
+        """Bytes held by the distance and next-hop matrices."""
+        with self._lock:
+            if self.distances is None:
+                return 0
+            return self.distances.nbytes + self.next_hops.nbytes
+
+    def stats(self):
+        return {
+            'nodes': 0 if self.distances is None else len(self.distances),
+            'ready': self.ready,
+            'memory_bytes': self.memory_usage(),
+            'rebuilds': self.rebuilds,
+            'incremental_updates': self.incremental_updates,
+            'last_rebuild_seconds': self.last_rebuild_seconds
+        }
+
+    def _current(self, version):
+        return self.built_version == version and self.distances is not None
+
+    def _weight_matrix(self):
+        n = len(self.graph)
+        weights = np.full((n, n), np.inf)
+        np.fill_diagonal(weights, 0.0)
+        for u, v, bandwidth in self.graph.iter_edges():
+            weights[u, v] = min(weights[u, v], 1 / bandwidth)
+        return weights
+
+    def _rebuild(self, version, weights):
+        if version != self.version:
+            return  # a newer rebuild has been scheduled
+        started = time.perf_counter()
+        n = len(weights)
+        distances = weights
+        next_hops = np.where(np.isfinite(weights), np.arange(n, dtype=np.int32)[None, :], -1).astype(np.int32)
+        for k in range(n):
+            candidate = distances[:, k, None] + distances[None, k, :]
+            improved = candidate < distances
+            np.copyto(distances, candidate, where=improved)
+            np.copyto(next_hops, next_hops[:, k, None], where=improved)
+        with self._lock:
+            if version != self.version:
+                return
+            self.distances = distances
+            self.next_hops = next_hops
+            self.built_version = version
+        self.rebuilds += 1
+        self.last_rebuild_seconds = time.perf_counter() - started
+
+    def _grow(self, n):
+        size = len(self.distances)
+        if n <= size:
+            return
+        distances = np.full((n, n), np.inf)
+        distances[:size, :size] = self.distances
+        np.fill_diagonal(distances, 0.0)
+        next_hops = np.full((n, n), -1, dtype=np.int32)
+        next_hops[:size, :size] = self.next_hops
+        diagonal = np.arange(n)
+        next_hops[diagonal, diagonal] = diagonal
+        self.distances, self.next_hops = distances, next_hops
+
+    def _relax_edge(self, u, v, weight):
+        distances, next_hops = self.distances, self.next_hops
+        candidate = distances[:, u, None] + weight + distances[None, v, :]
+        improved = candidate < distances
+        if not improved.any():
+            return
+        np.copyto(distances, candidate, where=improved)
+        # Pairs now routed over u -> v leave along the first hop toward u
+        first_hop = next_hops[:, u].copy()
+        first_hop[u] = v
+        np.copyto(next_hops, first_hop[:, None], where=improved)
+
+    def _carries_paths(self, u, v, weight):
+        """True if some shortest path may run over u <-> v with the given weight."""
+        distances = self.distances
+        n = len(distances)
+        if u >= n or v >= n:
+            return False
+        for a, b in ((u, v), (v, u)):
+            through = distances[:, a, None] + weight + distances[None, b, :]
+            if np.any(np.isfinite(distances) & (through <= distances + 1e-12)):
+                return True
+        return False
+
+
+def _import_numpy():
+    global np
+    if np is None:
+        try:
+            import numpy
+        except ImportError:
+            raise RuntimeError("NumPy is required for all-pairs routing")
+        np = numpy
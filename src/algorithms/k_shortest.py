@@ -0,0 +1,65 @@
+import heapq
+
+
+def k_shortest_paths(graph, source, target):
+    """Yield (cost, path) loopless paths from source to target in cost order.
+
+    Implements Yen's algorithm over a CompactGraph using its 1/bandwidth
+    edge weights. Paths are produced lazily: the k-th path costs about k
+    point-to-point Dijkstra runs per hop of the previous path, so callers
+    should stop iterating once they have enough.
+
+    Links in a Topology are symmetric, so the shortest-path tree rooted at
+    target gives every node's exact distance to target. Banning edges only
+    makes paths longer, so those distances stay valid A* potentials for all
+    spur searches and keep each of them close to the optimal path.
+    """
+    potentials, _ = graph.shortest_path_tree(target)
+    first = graph.shortest_path(source, target, potentials=potentials)
+    if first is None:
+        return
+    accepted = [first[1]]
+    yield first
+
+    candidates = []
+    seen = {tuple(first[1])}
+
+    while True:
+        last = accepted[-1]
+        prefix_costs = _prefix_costs(graph, last)
+
+        # Branch off the previous path at every node except the target
+        for i in range(len(last) - 1):
+            spur_node = last[i]
+            root = last[:i + 1]
+
+            # Forbid the next hop of every accepted path sharing this root
+            banned_edges = set()
+            for path in accepted:
+                if len(path) > i + 1 and path[:i + 1] == root:
+                    banned_edges.add((path[i], path[i + 1]))
+            # Keep the spur loopless by forbidding the root's other nodes
+            banned_nodes = set(root[:-1])
+
+            spur = graph.shortest_path(spur_node, target, banned_nodes, banned_edges, potentials)
+            if spur is None:
+                continue
+            spur_cost, spur_path = spur
+            candidate = root[:-1] + spur_path
+            key = tuple(candidate)
+            if key not in seen:
+                seen.add(key)
+                heapq.heappush(candidates, (prefix_costs[i] + spur_cost, candidate))
+
+        if not candidates:
+            return
+        cost, path = heapq.heappop(candidates)
+        accepted.append(path)
+        yield cost, path
+
+
+def _prefix_costs(graph, path):
+    costs = [0.0]
+    for u, v in zip(path, path[1:]):
+        costs.append(costs[-1] + 1 / graph.get_bandwidth(u, v))
+    return costs
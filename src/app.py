@@ -1,9 +1,65 @@
+import argparse
+import os
+import sys
+
 from controller.sdn_controller import SDNController
-from cli.commands import start_cli
+from cli.commands import run_script, start_cli
+from cli.output import configure_output, flush_output
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="SDN controller")
+    parser.add_argument('--script', metavar='FILE',
+                        help="run commands from FILE ('-' for stdin) instead of the interactive CLI")
+    parser.add_argument('--stop-on-error', action='store_true', help="abort a script at the first failing line")
+    parser.add_argument('-q', '--quiet', action='store_true', help="only report warnings and errors")
+    parser.add_argument('--log-level', default='INFO', choices=('DEBUG', 'INFO', 'WARNING', 'ERROR'),
+                        help="DEBUG also reports every installed flow entry")
+    parser.add_argument('--log-format', default='text', choices=('text', 'json'))
+    parser.add_argument('--state', metavar='FILE',
+                        help="warm restart from this snapshot (if it exists) and the --journal written since")
+    parser.add_argument('--journal', metavar='FILE', help="replay and then append mutations to this journal")
+    parser.add_argument('--serve', metavar='[HOST:]PORT',
+                        help="serve the northbound JSON-lines API on this TCP port (after running --script, if any)")
+    parser.add_argument('--unix-socket', metavar='PATH', help="serve the northbound API on a Unix socket")
+    return parser.parse_args(argv)
 
-def main():
+def main(argv=None):
+    args = parse_args(argv)
+    serving = args.serve is not None or args.unix_socket is not None
+    # Piped stdin is treated as a script, unless the process is a server
+    script = args.script or (None if sys.stdin.isatty() or serving else '-')
+    configure_output(args.log_level, args.log_format, args.quiet, buffered=script is not None and not serving)
     controller = SDNController()
-    start_cli(controller)
+    if args.state or args.journal:
+        snapshot = args.state if args.state and os.path.exists(args.state) else None
+        controller.load_snapshot(snapshot, args.journal)
+        if args.journal:
+            controller.start_journal(args.journal)
+    
+    if script is None and not serving:
+        start_cli(controller)
+        return 0
+    
+    errors = 0
+    if script is not None:
+        try:
+            if script == '-':
+                run, errors = run_script(controller, sys.stdin, args.stop_on_error)
+            else:
+                with open(script) as f:
+                    run, errors = run_script(controller, f, args.stop_on_error)
+        finally:
+            flush_output()
+            
+    if serving:
+        from northbound.server import serve
+        host, port = '127.0.0.1', None
+        if args.serve is not None:
+            host, _, port = args.serve.rpartition(':')
+            host, port = host or '127.0.0.1', int(port)
+        serve(controller, host, port, args.unix_socket)
+        return 0
+    return 1 if errors else 0
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
@@ -0,0 +1,127 @@
+"""Synthetic topology generators for benchmarking.
+
+Every generator returns ``(switches, links)`` where links is a list of
+``(source, destination, bandwidth)`` tuples ready for ``add_link``. All of
+them run in roughly linear time so they can produce ~100k-switch networks.
+"""
+import math
+import random
+
+BANDWIDTHS = (1, 10, 25, 40, 100)
+
+
+def fat_tree(k, seed=0):
+    """k-ary fat tree: (k/2)^2 core switches and k pods of k/2 aggregation and k/2 edge switches."""
+    if k % 2:
+        raise ValueError("fat-tree arity k must be even")
+    rng = random.Random(seed)
+    half = k // 2
+    core = [f"c{i}" for i in range(half * half)]
+    switches = list(core)
+    links = []
+    for pod in range(k):
+        aggregation = [f"a{pod}_{i}" for i in range(half)]
+        edge = [f"e{pod}_{i}" for i in range(half)]
+        switches.extend(aggregation)
+        switches.extend(edge)
+        for i, agg in enumerate(aggregation):
+            # Aggregation switch i connects to core group i
+            for j in range(half):
+                links.append((agg, core[i * half + j], rng.choice(BANDWIDTHS)))
+            for e in edge:
+                links.append((e, agg, rng.choice(BANDWIDTHS)))
+    return switches, links
+
+
+def fat_tree_for_size(size, seed=0):
+    """Fat tree with the smallest even arity that has at least size switches."""
+    k = max(2, math.ceil(math.sqrt(size * 4 / 5)))
+    k += k % 2
+    return fat_tree(k, seed)
+
+
+def grid(rows, cols, torus=False, seed=0):
+    """rows x cols mesh; with torus=True the edges wrap around."""
+    rng = random.Random(seed)
+    switches = [f"g{r}_{c}" for r in range(rows) for c in range(cols)]
+    links = []
+    for r in range(rows):
+        for c in range(cols):
+            if c + 1 < cols or (torus and cols > 2):
+                links.append((f"g{r}_{c}", f"g{r}_{(c + 1) % cols}", rng.choice(BANDWIDTHS)))
+            if r + 1 < rows or (torus and rows > 2):
+                links.append((f"g{r}_{c}", f"g{(r + 1) % rows}_{c}", rng.choice(BANDWIDTHS)))
+    return switches, links
+
+
+def ring(n, seed=0):
+    """n switches in a single cycle."""
+    rng = random.Random(seed)
+    switches = [f"r{i}" for i in range(n)]
+    links = [(switches[i], switches[(i + 1) % n], rng.choice(BANDWIDTHS)) for i in range(n)]
+    return switches, links
+
+
+def random_geometric(n, radius=None, seed=0):
+    """Switches at random points in the unit square, linked when closer than radius."""
+    return waxman(n, alpha=None, beta=1.0, radius=radius, seed=seed)
+
+
+def waxman(n, alpha=0.15, beta=0.4, radius=None, seed=0):
+    """Waxman random graph over points in the unit square.
+
+    Two switches at distance d are linked with probability
+    ``beta * exp(-d / (alpha * sqrt(2)))``. Only pairs within ``radius`` are
+    considered (default: about 8 expected neighbors per switch), and points
+    are bucketed into cells of that size so generation stays linear in n.
+    With ``alpha=None`` every pair within radius is linked (random
+    geometric graph).
+    """
+    rng = random.Random(seed)
+    if radius is None:
+        radius = math.sqrt(8 / (math.pi * max(n, 1)))
+    points = [(rng.random(), rng.random()) for _ in range(n)]
+    switches = [f"w{i}" for i in range(n)]
+
+    cells = {}
+    for i, (x, y) in enumerate(points):
+        cells.setdefault((int(x / radius), int(y / radius)), []).append(i)
+
+    links = []
+    max_distance = math.sqrt(2)
+    for (cx, cy), members in cells.items():
+        neighbors = []
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                neighbors.extend(cells.get((cx + dx, cy + dy), ()))
+        for i in members:
+            xi, yi = points[i]
+            for j in neighbors:
+                if j <= i:
+                    continue
+                d = math.hypot(xi - points[j][0], yi - points[j][1])
+                if d > radius:
+                    continue
+                probability = beta if alpha is None else beta * math.exp(-d / (alpha * max_distance))
+                if rng.random() < probability:
+                    links.append((switches[i], switches[j], rng.choice(BANDWIDTHS)))
+    return switches, links
+
+
+def generate(name, size, seed=0):
+    """Build a named topology with roughly size switches."""
+    if name == 'fat_tree':
+        return fat_tree_for_size(size, seed)
+    if name in ('grid', 'torus'):
+        side = max(2, math.isqrt(size))
+        return grid(side, side, torus=(name == 'torus'), seed=seed)
+    if name == 'waxman':
+        return waxman(size, seed=seed)
+    if name == 'geometric':
+        return random_geometric(size, seed=seed)
+    if name == 'ring':
+        return ring(size, seed)
+    raise ValueError(f"unknown topology: {name}")
+
+
+TOPOLOGIES = ('fat_tree', 'grid', 'torus', 'waxman', 'geometric', 'ring')
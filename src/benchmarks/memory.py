@@ -0,0 +1,97 @@
+"""Memory footprint of active flows at scale.
+
+Usage (from the src directory):
+    python -m benchmarks.memory --topology fat_tree --size 2000 --flows 1000000
+
+Builds the topology first, then traces every allocation made while the
+flows are admitted and reports the bytes still held per flow, in total and
+by the source file that allocated them.
+"""
+import argparse
+import gc
+import json
+import logging
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+from benchmarks.generators import TOPOLOGIES, generate
+from controller.sdn_controller import SDNController
+
+BATCH = 50000
+
+
+def measure(topology, size, flows, seed=0):
+    """Admit flows on a synthetic topology; return bytes held per flow."""
+    rng = random.Random(seed)
+    switches, links = generate(topology, size, seed)
+    controller = SDNController()
+    for source, destination, bandwidth in links:
+        controller.add_link(source, destination, bandwidth)
+
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    started = time.perf_counter()
+    for start in range(0, flows, BATCH):
+        count = min(BATCH, flows - start)
+        controller.add_flows([tuple(rng.sample(switches, 2)) + (1.0, 1.0) for _ in range(count)])
+    elapsed = time.perf_counter() - started
+    gc.collect()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+
+    admitted = len(controller.active_flows)
+    by_file = {}
+    for stat in after.compare_to(before, 'filename'):
+        if stat.size_diff <= 0:
+            continue
+        filename = stat.traceback[0].filename
+        name = os.path.relpath(filename, os.path.dirname(os.path.dirname(__file__)))
+        if name.startswith('..'):
+            name = os.path.basename(filename)
+        by_file[name] = by_file.get(name, 0) + stat.size_diff
+    total = sum(by_file.values())
+    entries = len(controller.flow_table)
+    return {
+        'meta': {
+            'topology': topology,
+            'size': size,
+            'switches': len(switches),
+            'links': len(links),
+            'flows': admitted,
+            'flow_table_entries': entries,
+            'seed': seed,
+            'admission_s': elapsed
+        },
+        'bytes_total': total,
+        'bytes_per_flow': total / admitted if admitted else None,
+        'bytes_per_flow_by_file': {name: size / admitted for name, size in
+                                   sorted(by_file.items(), key=lambda item: -item[1])} if admitted else {}
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure controller memory per active flow")
+    parser.add_argument('--topology', choices=TOPOLOGIES, default='fat_tree')
+    parser.add_argument('--size', type=int, default=1000, help="approximate number of switches")
+    parser.add_argument('--flows', type=int, default=100000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="write results as JSON to this file")
+    args = parser.parse_args(argv)
+
+    logging.disable(logging.INFO)
+    report = measure(args.topology, args.size, args.flows, args.seed)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,227 @@
+"""Controller benchmark suite.
+
+Usage (from the src directory):
+    python -m benchmarks.run --topology fat_tree --size 10000 --output current.json
+    python -m benchmarks.run --topology fat_tree --size 10000 --compare baseline.json
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import sys
+import time
+
+from benchmarks.generators import TOPOLOGIES, generate
+from controller.sdn_controller import SDNController
+from controller.topology import Topology
+
+
+class Timer:
+    """Collects per-call latencies for one operation."""
+
+    def __init__(self):
+        self.samples = []
+
+    @contextlib.contextmanager
+    def time(self):
+        start = time.perf_counter()
+        yield
+        self.samples.append(time.perf_counter() - start)
+
+    def summary(self):
+        samples = sorted(self.samples)
+        count = len(samples)
+        if not count:
+            return {'count': 0}
+        total = sum(samples)
+        return {
+            'count': count,
+            'total_s': total,
+            'mean_us': total / count * 1e6,
+            'p50_us': samples[count // 2] * 1e6,
+            'p99_us': samples[min(count - 1, int(count * 0.99))] * 1e6,
+            'ops_per_s': count / total if total else None
+        }
+
+
+def run_suite(topology, size, flows, queries, failures, seed=0, domains=0):
+    """Build a controller on a synthetic topology and time its core operations.
+    
+    With domains set, batch admission and link failures are timed again with
+    partitioned routing over that many domain worker processes.
+    """
+    rng = random.Random(seed)
+    expired = 0
+    switches, links = generate(topology, size, seed)
+    controller = SDNController()
+    timers = {name: Timer() for name in (
+        'add_edge', 'get_shortest_path', 'get_all_paths', 'add_flow',
+        'add_flows_batch', 'link_failure', 'list_flows', 'failover', 'failover_fast_reroute', 'expire_flows',
+        'max_flow', 'max_flow_residual', 'add_flows_partitioned', 'link_failure_partitioned')}
+
+    # Controller methods still report progress on stdout; keep it out of the timings
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        # Time raw topology construction on a bare Topology
+        bare = Topology()
+        for source, destination, bandwidth in links:
+            with timers['add_edge'].time():
+                bare.add_edge(source, destination, bandwidth)
+        for _ in range(queries):
+            source, destination = rng.sample(switches, 2)
+            with timers['get_shortest_path'].time():
+                bare.get_shortest_path(source, destination)
+        for _ in range(max(1, queries // 20)):
+            source, destination = rng.sample(switches, 2)
+            with timers['get_all_paths'].time():
+                bare.get_all_paths(source, destination, k=3)
+        del bare
+
+        for switch in switches:
+            controller.add_switch(switch)
+        for source, destination, bandwidth in links:
+            controller.add_link(source, destination, bandwidth)
+        for _ in range(flows):
+            source, destination = rng.sample(switches, 2)
+            with timers['add_flow'].time():
+                controller.add_flow(source, destination, 1, 1)
+
+        requests = [tuple(rng.sample(switches, 2)) + (1, 1) for _ in range(flows)]
+        with timers['add_flows_batch'].time():
+            controller.add_flows(requests)
+
+        # Fail links that carry traffic, so each failure forces a reconvergence
+        loaded = [link for link, load in controller.link_index.loads.items() if load > 0]
+        for link in rng.sample(loaded, min(failures, len(loaded))):
+            if controller.topology.has_edge(*link):
+                with timers['link_failure'].time():
+                    controller.remove_link(*link)
+        _failover_samples(controller, timers['failover'])
+        
+        # Same again with precomputed backups, letting them catch up between failures
+        controller.set_fast_reroute('on')
+        controller.fast_reroute.wait()
+        loaded = [link for link, load in controller.link_index.loads.items() if load > 0]
+        for link in rng.sample(loaded, min(failures, len(loaded))):
+            if controller.topology.has_edge(*link):
+                controller.remove_link(*link)
+                controller.fast_reroute.wait()
+        _failover_samples(controller, timers['failover_fast_reroute'])
+        controller.set_fast_reroute('off')
+
+        with timers['list_flows'].time():
+            controller.flow_table.list_flows()
+            
+        # Flows with a hard timeout, all expired in one pass as if a minute had gone by
+        requests = [tuple(rng.sample(switches, 2)) + (1, 1, 0, 60) for _ in range(flows)]
+        expired = sum(1 for result in controller.add_flows(requests) if result['status'] == 'added')
+        with timers['expire_flows'].time():
+            controller.expire_flows(now=controller.flow_timeouts.clock() + 61)
+            
+        # Max flow between random pairs; the first query of each mode also builds the flow network
+        for _ in range(max(1, queries // 100)):
+            source, destination = rng.sample(switches, 2)
+            with timers['max_flow'].time():
+                controller.max_flow(source, destination)
+            with timers['max_flow_residual'].time():
+                controller.max_flow(source, destination, residual=True)
+            
+        if domains:
+            controller.set_partitioning(domains)
+            requests = [tuple(rng.sample(switches, 2)) + (1, 1) for _ in range(flows)]
+            with timers['add_flows_partitioned'].time():
+                controller.add_flows(requests)
+            loaded = [link for link, load in controller.link_index.loads.items() if load > 0]
+            for link in rng.sample(loaded, min(failures, len(loaded))):
+                if controller.topology.has_edge(*link):
+                    with timers['link_failure_partitioned'].time():
+                        controller.remove_link(*link)
+            controller.set_partitioning('off')
+
+    results = {name: timer.summary() for name, timer in timers.items()}
+    if flows:
+        # The batch is one call; report it per admitted flow as well
+        results['add_flows_batch']['per_flow_us'] = results['add_flows_batch']['total_s'] / flows * 1e6
+        if domains:
+            results['add_flows_partitioned']['per_flow_us'] = results['add_flows_partitioned']['total_s'] / flows * 1e6
+    if expired:
+        results['expire_flows']['per_flow_us'] = results['expire_flows']['total_s'] / expired * 1e6
+    meta = {
+        'topology': topology,
+        'size': size,
+        'switches': len(switches),
+        'links': len(links),
+        'flows': flows,
+        'queries': queries,
+        'failures': failures,
+        'seed': seed,
+        'domains': domains,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S')
+    }
+    return {'meta': meta, 'results': results}
+
+
+def _failover_samples(controller, timer):
+    """Move per-flow failover latencies (link failure to barrier acknowledged) into timer."""
+    for event in controller.fast_reroute.events:
+        timer.samples.extend([event['backup_seconds']] * event['backup'])
+        timer.samples.extend([event['seconds']] * event['recomputed'])
+    controller.fast_reroute.events.clear()
+
+
+def compare(current, baseline, threshold):
+    """Return (rows, regressions) comparing mean latency per operation."""
+    rows = []
+    regressions = []
+    for name, result in current['results'].items():
+        before = baseline.get('results', {}).get(name)
+        if not before or not before.get('count') or not result.get('count'):
+            continue
+        ratio = result['mean_us'] / before['mean_us'] if before['mean_us'] else float('infinity')
+        rows.append((name, before['mean_us'], result['mean_us'], ratio))
+        if ratio > 1 + threshold:
+            regressions.append(name)
+    return rows, regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the SDN controller on synthetic topologies")
+    parser.add_argument('--topology', choices=TOPOLOGIES, default='fat_tree')
+    parser.add_argument('--size', type=int, default=1000, help="approximate number of switches")
+    parser.add_argument('--flows', type=int, default=1000)
+    parser.add_argument('--queries', type=int, default=1000, help="shortest-path queries to time")
+    parser.add_argument('--failures', type=int, default=20, help="loaded links to fail")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--domains', type=int, default=0,
+                        help="also time admission and failures with partitioned routing over this many domains")
+    parser.add_argument('--output', help="write results as JSON to this file")
+    parser.add_argument('--compare', help="baseline JSON file to compare against")
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help="relative slowdown of mean latency counted as a regression")
+    args = parser.parse_args(argv)
+
+    report = run_suite(args.topology, args.size, args.flows, args.queries, args.failures, args.seed, args.domains)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        rows, regressions = compare(report, baseline, args.threshold)
+        print(f"{'operation':<20} {'baseline us':>12} {'current us':>12} {'ratio':>7}", file=sys.stderr)
+        for name, before, after, ratio in rows:
+            flag = "  REGRESSION" if name in regressions else ""
+            print(f"{name:<20} {before:>12.1f} {after:>12.1f} {ratio:>7.2f}{flag}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,3 +1,7 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
 def add_switch(controller, switch_id):
     controller.add_switch(switch_id)
     print(f"Switch {switch_id} added.")
@@ -11,6 +15,29 @@ def list_flows(controller):
     else:
         print("No flows found.")
 
+def add_flows(controller, filename):
+    """Admit every flow listed in a file, one 'source destination bandwidth priority' per line."""
+    requests = []
+    with open(filename) as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            parts = line.replace(',', ' ').split()
+            if len(parts) != 4:
+                print(f"Skipping line {line_no}: expected <source> <destination> <bandwidth> <priority>")
+                continue
+            try:
+                requests.append((parts[0], parts[1], float(parts[2]), float(parts[3])))
+            except ValueError:
+                print(f"Skipping line {line_no}: bandwidth and priority must be numbers")
+                
+    results = controller.add_flows(requests)
+    rejected = [r for r in results if r['status'] != 'added']
+    print(f"Added {len(results) - len(rejected)} flows, rejected {len(rejected)}.")
+    for result in rejected:
+        print(f"  {result['source']} → {result['destination']}: {result['reason']}")
+
 def compute_path(controller, start, end):
     path = controller.compute_shortest_path(start, end)
     if path:
@@ -18,37 +45,185 @@ def compute_path(controller, start, end):
     else:
         print(f"No path found from {start} to {end}.")
 
-def start_cli(controller):
-    """
-    Start the command-line interface for the SDN controller.
+class CommandError(ValueError):
+    """Raised when a command line cannot be parsed."""
+
+
+def build_commands(controller):
+    """Return the command table for a controller.
     
-    Args:
-        controller: The SDN controller instance
+    Controller methods are named rather than bound, and looked up when the
+    command runs, so wrappers installed later (e.g. by 'metrics on') apply.
     """
-    print("SDN Controller CLI")
-    print("Type 'help' for available commands")
-    
-    commands = {
+    return {
         "add_switch": {"func": add_switch, "args": ["switch_id"], "help": "Add a new switch to the network"},
-        "add_link": {"func": controller.add_link, "args": ["source", "destination", "bandwidth"], 
+        "add_link": {"func": "add_link", "args": ["source", "destination", "bandwidth"], 
                      "help": "Add a link between two switches"},
-        "remove_link": {"func": controller.remove_link, "args": ["source", "destination"],
+        "remove_link": {"func": "remove_link", "args": ["source", "destination"],
                        "help": "Remove a link between two switches"},
-        "list_switches": {"func": controller.list_switches, "args": [], 
+        "list_switches": {"func": "list_switches", "args": [], 
                          "help": "List all switches in the network"},
         "list_flows": {"func": list_flows, "args": [], "help": "List all active flows"},
-        "add_flow": {"func": controller.add_flow, "args": ["source", "destination", "bandwidth", "priority"],
+        "add_flow": {"func": "add_flow", "args": ["source", "destination", "bandwidth", "priority"],
                     "help": "Add a new flow between source and destination"},
+        "add_flows": {"func": add_flows, "args": ["filename"],
+                      "help": "Add flows in bulk from a file of 'source destination bandwidth priority' lines"},
+        "add_flow_split": {"func": "add_flow_split", "args": ["source", "destination", "bandwidth", "priority"],
+                           "help": "Add a flow split across equal-cost paths with spare capacity"},
+        "add_timed_flow": {"func": "add_flow",
+                           "args": ["source", "destination", "bandwidth", "priority", "idle_timeout", "hard_timeout"],
+                           "help": "Add a flow that expires after idle/hard timeouts in seconds (0 = none)"},
+        "remove_flow": {"func": "remove_flow", "args": ["flow_id"],
+                        "help": "Remove an active flow and its flow table entries"},
+        "routing_mode": {"func": "set_routing_mode", "args": ["mode"],
+                         "help": "Set routing mode: 'shortest' or 'capacity'"},
+        "rebalance": {"func": "run_rebalance", "args": [],
+                      "help": "Move flows to lower the maximum link utilization"},
+        "fast_reroute": {"func": "set_fast_reroute", "args": ["mode"],
+                         "help": "Precompute backup paths for failover: 'on'/'link', 'node' or 'off'"},
+        "reoptimize": {"func": "run_reoptimize", "args": [],
+                       "help": "Move flows from backup paths back to their best path"},
         "compute_path": {"func": compute_path, "args": ["start", "end"], 
                         "help": "Compute shortest path between two nodes"},
-        "simulate_failure": {"func": controller.simulate_link_failure, "args": ["source", "destination"],
+        "simulate_failure": {"func": "simulate_link_failure", "args": ["source", "destination"],
                             "help": "Simulate a link failure between two switches"},
-        "show_topology": {"func": controller.visualize_topology, "args": [],
-                         "help": "Display the current network topology"},
-        "show_stats": {"func": controller.show_link_stats, "args": [],
+        "analyze_failures": {"func": "show_failure_analysis", "args": ["depth"],
+                             "help": "What-if sweep of single (1) or double (2) link failures"},
+        "max_flow": {"func": "show_max_flow", "args": ["source", "destination"],
+                     "help": "Show the max throughput between two switches and the links that limit it"},
+        "spare_capacity": {"func": "show_spare_capacity", "args": ["source", "destination"],
+                           "help": "Show how much more traffic fits between two switches, and the bottleneck"},
+        "show_topology": {"func": "visualize_topology", "args": [],
+                         "help": "Render the topology to topology.svg in the background"},
+        "render_topology": {"func": "visualize_topology", "args": ["filename"],
+                            "help": "Render the topology to an .svg, .png or .pdf file in the background"},
+        "show_stats": {"func": "show_link_stats", "args": [],
                       "help": "Show link utilization statistics"},
+        "top_links": {"func": "show_top_links", "args": ["k"],
+                      "help": "Show the k most utilized links"},
+        "links_above": {"func": "show_links_above", "args": ["percent"],
+                        "help": "Show the links utilized at or above a percentage"},
+        "link_history": {"func": "show_link_history", "args": ["source", "destination"],
+                         "help": "Show a link's sampled utilization, percentiles and trend"},
+        "link_trends": {"func": "show_link_trends", "args": ["k"],
+                        "help": "Show the k links whose utilization is rising fastest"},
+        "utilization_history": {"func": "set_utilization_history", "args": ["interval", "samples"],
+                                "help": "Sample link utilization every interval seconds, keeping samples per link"},
+        "show_path_cache": {"func": "show_path_cache_stats", "args": [],
+                            "help": "Show shortest-path cache hit/miss counters"},
+        "show_fast_reroute": {"func": "show_fast_reroute_stats", "args": [],
+                              "help": "Show backup path coverage and failover latency"},
+        "show_timeouts": {"func": "show_flow_timeouts", "args": [],
+                          "help": "Show flows with timeouts and expiry counts"},
+        "show_southbound": {"func": "show_southbound_stats", "args": [],
+                            "help": "Show flow-mod messages and bytes per reconvergence event"},
+        "partition": {"func": "set_partitioning", "args": ["domains"],
+                      "help": "Route with one worker process per domain: a domain count, 'auto' or 'off'"},
+        "partition_regions": {"func": "set_partition_regions", "args": ["filename"],
+                              "help": "Partition into the regions of a file of 'switch region' lines"},
+        "show_partition": {"func": "show_partition_stats", "args": [],
+                           "help": "Show domains, border switches and per-round routing time"},
+        "all_pairs": {"func": "set_all_pairs_mode", "args": ["mode"],
+                      "help": "Turn all-pairs routing tables on or off"},
+        "all_pairs_stats": {"func": "show_all_pairs_stats", "args": [],
+                            "help": "Show all-pairs table memory use and rebuild time"},
+        "metrics": {"func": "set_metrics", "args": ["mode"],
+                    "help": "Turn instrumentation on, off or reset it"},
+        "show_metrics": {"func": "show_metrics", "args": [],
+                         "help": "Show operation counters and latency percentiles"},
+        "dump_metrics": {"func": "dump_metrics", "args": ["filename"],
+                         "help": "Write metrics in Prometheus text format to a file"},
+        "serve_metrics": {"func": "serve_metrics", "args": ["port"],
+                          "help": "Serve Prometheus metrics over HTTP on localhost"},
+        "profile": {"func": "set_profiling", "args": ["mode"],
+                    "help": "Start (on) or stop and report (off) the cProfile hook"},
+        "save_snapshot": {"func": "save_snapshot", "args": ["filename"],
+                          "help": "Write a binary snapshot of the controller state"},
+        "load_snapshot": {"func": "load_snapshot", "args": ["filename"],
+                          "help": "Restore a snapshot into an empty controller"},
+        "journal": {"func": "start_journal", "args": ["filename"],
+                    "help": "Append every mutation to a journal file"},
         "exit": {"func": None, "args": [], "help": "Exit the CLI"}
     }
+
+
+def parse_command(commands, line):
+    """Split a command line into (cmd, args), converting numeric arguments.
+    
+    Raises:
+        CommandError: If the command is unknown or its arguments are invalid
+    """
+    parts = line.split()
+    cmd = parts[0].lower()
+    args = parts[1:]
+    
+    if cmd == "help" or cmd == "exit":
+        return cmd, args
+        
+    if cmd not in commands:
+        raise CommandError(f"Unknown command: {cmd}\nType 'help' to see available commands")
+        
+    command = commands[cmd]
+    if len(args) != len(command["args"]):
+        raise CommandError(f"Invalid arguments. Usage: {cmd} {' '.join([f'<{arg}>' for arg in command['args']])}")
+        
+    # Convert numeric arguments if needed
+    processed_args = []
+    for i, arg in enumerate(args):
+        if command["args"][i].endswith(("bandwidth", "priority", "timeout")):
+            try:
+                processed_args.append(float(arg))
+            except ValueError:
+                raise CommandError(f"Error: {command['args'][i]} must be a number")
+        elif command["args"][i] == "flow_id":
+            try:
+                processed_args.append(int(arg))
+            except ValueError:
+                raise CommandError(f"Error: {command['args'][i]} must be an integer")
+        else:
+            processed_args.append(arg)
+    return cmd, processed_args
+
+
+def dispatch(controller, commands, cmd, args):
+    """Run a parsed command, after removing any flows that have timed out and sampling link utilization."""
+    controller.expire_flows()
+    controller.sample_utilization()
+    # If the command is add_switch or compute_path, handle differently
+    if cmd == "add_switch":
+        add_switch(controller, args[0])
+    elif cmd == "list_flows":
+        list_flows(controller)
+    elif cmd == "add_flows":
+        add_flows(controller, args[0])
+    elif cmd == "compute_path":
+        compute_path(controller, args[0], args[1])
+    else:
+        # For other commands, call the function directly
+        func = commands[cmd]["func"]
+        if isinstance(func, str):
+            func = getattr(controller, func)
+        func(*args)
+
+
+def print_help(commands):
+    print("Available commands:")
+    for command, details in commands.items():
+        arg_str = " ".join([f"<{arg}>" for arg in details["args"]])
+        print(f"  {command} {arg_str} - {details['help']}")
+
+
+def start_cli(controller):
+    """
+    Start the command-line interface for the SDN controller.
+    
+    Args:
+        controller: The SDN controller instance
+    """
+    print("SDN Controller CLI")
+    print("Type 'help' for available commands")
+    
+    commands = build_commands(controller)
     
     while True:
         try:
@@ -57,56 +232,103 @@ def start_cli(controller):
             if not user_input:
                 continue
                 
-            parts = user_input.split()
-            cmd = parts[0].lower()
-            args = parts[1:]
+            cmd, args = parse_command(commands, user_input)
             
             if cmd == "help":
-                print("Available commands:")
-                for command, details in commands.items():
-                    arg_str = " ".join([f"<{arg}>" for arg in details["args"]])
-                    print(f"  {command} {arg_str} - {details['help']}")
+                print_help(commands)
                 continue
                 
             if cmd == "exit":
                 print("Exiting CLI...")
                 break
                 
-            if cmd not in commands:
-                print(f"Unknown command: {cmd}")
-                print("Type 'help' to see available commands")
-                continue
-                
-            command = commands[cmd]
-            if len(args) != len(command["args"]):
-                print(f"Invalid arguments. Usage: {cmd} {' '.join([f'<{arg}>' for arg in command['args']])}")
-                continue
-                
-            # Convert numeric arguments if needed
-            processed_args = []
-            for i, arg in enumerate(args):
-                if command["args"][i].endswith(("bandwidth", "priority")):
-                    try:
-                        processed_args.append(float(arg))
-                    except ValueError:
-                        print(f"Error: {command['args'][i]} must be a number")
-                        break
-                else:
-                    processed_args.append(arg)
-            else:
-                # If the command is add_switch or compute_path, handle differently
-                if cmd == "add_switch":
-                    add_switch(controller, processed_args[0])
-                elif cmd == "list_flows":
-                    list_flows(controller)
-                elif cmd == "compute_path":
-                    compute_path(controller, processed_args[0], processed_args[1])
-                else:
-                    # For other commands, call the function directly
-                    command["func"](*processed_args)
+            dispatch(controller, commands, cmd, args)
         
         except KeyboardInterrupt:
             print("\nExiting CLI...")
             break
+        except CommandError as e:
+            print(str(e))
+        except Exception as e:
+            print(f"Error: {str(e)}")
+
+
+def run_script(controller, lines, stop_on_error=False):
+    """
+    Run commands non-interactively, e.g. from a file or a stdin pipe.
+    
+    Runs of consecutive add_flow commands are admitted together through
+    controller.add_flows, so they share path computation and bulk updates;
+    expired flows are removed and utilization sampled once per batch, as
+    dispatch does per command. Errors are logged with their line number,
+    and an error admitting a batch with the line number of its first flow.
+    
+    Args:
+        controller: The SDN controller instance
+        lines: Iterable of command lines
+        stop_on_error: Stop at the first failing line instead of continuing
+        
+    Returns:
+        A (commands_run, errors) tuple
+    """
+    commands = build_commands(controller)
+    pending_flows = []  # [(line_no, (source, destination, bandwidth, priority))]
+    run = 0
+    errors = 0
+    
+    def flush_flows():
+        """Admit the pending add_flow lines; return False if the script should stop."""
+        nonlocal errors
+        if not pending_flows:
+            return True
+        try:
+            controller.expire_flows()
+            controller.sample_utilization()
+            results = controller.add_flows([request for _, request in pending_flows])
         except Exception as e:
-            print(f"Error: {str(e)}")
\ No newline at end of file
+            errors += 1
+            logger.error("line %d: %s", pending_flows[0][0], e)
+            pending_flows.clear()
+            return not stop_on_error
+        for (line_no, request), result in zip(pending_flows, results):
+            if result['status'] == 'added':
+                logger.info("Flow %s added from %s to %s with priority %s",
+                            result['id'], request[0], request[1], request[3],
+                            extra={'event': 'flow_added', 'flow_id': result['id'],
+                                   'source': request[0], 'destination': request[1]})
+            else:
+                errors += 1
+                logger.warning("line %d: Cannot add flow from %s to %s: %s",
+                               line_no, request[0], request[1], result['reason'],
+                               extra={'event': 'flow_rejected', 'source': request[0],
+                                      'destination': request[1]})
+        pending_flows.clear()
+        return True
+    
+    for line_no, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        try:
+            cmd, args = parse_command(commands, line)
+            if cmd == "add_flow":
+                run += 1
+                pending_flows.append((line_no, tuple(args)))
+                continue
+            if not flush_flows():
+                break
+            run += 1
+            if cmd == "exit":
+                break
+            if cmd == "help":
+                print_help(commands)
+            else:
+                dispatch(controller, commands, cmd, args)
+        except Exception as e:
+            errors += 1
+            logger.error("line %d: %s", line_no, e)
+            if stop_on_error:
+                pending_flows.clear()
+                break
+    flush_flows()
+    return run, errors
@@ -0,0 +1,58 @@
+import json
+import logging
+import sys
+
+# Structured fields controller log calls attach via ``extra``
+STRUCTURED_FIELDS = ('event', 'flow_id', 'flow_ids', 'source', 'destination', 'bandwidth', 'priority', 'path')
+
+OUTPUT_BUFFER_SIZE = 1 << 20
+
+
+class BufferedStreamHandler(logging.StreamHandler):
+    """StreamHandler that leaves flushing to flush_output() instead of flushing every record."""
+
+    def flush(self):
+        pass
+
+
+class JsonFormatter(logging.Formatter):
+    """Format records as one JSON object per line, including structured fields."""
+
+    def format(self, record):
+        data = {
+            'time': record.created,
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage()
+        }
+        for field in STRUCTURED_FIELDS:
+            if hasattr(record, field):
+                data[field] = getattr(record, field)
+        return json.dumps(data, default=str)
+
+
+def configure_output(level='INFO', fmt='text', quiet=False, buffered=False):
+    """Route controller logging to stdout.
+
+    Args:
+        level: Minimum level to emit (DEBUG shows per-hop flow entries)
+        fmt: 'text' for plain messages or 'json' for one JSON object per line
+        quiet: Only emit warnings and errors
+        buffered: Replace sys.stdout with a large write buffer, so scripted
+            runs are not bound by console I/O; flush it with flush_output()
+    """
+    if buffered:
+        sys.stdout = open(sys.stdout.fileno(), 'w', buffering=OUTPUT_BUFFER_SIZE,
+                          encoding=sys.stdout.encoding, closefd=False)
+    handler = BufferedStreamHandler(sys.stdout) if buffered else logging.StreamHandler(sys.stdout)
+    handler.setFormatter(JsonFormatter() if fmt == 'json' else logging.Formatter('%(message)s'))
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(logging.WARNING if quiet else getattr(logging, str(level).upper()))
+
+
+def flush_output():
+    sys.stdout.flush()
@@ -0,0 +1,206 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from itertools import combinations
+
+INFINITY = float('infinity')
+
+# Snapshot shared with worker processes: inherited copy-on-write when the
+# pool can fork safely, otherwise shipped once per worker by the initializer
+_SNAPSHOT = None
+_POTENTIALS = {}  # {destination: distances}, per worker process
+_POTENTIALS_MAX = 4096
+
+
+class NetworkSnapshot:
+    """Picklable point-in-time copy of the topology, link loads and active flows.
+
+    Everything is expressed over the topology's interned node indices. The
+    graph is a compacted CompactGraph copy; flows are parallel lists so a
+    worker can look up a flow's source, destination, bandwidth and path by
+    position.
+    """
+
+    def __init__(self, controller):
+        topology = controller.topology
+        self.graph = topology.graph.copy()
+        index = self.graph.index
+
+        self.flow_ids = []
+        self.sources = []
+        self.destinations = []
+        self.bandwidths = []
+        self.paths = []
+        self.link_flows = {}  # {(u, v): [flow position, ...]}
+        for flow_id, flow in controller.active_flows.items():
+            position = len(self.flow_ids)
+            path = tuple(index[node] for node in flow['path'])
+            self.flow_ids.append(flow_id)
+            self.sources.append(path[0])
+            self.destinations.append(path[-1])
+            self.bandwidths.append(flow['bandwidth'])
+            self.paths.append(path)
+            for link in zip(path, path[1:]):
+                self.link_flows.setdefault(link, []).append(position)
+
+        # Base loads per live directed link, plus the links ordered by utilization
+        self.loads = {}
+        self.capacities = {}
+        for u, v, bandwidth in self.graph.iter_edges():
+            load = controller.link_index.load((self.graph.names[u], self.graph.names[v]))
+            self.loads[(u, v)] = load
+            self.capacities[(u, v)] = bandwidth
+        self.by_utilization = sorted(self.loads, key=lambda link: self.loads[link] / self.capacities[link],
+                                     reverse=True)
+
+    def links(self):
+        """Return each bidirectional link once, as (u, v) with u < v."""
+        return [(u, v) for (u, v) in self.capacities if u < v and (v, u) in self.capacities]
+
+
+class FailureAnalyzer:
+    """Run what-if link failure scenarios against a snapshot, in parallel.
+
+    The live controller is never modified. N-1 analysis fails every link on
+    its own; N-2 analysis additionally fails every pair of links.
+    """
+
+    def __init__(self, controller, processes=None):
+        self.snapshot = NetworkSnapshot(controller)
+        self.processes = processes or os.cpu_count() or 1
+
+    def scenarios(self, depth=1, links=None):
+        """Return the failure scenarios to evaluate, as tuples of links."""
+        links = links if links is not None else self.snapshot.links()
+        scenarios = [(link,) for link in links]
+        if depth >= 2:
+            scenarios.extend(combinations(links, 2))
+        return scenarios
+
+    def run(self, depth=1, links=None):
+        """Evaluate every scenario and return one result dict per scenario."""
+        global _SNAPSHOT
+        scenarios = self.scenarios(depth, links)
+        _POTENTIALS.clear()
+        if self.processes <= 1 or len(scenarios) < 2:
+            _SNAPSHOT = self.snapshot
+            try:
+                return [_evaluate(scenario) for scenario in scenarios]
+            finally:
+                _SNAPSHOT = None
+
+        chunksize = max(1, len(scenarios) // (self.processes * 8))
+        methods = multiprocessing.get_all_start_methods()
+        if 'fork' in methods and threading.active_count() == 1:
+            # Workers inherit the snapshot without pickling it. Forking is only safe with no other
+            # thread running (fast-reroute backups, rendering, all-pairs builds), since a lock
+            # one of them holds would stay held forever in the child
+            _SNAPSHOT = self.snapshot
+            pool = ProcessPoolExecutor(self.processes, mp_context=multiprocessing.get_context('fork'))
+        else:
+            context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+            pool = ProcessPoolExecutor(self.processes, mp_context=context, initializer=_init_worker,
+                                       initargs=(self.snapshot,))
+        try:
+            with pool:
+                return list(pool.map(_evaluate, scenarios, chunksize=chunksize))
+        finally:
+            _SNAPSHOT = None
+
+
+def _init_worker(snapshot):
+    global _SNAPSHOT
+    _SNAPSHOT = snapshot
+    _POTENTIALS.clear()
+
+
+def _potentials(destination):
+    """Pre-failure distances to destination, cached per worker across scenarios."""
+    tree = _POTENTIALS.get(destination)
+    if tree is None:
+        if len(_POTENTIALS) >= _POTENTIALS_MAX:
+            _POTENTIALS.pop(next(iter(_POTENTIALS)))
+        # Links are symmetric, so the tree rooted at destination holds distances to it
+        tree = _POTENTIALS[destination] = _SNAPSHOT.graph.shortest_path_tree(destination)[0]
+    return tree
+
+
+def _evaluate(failed_links):
+    """Fail the given links in the worker's snapshot and reroute the flows that used them."""
+    snapshot = _SNAPSHOT
+    graph = snapshot.graph
+    names = graph.names
+
+    failed = set()
+    for u, v in failed_links:
+        failed.add((u, v))
+        failed.add((v, u))
+    affected = set()
+    for link in failed:
+        affected.update(snapshot.link_flows.get(link, ()))
+    affected = sorted(affected)
+
+    # Failures only lengthen paths, so pre-failure distances stay valid A*
+    # potentials; compute them before the links are disabled
+    potentials = {}
+    for position in affected:
+        destination = snapshot.destinations[position]
+        if destination not in potentials:
+            potentials[destination] = _potentials(destination)
+
+    # Disable the failed links in place; this graph copy is private to the worker
+    disabled = []
+    for a, b in failed:
+        slot = graph.find_slot(a, b)
+        if slot >= 0:
+            disabled.append((slot, graph.weights[slot]))
+            graph.weights[slot] = INFINITY
+
+    try:
+        deltas = {}
+        rerouted = []
+        dropped = []
+        for position in affected:
+            destination = snapshot.destinations[position]
+            bandwidth = snapshot.bandwidths[position]
+            old_path = snapshot.paths[position]
+            for link in zip(old_path, old_path[1:]):
+                deltas[link] = deltas.get(link, 0) - bandwidth
+
+            found = graph.shortest_path(snapshot.sources[position], destination,
+                                        potentials=potentials[destination])
+            if found is None:
+                dropped.append(snapshot.flow_ids[position])
+                continue
+            rerouted.append(snapshot.flow_ids[position])
+            new_path = found[1]
+            for link in zip(new_path, new_path[1:]):
+                deltas[link] = deltas.get(link, 0) + bandwidth
+    finally:
+        for slot, weight in disabled:
+            graph.weights[slot] = weight
+
+    # Peak utilization: changed links, plus the busiest link that did not change
+    peak, peak_link = 0.0, None
+    for link, delta in deltas.items():
+        if link in failed:
+            continue
+        utilization = (snapshot.loads[link] + delta) / snapshot.capacities[link]
+        if utilization > peak:
+            peak, peak_link = utilization, link
+    for link in snapshot.by_utilization:
+        if link in failed or link in deltas:
+            continue
+        utilization = snapshot.loads[link] / snapshot.capacities[link]
+        if utilization > peak:
+            peak, peak_link = utilization, link
+        break
+
+    return {
+        'failed_links': [(names[u], names[v]) for u, v in failed_links],
+        'rerouted': rerouted,
+        'dropped': dropped,
+        'peak_utilization': peak,
+        'peak_link': (names[peak_link[0]], names[peak_link[1]]) if peak_link else None
+    }
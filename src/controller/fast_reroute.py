@@ -0,0 +1,335 @@
+"""Fast reroute: precomputed backup paths installed the moment a link fails.
+
+Every protected flow gets a backup path that shares no link (or, in node
+mode, no intermediate switch) with its primary path. Backups are computed
+by a background worker on a copy of the graph, so neither admission nor
+topology changes wait for them. When a link fails, the failover installs
+the backups of the affected flows without running any routing, and the
+flows are queued for a lazy move back to their best path.
+"""
+import contextlib
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from controller.graph_core import INFINITY
+from controller.link_index import LinkFlowIndex
+from controller.metrics import LATENCY_BUCKETS, Histogram
+
+DISJOINT_MODES = ('link', 'node')
+EVENT_HISTORY = 100
+
+
+class FastReroute:
+    """Backup paths for a controller's flows, refreshed in the background.
+
+    The worker only ever reads its own copy of the graph and hands results
+    back under a lock. A backup is stored only if the flow still has the
+    primary path it was computed for, and is checked against the live
+    topology again before it is installed.
+    """
+
+    def __init__(self, topology, disjoint='link'):
+        self.topology = topology
+        self.enabled = False
+        self.disjoint = disjoint
+        self.primaries = {}  # {flow_id: primary path the backup protects}
+        self.backups = {}  # {flow_id: backup path}
+        self.backup_links = LinkFlowIndex()  # {(src, dst): flows whose backup uses the link}
+        self.stale = {}  # {flow_id: None} flows waiting for a backup
+        self.unprotected = {}  # {flow_id: None} flows with no disjoint path in the last refresh
+        self.suboptimal = {}  # {flow_id: None} flows left on a backup, to be moved back lazily
+        self.latency = Histogram(LATENCY_BUCKETS)  # seconds from link failure to each flow's reroute
+        self.events = deque(maxlen=EVENT_HISTORY)  # per-failure failover stats
+        self.refreshes = 0
+        self.last_refresh_seconds = 0.0
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pending = None  # Future of the latest batch handed to the worker
+        self._pending_ids = []  # flow IDs in that batch
+        self._generation = 0  # bumped on disable so late worker results are ignored
+        self._running = threading.Event()  # cleared while a failover is in progress
+        self._running.set()
+
+    def enable(self, flows, disjoint=None):
+        """Start protecting flows (an iterable of flow dicts) and every flow routed later."""
+        if disjoint is not None:
+            if disjoint not in DISJOINT_MODES:
+                raise ValueError(f"unknown disjointness: {disjoint} (expected 'link' or 'node')")
+            if disjoint != self.disjoint:
+                self._forget()
+                self.disjoint = disjoint
+        self.enabled = True
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='fast-reroute')
+        self.flows_routed(flows)
+
+    def disable(self):
+        """Stop protecting flows and drop every backup."""
+        self.enabled = False
+        self._forget()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        self._pending = None
+
+    def reset(self, flows):
+        """Drop every backup and protect flows afresh, e.g. after restoring a snapshot."""
+        if not self.enabled:
+            return
+        self._forget()
+        self.flows_routed(flows)
+
+    def flow_routed(self, flow):
+        """Note that a flow was admitted or moved; its backup is recomputed in the background."""
+        if not self.enabled:
+            return
+        flow_id = flow['id']
+        with self._lock:
+            self.primaries[flow_id] = flow['path']
+            self._drop_backup(flow_id)
+            self.unprotected.pop(flow_id, None)
+        self.stale[flow_id] = None
+
+    def flows_routed(self, flows):
+        """Note several admitted or moved flows, then start refreshing their backups."""
+        if not self.enabled:
+            return
+        for flow in flows:
+            self.flow_routed(flow)
+        self.schedule()
+
+    def flow_removed(self, flow_id):
+        """Forget a flow that is no longer active."""
+        with self._lock:
+            self.primaries.pop(flow_id, None)
+            self._drop_backup(flow_id)
+            self.unprotected.pop(flow_id, None)
+        self.stale.pop(flow_id, None)
+        self.suboptimal.pop(flow_id, None)
+
+    def flows_removed(self, flow_ids):
+        """Forget several flows that are no longer active."""
+        if not self.primaries and not self.stale and not self.suboptimal:
+            return
+        with self._lock:
+            for flow_id in flow_ids:
+                self.primaries.pop(flow_id, None)
+                self._drop_backup(flow_id)
+                self.unprotected.pop(flow_id, None)
+        for flow_id in flow_ids:
+            self.stale.pop(flow_id, None)
+            self.suboptimal.pop(flow_id, None)
+
+    def link_added(self):
+        """A new link may give unprotected flows a disjoint path."""
+        if not self.enabled or not self.unprotected:
+            return
+        with self._lock:
+            unprotected, self.unprotected = self.unprotected, {}
+        self.stale.update(unprotected)
+        self.schedule()
+
+    def link_removed(self, source, destination):
+        """Recompute the backups that ran over a removed link."""
+        if not self.enabled:
+            return
+        with self._lock:
+            flow_ids = (self.backup_links.flows_on((source, destination))
+                        + self.backup_links.flows_on((destination, source)))
+            for flow_id in flow_ids:
+                self._drop_backup(flow_id)
+            self.backup_links.drop_link((source, destination))
+            self.backup_links.drop_link((destination, source))
+        for flow_id in flow_ids:
+            self.stale[flow_id] = None
+        self.schedule()
+
+    def backup_for(self, flow):
+        """Return the flow's backup path if it can be installed right now, else None."""
+        flow_id = flow['id']
+        with self._lock:
+            backup = self.backups.get(flow_id)
+            if backup is None or self.primaries.get(flow_id) != flow['path']:
+                return None
+        has_edge = self.topology.has_edge
+        for link in zip(backup, backup[1:]):
+            if not has_edge(*link):
+                return None
+        return backup
+
+    @contextlib.contextmanager
+    def paused(self):
+        """Hold the worker between flows so a failover does not compete with it for the interpreter."""
+        self._running.clear()
+        try:
+            yield
+        finally:
+            self._running.set()
+
+    def take_suboptimal(self, max_flows=None):
+        """Remove and return up to max_flows flow IDs waiting to be moved back to their best path."""
+        if max_flows is None or max_flows >= len(self.suboptimal):
+            flow_ids, self.suboptimal = list(self.suboptimal), {}
+            return flow_ids
+        flow_ids = []
+        for flow_id in self.suboptimal:
+            if len(flow_ids) >= max_flows:
+                break
+            flow_ids.append(flow_id)
+        for flow_id in flow_ids:
+            del self.suboptimal[flow_id]
+        return flow_ids
+
+    def record_failover(self, link, backup_seconds, backup_flows, seconds, recomputed_flows, dropped_flows):
+        """Record one link failure: flows on backups were live after backup_seconds, rerouted ones after seconds."""
+        for _ in range(backup_flows):
+            self.latency.observe(backup_seconds)
+        for _ in range(recomputed_flows):
+            self.latency.observe(seconds)
+        self.events.append({
+            'link': link,
+            'flows': backup_flows + recomputed_flows + dropped_flows,
+            'backup': backup_flows,
+            'recomputed': recomputed_flows,
+            'dropped': dropped_flows,
+            'backup_seconds': backup_seconds,
+            'seconds': seconds
+        })
+
+    def schedule(self):
+        """Hand stale flows to the worker along with a copy of the current graph.
+        
+        At most one batch waits behind the one being computed: a batch that
+        has not started yet is withdrawn and merged into the new one.
+        """
+        if not self.enabled or not self.stale:
+            return
+        flow_ids, self.stale = self.stale, {}
+        if self._pending is not None and self._pending.cancel():
+            flow_ids = dict.fromkeys(self._pending_ids, None) | flow_ids
+        jobs = []
+        for flow_id in flow_ids:
+            path = self.primaries.get(flow_id)
+            if path is not None:
+                jobs.append((flow_id, path[0], path[-1], path))
+        if not jobs:
+            return
+        # Group flows by destination so each destination's distance tree is computed once
+        jobs.sort(key=lambda job: job[2])
+        self._pending_ids = [job[0] for job in jobs]
+        self._pending = self._executor.submit(self._refresh, self.topology.graph.copy(compact=False),
+                                              jobs, self.disjoint, self._generation)
+
+    def wait(self):
+        """Block until every flow routed so far has been given a backup (or found to have none)."""
+        self.schedule()
+        if self._pending is not None:
+            self._pending.result()
+
+    def stats(self):
+        with self._lock:
+            protected = len(self.backups)
+        pending = len(self.stale)
+        if self._pending is not None and not self._pending.done():
+            pending += len(self._pending_ids)
+        return {
+            'enabled': self.enabled,
+            'disjoint': self.disjoint,
+            'flows': len(self.primaries),
+            'protected': protected,
+            'unprotected': len(self.unprotected),
+            'pending': pending,
+            'suboptimal': len(self.suboptimal),
+            'refreshes': self.refreshes,
+            'last_refresh_seconds': self.last_refresh_seconds,
+            'failovers': self.latency.count,
+            'p50_seconds': self.latency.quantile(0.5),
+            'p99_seconds': self.latency.quantile(0.99)
+        }
+
+    def _refresh(self, graph, jobs, disjoint, generation):
+        """Worker: compute backups for jobs on a private graph copy."""
+        started = time.perf_counter()
+        results = []
+        tree_target = None
+        potentials = None
+        for i, (flow_id, source, destination, path) in enumerate(jobs):
+            self._running.wait()
+            # Exact distances to the destination make the banned-link searches run as A*
+            if destination != tree_target:
+                tree_target = destination
+                group = 1
+                while i + group < len(jobs) and jobs[i + group][2] == destination:
+                    group += 1
+                target = graph.index.get(destination)
+                potentials = graph.shortest_path_tree(target)[0] if group > 1 and target is not None else None
+            results.append((flow_id, path, backup_path(graph, path, disjoint, potentials)))
+            if len(results) >= 256:
+                self._store(results, generation)
+                results = []
+        self._store(results, generation)
+        self.refreshes += 1
+        self.last_refresh_seconds = time.perf_counter() - started
+
+    def _store(self, results, generation):
+        with self._lock:
+            if generation != self._generation:
+                return
+            for flow_id, path, backup in results:
+                if self.primaries.get(flow_id) != path:
+                    continue  # moved since; a newer refresh is queued
+                self._drop_backup(flow_id)
+                if backup is None:
+                    self.unprotected[flow_id] = None
+                    continue
+                self.backups[flow_id] = backup
+                self.backup_links.add_flow(flow_id, backup, 0)
+
+    def _drop_backup(self, flow_id):
+        backup = self.backups.pop(flow_id, None)
+        if backup is not None:
+            self.backup_links.remove_flow(flow_id, backup, 0)
+
+    def _forget(self):
+        with self._lock:
+            self._generation += 1
+            self.primaries = {}
+            self.backups = {}
+            self.backup_links = LinkFlowIndex()
+            self.unprotected = {}
+        self.stale = {}
+        self.suboptimal = {}
+
+
+def backup_path(graph, path, disjoint='link', potentials=None):
+    """Return the cheapest path between the ends of path that avoids its links, or None.
+
+    Args:
+        graph: CompactGraph to search
+        path: Primary path as a list of switch IDs
+        disjoint: 'link' to avoid the primary's links (in both directions),
+            'node' to also avoid its intermediate switches
+        potentials: Optional distances to the destination, to search with A*
+    """
+    index = graph.index
+    try:
+        hops = [index[node] for node in path]
+    except KeyError:
+        return None
+    if len(hops) < 2:
+        return None
+    banned_edges = set()
+    for u, v in zip(hops, hops[1:]):
+        banned_edges.add((u, v))
+        banned_edges.add((v, u))
+    banned_nodes = set(hops[1:-1]) if disjoint == 'node' else None
+    if potentials is not None and potentials[hops[0]] == INFINITY:
+        return None
+    found = graph.shortest_path(hops[0], hops[-1], banned_nodes=banned_nodes, banned_edges=banned_edges,
+                                potentials=potentials)
+    if found is None:
+        return None
+    names = graph.names
+    return [names[i] for i in found[1]]
@@ -0,0 +1,312 @@
+"""Column store for active flows.
+
+Flows are rows in parallel arrays (source, destination, bandwidth,
+priority) kept in flow ID order. Switches are stored as their interned
+index in the topology graph. A path is packed into a bytes string of
+32-bit node indices. Identical paths share one interned bytes object, so
+the flows of a popular source/destination pair pay for their path once.
+
+``FlowStore`` is a mapping from flow ID to a ``Flow`` view, so code written
+against the old ``{flow_id: flow dict}`` keeps working: ``flow['path']``
+decodes the path to switch IDs, and assigning to it re-encodes it.
+"""
+import bisect
+import sys
+from array import array
+from collections.abc import Mapping, MutableMapping
+
+COMPACT_MIN = 1024  # deleted rows tolerated before compacting, at least
+FIELDS = ('id', 'source', 'destination', 'path', 'bandwidth', 'priority')
+
+
+class FlowStore(MutableMapping):
+    """Active flows keyed by monotonically increasing integer flow IDs.
+
+    Deleting a flow only marks its row dead; rows are compacted away once
+    the dead ones outnumber the live ones. Flow IDs are never reused.
+    """
+
+    def __init__(self, graph):
+        self.graph = graph  # CompactGraph whose node indices encode switches
+        self.ids = array('q')
+        self.sources = array('i')
+        self.destinations = array('i')
+        self.bandwidths = array('d')
+        self.priorities = array('d')
+        self.paths = []  # interned packed path per row, None for a deleted row
+        self.groups = {}  # {flow_id: group ID} for flows split across paths
+        self.path_refs = {}  # {packed path: [shared copy, number of rows using it]}
+        self.next_id = 1
+        self.live = 0
+
+    def allocate_id(self):
+        """Reserve and return the next flow ID."""
+        flow_id = self.next_id
+        self.next_id += 1
+        return flow_id
+
+    def __len__(self):
+        return self.live
+
+    def __iter__(self):
+        paths = self.paths
+        for row, flow_id in enumerate(self.ids):
+            if paths[row] is not None:
+                yield flow_id
+
+    def __reversed__(self):
+        paths, ids = self.paths, self.ids
+        for row in range(len(ids) - 1, -1, -1):
+            if paths[row] is not None:
+                yield ids[row]
+
+    def __contains__(self, flow_id):
+        return self._find(flow_id) >= 0
+
+    def __getitem__(self, flow_id):
+        row = self._find(flow_id)
+        if row < 0:
+            raise KeyError(flow_id)
+        return Flow(self, flow_id, row)
+
+    def __setitem__(self, flow_id, flow):
+        """Insert a new flow from a mapping with the flow fields, or overwrite an existing one."""
+        row = self._find(flow_id)
+        if row >= 0:
+            for key in ('path', 'bandwidth', 'priority', 'group'):
+                if key in flow:
+                    self._set(row, flow_id, key, flow[key])
+            return
+        if self.ids and flow_id <= self.ids[-1]:
+            raise ValueError(f"flow IDs must increase: {flow_id} after {self.ids[-1]}")
+        index = self.graph.index
+        self.ids.append(flow_id)
+        self.sources.append(index[flow['source']])
+        self.destinations.append(index[flow['destination']])
+        self.bandwidths.append(flow['bandwidth'])
+        self.priorities.append(flow['priority'])
+        self.paths.append(self._intern(self.encode(flow['path'])))
+        if flow.get('group') is not None:
+            self.groups[flow_id] = flow['group']
+        self.next_id = max(self.next_id, flow_id + 1)
+        self.live += 1
+
+    def __delitem__(self, flow_id):
+        row = self._find(flow_id)
+        if row < 0:
+            raise KeyError(flow_id)
+        self._release(self.paths[row])
+        self.paths[row] = None
+        self.groups.pop(flow_id, None)
+        self.live -= 1
+        dead = len(self.ids) - self.live
+        if dead > max(COMPACT_MIN, self.live):
+            self.compact()
+
+    def pop(self, flow_id, *default):
+        """Remove a flow and return its fields as a plain dict."""
+        if flow_id not in self:
+            if default:
+                return default[0]
+            raise KeyError(flow_id)
+        flow = dict(self[flow_id])
+        del self[flow_id]
+        return flow
+
+    def remove(self, flow_ids):
+        """Delete many flows; return (flow_id, path, bandwidth) for each one that was active."""
+        paths = self.paths
+        decoded = {}  # interned paths shared by several flows are decoded once
+        removed = []
+        for flow_id in flow_ids:
+            row = self._find(flow_id)
+            if row < 0:
+                continue
+            packed = paths[row]
+            path = decoded.get(packed)
+            if path is None:
+                path = decoded[packed] = self.decode(packed)
+            removed.append((flow_id, path, self.bandwidths[row]))
+            self._release(packed)
+            paths[row] = None
+            self.groups.pop(flow_id, None)
+        self.live -= len(removed)
+        if len(self.ids) - self.live > max(COMPACT_MIN, self.live):
+            self.compact()
+        return removed
+
+    def clear(self):
+        next_id = self.next_id
+        self.__init__(self.graph)
+        self.next_id = next_id
+
+    def encode(self, path):
+        """Pack a path of switch IDs into bytes of 32-bit node indices."""
+        index = self.graph.index
+        return array('i', [index[node] for node in path]).tobytes()
+
+    def decode(self, packed):
+        """Unpack an encoded path into a list of switch IDs."""
+        names = self.graph.names
+        return [names[i] for i in memoryview(packed).cast('i')]
+
+    def packed_path(self, flow_id):
+        """Return the shared encoded path of a flow, e.g. to compare paths without decoding them."""
+        row = self._find(flow_id)
+        if row < 0:
+            raise KeyError(flow_id)
+        return self.paths[row]
+
+    def load_columns(self, ids, sources, destinations, bandwidths, priorities, paths, groups=None, next_id=None):
+        """Bulk-load flows into an empty store from columns, e.g. read from a snapshot.
+
+        ``paths`` holds each flow's path as a sequence of node indices.
+        """
+        if len(self):
+            raise ValueError("columns can only be loaded into an empty store")
+        self.ids = array('q', ids)
+        self.sources = array('i', sources)
+        self.destinations = array('i', destinations)
+        self.bandwidths = array('d', bandwidths)
+        self.priorities = array('d', priorities)
+        intern = self._intern
+        self.paths = [intern(array('i', path).tobytes()) for path in paths]
+        self.groups = dict(groups or {})
+        self.live = len(self.ids)
+        last = self.ids[-1] + 1 if self.ids else 1
+        self.next_id = max(self.next_id, last, next_id or 1)
+
+    def compact(self):
+        """Drop deleted rows from the columns."""
+        keep = [row for row, path in enumerate(self.paths) if path is not None]
+        self.ids = array('q', [self.ids[row] for row in keep])
+        self.sources = array('i', [self.sources[row] for row in keep])
+        self.destinations = array('i', [self.destinations[row] for row in keep])
+        self.bandwidths = array('d', [self.bandwidths[row] for row in keep])
+        self.priorities = array('d', [self.priorities[row] for row in keep])
+        self.paths = [self.paths[row] for row in keep]
+
+    def memory_usage(self):
+        """Approximate bytes held by the columns and the interned paths."""
+        columns = (self.ids, self.sources, self.destinations, self.bandwidths, self.priorities)
+        size = sum(column.itemsize * len(column) for column in columns)
+        size += sys.getsizeof(self.paths) + sys.getsizeof(self.path_refs) + sys.getsizeof(self.groups)
+        size += sum(sys.getsizeof(packed) + sys.getsizeof(ref) for packed, ref in self.path_refs.items())
+        return size
+
+    def stats(self):
+        return {
+            'flows': self.live,
+            'rows': len(self.ids),
+            'distinct_paths': len(self.path_refs),
+            'next_id': self.next_id,
+            'memory_bytes': self.memory_usage(),
+        }
+
+    def _find(self, flow_id):
+        """Return the row of a live flow, or -1."""
+        if type(flow_id) is not int:
+            return -1
+        ids = self.ids
+        count = len(ids)
+        if not count:
+            return -1
+        # Rows line up with IDs until flows are deleted and compacted away
+        row = flow_id - ids[0]
+        if not (0 <= row < count and ids[row] == flow_id):
+            row = bisect.bisect_left(ids, flow_id)
+            if row == count or ids[row] != flow_id:
+                return -1
+        return row if self.paths[row] is not None else -1
+
+    def _get(self, row, flow_id, key):
+        if key == 'path':
+            return self.decode(self.paths[row])
+        if key == 'source':
+            return self.graph.names[self.sources[row]]
+        if key == 'destination':
+            return self.graph.names[self.destinations[row]]
+        if key == 'bandwidth':
+            return self.bandwidths[row]
+        if key == 'priority':
+            return normalize_priority(self.priorities[row])
+        if key == 'id':
+            return flow_id
+        if key == 'group' and flow_id in self.groups:
+            return self.groups[flow_id]
+        raise KeyError(key)
+
+    def _set(self, row, flow_id, key, value):
+        if key == 'path':
+            packed = self._intern(self.encode(value))
+            self._release(self.paths[row])
+            self.paths[row] = packed
+        elif key == 'bandwidth':
+            self.bandwidths[row] = value
+        elif key == 'priority':
+            self.priorities[row] = value
+        elif key == 'group':
+            if value is None:
+                self.groups.pop(flow_id, None)
+            else:
+                self.groups[flow_id] = value
+        else:
+            raise KeyError(f"flow field {key!r} cannot be changed")
+
+    def _intern(self, packed):
+        """Return the shared copy of a packed path, counting one more row using it."""
+        ref = self.path_refs.get(packed)
+        if ref is None:
+            self.path_refs[packed] = [packed, 1]
+            return packed
+        ref[1] += 1
+        return ref[0]
+
+    def _release(self, packed):
+        ref = self.path_refs[packed]
+        ref[1] -= 1
+        if not ref[1]:
+            del self.path_refs[packed]
+
+
+class Flow(Mapping):
+    """A live view of one flow in a FlowStore, read and written like the old flow dict."""
+
+    __slots__ = ('store', 'id', 'row')
+
+    def __init__(self, store, flow_id, row):
+        self.store = store
+        self.id = flow_id
+        self.row = row  # where the flow was last found; rows move when the store compacts
+
+    def __getitem__(self, key):
+        return self.store._get(self._locate(), self.id, key)
+
+    def __setitem__(self, key, value):
+        self.store._set(self._locate(), self.id, key, value)
+
+    def __iter__(self):
+        yield from FIELDS
+        if self.id in self.store.groups:
+            yield 'group'
+
+    def __len__(self):
+        return len(FIELDS) + (self.id in self.store.groups)
+
+    def __repr__(self):
+        return f"Flow({dict(self)!r})"
+
+    def _locate(self):
+        store = self.store
+        row = self.row
+        if row >= len(store.ids) or store.ids[row] != self.id or store.paths[row] is None:
+            row = store._find(self.id)
+            if row < 0:
+                raise KeyError(f"flow {self.id} is no longer active")
+            self.row = row
+        return row
+
+
+def normalize_priority(priority):
+    """Return a whole-number priority as an int, so it reads the same after a trip through the float column."""
+    return int(priority) if float(priority).is_integer() else priority
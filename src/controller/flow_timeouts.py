@@ -0,0 +1,205 @@
+"""Idle and hard flow timeouts, expired with a hierarchical timing wheel.
+
+A timing wheel files each timer into a slot by the tick it is due at.
+Level 0 has one slot per tick. Each higher level has slots SLOTS times as
+wide, and one of them is cascaded into the levels below whenever the level
+below wraps around. Collecting the timers due at a tick means emptying one
+slot, so expiry costs time in proportion to the timers that fire (plus the
+cascades, which move a timer at most once per level), not to the number of
+timers armed.
+
+Activity on a flow does not touch the wheel: it only updates the flow's
+last-used time. When the flow's timer fires, a flow used since then is
+filed again at its new idle deadline instead of expiring.
+"""
+import time
+
+TICK = 0.01  # seconds per level-0 slot; timers fire at most one tick late
+SLOTS = 256  # slots per level, a power of two
+LEVELS = 4  # 256 ** 4 ticks of 10 ms cover about 497 days; later timers are re-filed as they come closer
+
+
+class TimingWheel:
+    """Hierarchical timing wheel of keys due at given times.
+
+    Each key has at most one pending deadline. Cancelling or rescheduling a
+    key leaves its old slot entry behind; such stale entries are skipped
+    when their slot is reached.
+    """
+
+    def __init__(self, tick=TICK, slots=SLOTS, levels=LEVELS, start=0.0):
+        if slots & (slots - 1):
+            raise ValueError(f"slots per level must be a power of two: {slots}")
+        self.tick = tick
+        self.bits = slots.bit_length() - 1
+        self.mask = slots - 1
+        self.levels = levels
+        self.wheels = [[[] for _ in range(slots)] for _ in range(levels)]
+        self.deadlines = {}  # {key: tick it is due at}
+        self.origin = start
+        self.current = 0  # last tick processed; everything due at or before it has fired
+
+    def __len__(self):
+        return len(self.deadlines)
+
+    def __contains__(self, key):
+        return key in self.deadlines
+
+    def schedule(self, key, when):
+        """Arm (or re-arm) key to fire at time when; times already past fire on the next tick."""
+        due = -int((self.origin - when) // self.tick)  # ceiling, so a timer never fires early
+        if due <= self.current:
+            due = self.current + 1
+        self.deadlines[key] = due
+        self._file(key, due)
+
+    def cancel(self, key):
+        """Disarm key; return whether it was armed."""
+        return self.deadlines.pop(key, None) is not None
+
+    def advance(self, now):
+        """Process every tick up to time now and return the keys that fell due, in deadline order."""
+        target = int((now - self.origin) // self.tick)
+        deadlines = self.deadlines
+        wheel = self.wheels[0]
+        mask = self.mask
+        expired = []
+        while self.current < target:
+            if not deadlines:
+                # Nothing armed: skip the idle ticks, dropping any stale entries on the way
+                self.wheels = [[[] for _ in range(mask + 1)] for _ in range(self.levels)]
+                self.current = target
+                break
+            tick = self.current = self.current + 1
+            if not tick & mask:
+                self._cascade(tick)
+                wheel = self.wheels[0]
+            slot = wheel[tick & mask]
+            if slot:
+                wheel[tick & mask] = []
+                for key in slot:
+                    if deadlines.get(key) == tick:
+                        del deadlines[key]
+                        expired.append(key)
+        return expired
+
+    def _file(self, key, due):
+        delta = due - self.current
+        bits = self.bits
+        level = 0
+        while delta >> (bits * (level + 1)) and level < self.levels - 1:
+            level += 1
+        if delta >> (bits * (level + 1)):
+            # Beyond the top level's range: park it in the farthest slot and re-file it when that cascades
+            due = self.current + (1 << (bits * self.levels)) - 1
+        self.wheels[level][(due >> (bits * level)) & self.mask].append(key)
+
+    def _cascade(self, tick):
+        """Move the timers of the higher-level slots that start at tick down into the levels below."""
+        bits = self.bits
+        deadlines = self.deadlines
+        for level in range(1, self.levels):
+            index = (tick >> (bits * level)) & self.mask
+            slot = self.wheels[level][index]
+            if slot:
+                self.wheels[level][index] = []
+                for key in slot:
+                    due = deadlines.get(key)
+                    if due is not None and due >= tick:
+                        self._file(key, due)
+            if index:
+                break
+
+
+class FlowTimeouts:
+    """Idle and hard timeouts of the flows that have them, in the OpenFlow sense.
+
+    A flow expires once it has seen no activity for its idle timeout, or
+    once its hard timeout has passed since it was installed, whichever
+    comes first. A timeout of 0 means none.
+    """
+
+    def __init__(self, clock=time.monotonic, tick=TICK):
+        self.clock = clock
+        self.wheel = TimingWheel(tick, start=clock())
+        self.timeouts = {}  # {flow_id: [idle timeout, hard deadline or None, last used]}
+        self.expired = {'idle': 0, 'hard': 0}  # flows expired so far, by timeout
+
+    def __len__(self):
+        return len(self.timeouts)
+
+    def __contains__(self, flow_id):
+        return flow_id in self.timeouts
+
+    def add(self, flow_id, idle_timeout=0, hard_timeout=0, now=None):
+        """Start a flow's timeouts (in seconds) from now; with neither set the flow never expires."""
+        if idle_timeout < 0 or hard_timeout < 0:
+            raise ValueError("timeouts must not be negative")
+        if not idle_timeout and not hard_timeout:
+            self.remove(flow_id)
+            return
+        if now is None:
+            now = self.clock()
+        hard = now + hard_timeout if hard_timeout else None
+        self.timeouts[flow_id] = [idle_timeout, hard, now]
+        self.wheel.schedule(flow_id, _deadline(idle_timeout, hard, now)[0])
+
+    def remove(self, flow_id):
+        """Forget a flow's timeouts, e.g. because it was removed."""
+        if self.timeouts.pop(flow_id, None) is not None:
+            self.wheel.cancel(flow_id)
+
+    def touch(self, flow_ids, now=None):
+        """Note activity on flows, restarting their idle timeouts."""
+        if now is None:
+            now = self.clock()
+        timeouts = self.timeouts
+        for flow_id in flow_ids:
+            entry = timeouts.get(flow_id)
+            if entry is not None:
+                entry[2] = now
+
+    def remaining(self, flow_id, now=None):
+        """Return (idle timeout, seconds left of the hard timeout) for a flow, 0 meaning none."""
+        entry = self.timeouts.get(flow_id)
+        if entry is None:
+            return 0, 0
+        if now is None:
+            now = self.clock()
+        idle, hard, _ = entry
+        return idle, max(hard - now, 1e-3) if hard is not None else 0
+
+    def expire(self, now=None):
+        """Return the IDs of flows whose timeouts have passed, forgetting their timeouts."""
+        if now is None:
+            now = self.clock()
+        timeouts = self.timeouts
+        wheel = self.wheel
+        expired = []
+        for flow_id in wheel.advance(now):
+            entry = timeouts.get(flow_id)
+            if entry is None:
+                continue
+            deadline, reason = _deadline(*entry)
+            if deadline > now:
+                wheel.schedule(flow_id, deadline)  # used since the timer was set
+                continue
+            del timeouts[flow_id]
+            expired.append(flow_id)
+            self.expired[reason] += 1
+        return expired
+
+    def stats(self):
+        return {
+            'flows': len(self.timeouts),
+            'timers': len(self.wheel),
+            'expired_idle': self.expired['idle'],
+            'expired_hard': self.expired['hard'],
+        }
+
+
+def _deadline(idle, hard, used):
+    """Return (time, 'idle' or 'hard') at which a flow with these timeouts expires."""
+    if idle and (hard is None or used + idle < hard):
+        return used + idle, 'idle'
+    return hard, 'hard'
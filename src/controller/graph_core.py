@@ -0,0 +1,354 @@
+from array import array
+from collections.abc import Mapping, Set
+import heapq
+
+INFINITY = float('infinity')
+
+
+class CompactGraph:
+    """Directed graph over interned integer node IDs with CSR adjacency.
+
+    Edges live in contiguous arrays: the out-edges of node ``u`` occupy slots
+    ``offsets[u]:offsets[u + 1]`` of ``targets``/``weights``/``bandwidths``.
+    Updates are patched in without rebuilding: removed edges are tombstoned
+    in place (infinite weight) and edges missing from the CSR base go into a
+    small per-node overlay. The overlay and tombstones are folded back into
+    the arrays by ``compact()`` once they grow past a fraction of the graph.
+    """
+
+    def __init__(self, compact_ratio=0.25, compact_min=1024):
+        self.index = {}  # {node_id: int}
+        self.names = []  # [node_id]
+        self.offsets = array('l', [0])
+        self.targets = array('l')
+        self.weights = array('d')
+        self.bandwidths = array('d')
+        self.extra = {}  # {u: {v: bandwidth}} edges added since the last compaction
+        self.edge_count = 0
+        self.extra_count = 0
+        self.dead_count = 0
+        self.compact_ratio = compact_ratio
+        self.compact_min = compact_min
+        self.last_pops = 0  # nodes settled by the most recent Dijkstra run
+        self.version = 0  # bumped by every change to the nodes or edges
+
+    def __len__(self):
+        return len(self.names)
+
+    def add_node(self, node_id):
+        """Intern a node and return its integer index."""
+        idx = self.index.get(node_id)
+        if idx is None:
+            idx = len(self.names)
+            self.index[node_id] = idx
+            self.names.append(node_id)
+            self.offsets.append(self.offsets[-1])
+            self.version += 1
+        return idx
+
+    def find_slot(self, u, v):
+        """Return the CSR slot holding u -> v (live or tombstoned), or -1."""
+        targets = self.targets
+        for slot in range(self.offsets[u], self.offsets[u + 1]):
+            if targets[slot] == v:
+                return slot
+        return -1
+
+    def get_bandwidth(self, u, v):
+        """Return the bandwidth of u -> v, or None if there is no such edge."""
+        overlay = self.extra.get(u)
+        if overlay and v in overlay:
+            return overlay[v]
+        slot = self.find_slot(u, v)
+        if slot >= 0 and self.weights[slot] != INFINITY:
+            return self.bandwidths[slot]
+        return None
+
+    def has_edge(self, u, v):
+        return self.get_bandwidth(u, v) is not None
+
+    def set_edge(self, u, v, bandwidth):
+        """Add or update the directed edge u -> v."""
+        self.version += 1
+        slot = self.find_slot(u, v)
+        if slot >= 0:
+            if self.weights[slot] == INFINITY:
+                self.dead_count -= 1
+                self.edge_count += 1
+            self.bandwidths[slot] = bandwidth
+            self.weights[slot] = 1 / bandwidth
+            return
+        overlay = self.extra.setdefault(u, {})
+        if v not in overlay:
+            self.extra_count += 1
+            self.edge_count += 1
+        overlay[v] = bandwidth
+        self._maybe_compact()
+
+    def remove_edge(self, u, v):
+        """Remove the directed edge u -> v; return True if it existed."""
+        overlay = self.extra.get(u)
+        if overlay and v in overlay:
+            del overlay[v]
+            if not overlay:
+                del self.extra[u]
+            self.extra_count -= 1
+            self.edge_count -= 1
+            self.version += 1
+            return True
+        slot = self.find_slot(u, v)
+        if slot >= 0 and self.weights[slot] != INFINITY:
+            self.version += 1
+            self.weights[slot] = INFINITY
+            self.dead_count += 1
+            self.edge_count -= 1
+            self._maybe_compact()
+            return True
+        return False
+
+    def neighbors(self, u):
+        """Yield (v, weight, bandwidth) for every live out-edge of u."""
+        targets, weights, bandwidths = self.targets, self.weights, self.bandwidths
+        for slot in range(self.offsets[u], self.offsets[u + 1]):
+            weight = weights[slot]
+            if weight != INFINITY:
+                yield targets[slot], weight, bandwidths[slot]
+        overlay = self.extra.get(u)
+        if overlay:
+            for v, bandwidth in overlay.items():
+                yield v, 1 / bandwidth, bandwidth
+
+    def iter_edges(self):
+        """Yield (u, v, bandwidth) for every live edge."""
+        for u in range(len(self.names)):
+            for v, _, bandwidth in self.neighbors(u):
+                yield u, v, bandwidth
+
+    def compact(self):
+        """Fold the overlay and tombstones back into fresh CSR arrays."""
+        offsets = array('l', [0])
+        targets = array('l')
+        weights = array('d')
+        bandwidths = array('d')
+        for u in range(len(self.names)):
+            for v, weight, bandwidth in self.neighbors(u):
+                targets.append(v)
+                weights.append(weight)
+                bandwidths.append(bandwidth)
+            offsets.append(len(targets))
+        self.offsets, self.targets = offsets, targets
+        self.weights, self.bandwidths = weights, bandwidths
+        self.extra = {}
+        self.extra_count = 0
+        self.dead_count = 0
+
+    def copy(self, compact=True):
+        """Return an independent copy of the graph, compacted unless compact is False."""
+        clone = CompactGraph(self.compact_ratio, self.compact_min)
+        clone.index = dict(self.index)
+        clone.names = list(self.names)
+        clone.offsets = array('l', self.offsets)
+        clone.targets = array('l', self.targets)
+        clone.weights = array('d', self.weights)
+        clone.bandwidths = array('d', self.bandwidths)
+        clone.extra = {u: dict(overlay) for u, overlay in self.extra.items()}
+        clone.edge_count = self.edge_count
+        clone.extra_count = self.extra_count
+        clone.dead_count = self.dead_count
+        clone.version = self.version
+        if compact and (clone.extra_count or clone.dead_count):
+            clone.compact()
+        return clone
+
+    def shortest_path_tree(self, source):
+        """Run Dijkstra from source; return (distances, previous) arrays indexed by node."""
+        n = len(self.names)
+        distances = array('d', [INFINITY]) * n
+        previous = array('l', [-1]) * n
+        distances[source] = 0.0
+
+        offsets, targets, weights, extra = self.offsets, self.targets, self.weights, self.extra
+        heappush, heappop = heapq.heappush, heapq.heappop
+        priority_queue = [(0.0, source)]
+        pops = 0
+
+        while priority_queue:
+            current_distance, u = heappop(priority_queue)
+            if current_distance > distances[u]:
+                continue
+            pops += 1
+
+            # Tombstoned slots carry an infinite weight and never relax
+            for slot in range(offsets[u], offsets[u + 1]):
+                distance = current_distance + weights[slot]
+                v = targets[slot]
+                if distance < distances[v]:
+                    distances[v] = distance
+                    previous[v] = u
+                    heappush(priority_queue, (distance, v))
+
+            overlay = extra.get(u)
+            if overlay:
+                for v, bandwidth in overlay.items():
+                    distance = current_distance + 1 / bandwidth
+                    if distance < distances[v]:
+                        distances[v] = distance
+                        previous[v] = u
+                        heappush(priority_queue, (distance, v))
+
+        self.last_pops = pops
+        return distances, previous
+
+    def shortest_path(self, source, target, banned_nodes=None, banned_edges=None, potentials=None):
+        """Point-to-point Dijkstra avoiding the given nodes and (u, v) edges.
+
+        Returns ``(cost, path)`` with an index path, or None if target is
+        unreachable. The search stops as soon as target is settled. If
+        ``potentials`` holds lower bounds on each node's distance to target
+        (e.g. exact distances before any edges were banned), the search runs
+        as A* and only expands nodes near the optimal path.
+        """
+        banned_nodes = banned_nodes or ()
+        banned_edges = banned_edges or ()
+        if source in banned_nodes:
+            return None
+        if potentials is not None and potentials[source] == INFINITY:
+            return None
+        distances = {source: 0.0}
+        previous = {source: -1}
+        start_key = potentials[source] if potentials is not None else 0.0
+        priority_queue = [(start_key, 0.0, source)]
+        offsets, targets, weights, extra = self.offsets, self.targets, self.weights, self.extra
+        heappush, heappop = heapq.heappush, heapq.heappop
+
+        while priority_queue:
+            _, current_distance, u = heappop(priority_queue)
+            if current_distance > distances[u]:
+                continue
+            if u == target:
+                path = []
+                while u != -1:
+                    path.append(u)
+                    u = previous[u]
+                path.reverse()
+                return current_distance, path
+
+            out_edges = [(targets[slot], weights[slot]) for slot in range(offsets[u], offsets[u + 1])]
+            overlay = extra.get(u)
+            if overlay:
+                out_edges.extend((v, 1 / bandwidth) for v, bandwidth in overlay.items())
+            for v, weight in out_edges:
+                if v in banned_nodes or (banned_edges and (u, v) in banned_edges):
+                    continue
+                distance = current_distance + weight
+                if distance < distances.get(v, INFINITY):
+                    key = distance
+                    if potentials is not None:
+                        key += potentials[v]
+                        if key == INFINITY:
+                            continue
+                    distances[v] = distance
+                    previous[v] = u
+                    heappush(priority_queue, (key, distance, v))
+        return None
+
+    def path_from_tree(self, tree, destination):
+        """Reconstruct the index path to destination from a shortest-path tree."""
+        distances, previous = tree
+        if destination >= len(distances) or distances[destination] == INFINITY:
+            return None
+        path = []
+        current = destination
+        while current != -1:
+            path.append(current)
+            current = previous[current]
+        path.reverse()
+        return path
+
+    def memory_usage(self):
+        """Approximate bytes held by the CSR arrays (excluding the name table)."""
+        arrays = (self.offsets, self.targets, self.weights, self.bandwidths)
+        return sum(a.itemsize * len(a) for a in arrays)
+
+    def _maybe_compact(self):
+        pending = self.extra_count + self.dead_count
+        if pending > max(self.compact_min, self.compact_ratio * len(self.targets)):
+            self.compact()
+
+
+class NodeView(Set):
+    """Read-only set view over the interned node IDs."""
+
+    def __init__(self, graph):
+        self._graph = graph
+
+    def __contains__(self, node_id):
+        return node_id in self._graph.index
+
+    def __iter__(self):
+        return iter(self._graph.names)
+
+    def __len__(self):
+        return len(self._graph.names)
+
+    def __repr__(self):
+        return repr(set(self._graph.names))
+
+
+class EdgeView(Mapping):
+    """Read-only ``{(src, dst): {'bandwidth', 'weight'}}`` view over the CSR arrays."""
+
+    def __init__(self, graph):
+        self._graph = graph
+
+    def __getitem__(self, edge):
+        graph = self._graph
+        try:
+            source, destination = edge
+            u, v = graph.index[source], graph.index[destination]
+        except (KeyError, TypeError, ValueError):
+            raise KeyError(edge)
+        bandwidth = graph.get_bandwidth(u, v)
+        if bandwidth is None:
+            raise KeyError(edge)
+        return {'bandwidth': bandwidth, 'weight': 1 / bandwidth}
+
+    def __contains__(self, edge):
+        try:
+            self[edge]
+        except KeyError:
+            return False
+        return True
+
+    def __iter__(self):
+        names = self._graph.names
+        for u, v, _ in self._graph.iter_edges():
+            yield (names[u], names[v])
+
+    def __len__(self):
+        return self._graph.edge_count
+
+    def items(self):
+        names = self._graph.names
+        for u, v, bandwidth in self._graph.iter_edges():
+            yield (names[u], names[v]), {'bandwidth': bandwidth, 'weight': 1 / bandwidth}
+
+
+class AdjacencyView(Mapping):
+    """Read-only ``{node: [neighbors]}`` view over the CSR arrays."""
+
+    def __init__(self, graph):
+        self._graph = graph
+
+    def __getitem__(self, node_id):
+        graph = self._graph
+        u = graph.index.get(node_id)
+        if u is None:
+            return []
+        return [graph.names[v] for v, _, _ in graph.neighbors(u)]
+
+    def __iter__(self):
+        return iter(self._graph.names)
+
+    def __len__(self):
+        return len(self._graph.names)
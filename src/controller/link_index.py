@@ -0,0 +1,61 @@
+class LinkFlowIndex:
+    """Reverse index from each directed link to the flows routed over it.
+
+    Membership per link is an insertion-ordered dict used as a set, so adding
+    and removing a flow is O(1) per hop. The per-link dicts are long-lived:
+    ``link_stats`` entries share them instead of keeping their own lists.
+    """
+
+    def __init__(self):
+        self.links = {}  # {(src, dst): {flow_id: None}}
+        self.loads = {}  # {(src, dst): bandwidth of all flows on the link}
+
+    def members(self, link):
+        """Return the live membership dict for a link, creating it if needed."""
+        flows = self.links.get(link)
+        if flows is None:
+            flows = self.links[link] = {}
+            self.loads[link] = 0
+        return flows
+
+    def add_flow(self, flow_id, path, bandwidth):
+        """Record a flow on every directed link of its path."""
+        for link in zip(path, path[1:]):
+            self.members(link)[flow_id] = None
+            self.loads[link] += bandwidth
+
+    def remove_flow(self, flow_id, path, bandwidth):
+        """Forget a flow on every directed link of its path."""
+        for link in zip(path, path[1:]):
+            flows = self.links.get(link)
+            if flows is not None and flows.pop(flow_id, 0) is None:
+                self.loads[link] = max(0, self.loads[link] - bandwidth)
+
+    def remove_flows(self, flows):
+        """Forget many flows, given as (flow_id, path, bandwidth) tuples; return the links they used."""
+        links, loads = self.links, self.loads
+        touched = set()
+        for flow_id, path, bandwidth in flows:
+            hops = list(zip(path, path[1:]))
+            touched.update(hops)
+            for link in hops:
+                flows_on_link = links.get(link)
+                if flows_on_link is not None and flows_on_link.pop(flow_id, 0) is None:
+                    loads[link] -= bandwidth
+        for link in touched:
+            if loads.get(link, 0) < 0:
+                loads[link] = 0
+        return touched
+
+    def flows_on(self, link):
+        """Return the IDs of flows routed over a directed link."""
+        return list(self.links.get(link, ()))
+
+    def load(self, link):
+        """Return the total bandwidth of flows on a directed link."""
+        return self.loads.get(link, 0)
+
+    def drop_link(self, link):
+        """Forget a link entirely, e.g. after it has been removed."""
+        self.links.pop(link, None)
+        self.loads.pop(link, None)
@@ -0,0 +1,325 @@
+"""Max-flow / min-cut capacity analysis over the topology.
+
+``FlowNetwork`` flattens the topology's links into a residual network and
+runs Dinic's algorithm on it: a breadth-first search splits the network
+into levels by hop count from the source, and a depth-first search pushes
+blocking flows along level-increasing arcs until the destination is no
+longer reachable. The switches still reachable from the source then form
+the source side of a minimum cut, and the links leaving them are the
+bottleneck.
+
+``MaxFlowEngine`` keeps the network and the results of earlier queries
+until the topology (or, for residual capacity, the link loads) changes,
+and spreads batches of pairs over worker processes. ``bind`` separates
+reading the controller from the computation, so the latter can run off
+the thread that owns the controller.
+"""
+import copy
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+EPSILON = 1e-9  # residual capacity below this counts as saturated
+CACHE_MAX = 4096  # results kept per capacity mode
+
+# Network shared with worker processes: inherited copy-on-write when the
+# pool can fork safely, otherwise shipped once per worker by the initializer
+_NETWORK = None
+
+
+class FlowNetwork:
+    """Links of a CompactGraph as pairs of residual arcs, for Dinic's algorithm.
+
+    Each bidirectional link is one pair of arcs, arc ``2i`` from ``u`` to
+    ``v`` and arc ``2i + 1`` back, each the other's reverse, so pushing
+    flow over one frees capacity on the other (``a ^ 1``). The arcs leaving
+    node ``u`` are listed in ``arcs[u]``.
+    """
+
+    def __init__(self, graph):
+        self.names = list(graph.names)
+        self.index = dict(graph.index)
+        n = len(self.names)
+        heads = []
+        bandwidths = []
+        pairs = {}  # {(u, v): arc} for u < v, while pairing up the two directions
+        for u in range(n):
+            for v, _, bandwidth in graph.neighbors(u):
+                if u < v:
+                    arc = pairs.get((u, v))
+                    if arc is None:
+                        arc = pairs[(u, v)] = len(heads)
+                        heads.extend((v, u))
+                        bandwidths.extend((0.0, 0.0))
+                    bandwidths[arc] = bandwidth
+                elif u > v:
+                    arc = pairs.get((v, u))
+                    if arc is None:
+                        arc = pairs[(v, u)] = len(heads)
+                        heads.extend((u, v))
+                        bandwidths.extend((0.0, 0.0))
+                    bandwidths[arc + 1] = bandwidth
+        del pairs
+        self.heads = heads  # node each arc points to
+        self.bandwidths = bandwidths  # link bandwidth per arc, 0 for a missing direction
+        self.spare = None  # bandwidth per arc minus the link's load; see set_loads
+        self.arcs = [[] for _ in range(n)]
+        for arc, head in enumerate(heads):
+            self.arcs[heads[arc ^ 1]].append(arc)
+
+    def __len__(self):
+        return len(self.names)
+
+    def set_loads(self, loads):
+        """Compute the spare capacity of every arc from {(src, dst): load}."""
+        names, heads, bandwidths = self.names, self.heads, self.bandwidths
+        spare = list(bandwidths)
+        for arc, head in enumerate(heads):
+            load = loads.get((names[heads[arc ^ 1]], names[head]))
+            if load:
+                spare[arc] = max(bandwidths[arc] - load, 0.0)
+        self.spare = spare
+
+    def max_flow(self, source, destination, residual=False):
+        """Return (flow value, cut arcs) from node index source to destination.
+
+        Arcs offer their full bandwidth, or their spare capacity if residual
+        is set. The cut arcs leave the switches that can still reach spare
+        capacity towards the destination once the flow is at its maximum;
+        their capacities add up to the flow value.
+        """
+        n = len(self.names)
+        arcs, heads = self.arcs, self.heads
+        left = list(self.spare if residual else self.bandwidths)  # capacity left per arc
+        total = 0.0
+        while True:
+            levels = self._levels(source, destination, left)
+            if levels[destination] < 0:
+                break
+            # Blocking flow: walk level-increasing arcs from the source, retreating from dead ends
+            cursor = [0] * n  # next arc to try per node
+            path = []
+            node = source
+            while True:
+                if node == destination:
+                    pushed = min(left[arc] for arc in path)
+                    for arc in path:
+                        left[arc] -= pushed
+                        left[arc ^ 1] += pushed
+                    total += pushed
+                    # Resume from the tail of the first arc the push saturated
+                    for depth, arc in enumerate(path):
+                        if left[arc] <= EPSILON:
+                            del path[depth:]
+                            node = heads[path[-1]] if path else source
+                            break
+                    continue
+                out = arcs[node]
+                i = cursor[node]
+                next_level = levels[node] + 1
+                while i < len(out):
+                    arc = out[i]
+                    if left[arc] > EPSILON and levels[heads[arc]] == next_level:
+                        break
+                    i += 1
+                cursor[node] = i
+                if i < len(out):
+                    path.append(out[i])
+                    node = heads[out[i]]
+                    continue
+                # Dead end: nothing more gets through this node in this phase
+                levels[node] = -1
+                if not path:
+                    break
+                arc = path.pop()
+                node = heads[arc ^ 1]
+                cursor[node] += 1
+        # The last search reached everything on the source side of a minimum cut
+        source_side = levels
+        cut = [arc for u in range(n) if source_side[u] >= 0 for arc in arcs[u]
+               if source_side[heads[arc]] < 0 and self.bandwidths[arc] > 0]
+        return total, cut
+
+    def _levels(self, source, destination, left):
+        """Hop distance from source over arcs with spare capacity, -1 if unreachable.
+
+        The search stops at the destination's level; nodes further away
+        cannot be on a shortest augmenting path.
+        """
+        arcs, heads = self.arcs, self.heads
+        levels = [-1] * len(self.names)
+        levels[source] = 0
+        frontier = [source]
+        level = 0
+        while frontier and levels[destination] < 0:
+            level += 1
+            reached = []
+            for u in frontier:
+                for arc in arcs[u]:
+                    v = heads[arc]
+                    if levels[v] < 0 and left[arc] > EPSILON:
+                        levels[v] = level
+                        reached.append(v)
+            frontier = reached
+        return levels
+
+    def result(self, source, destination, residual):
+        """Run max_flow between two switch IDs and return the result dict."""
+        names, heads = self.names, self.heads
+        value, cut = self.max_flow(self.index[source], self.index[destination], residual)
+        return {
+            'source': source,
+            'destination': destination,
+            'max_flow': value,
+            'cut': [(names[heads[arc ^ 1]], names[heads[arc]]) for arc in cut],
+            'residual': residual,
+        }
+
+
+class MaxFlowEngine:
+    """Max throughput and bottleneck links between switches, cached until the network changes.
+
+    Capacity is either each link's full bandwidth or, with residual set,
+    what the active flows leave of it. Results are keyed on the graph's
+    version, and residual results on the link loads' version as well.
+    """
+
+    def __init__(self, controller, processes=None):
+        self.controller = controller
+        self.processes = processes or os.cpu_count() or 1
+        self.network = None
+        self.graph_version = None  # graph the network was built from
+        self.load_version = None  # link loads its spare capacities were computed from
+        self.results = {False: {}, True: {}}  # {residual: {(source, destination): result}}
+        self.counters = {'queries': 0, 'cache_hits': 0, 'builds': 0}
+        self.last_build_seconds = 0.0
+        self._lock = threading.Lock()  # held while the network is rebuilt or results are cached
+
+    def max_flow(self, source, destination, residual=False):
+        """Return the max flow from source to destination, with the links of a minimum cut.
+
+        Returns:
+            A dict with the 'source' and 'destination', the 'max_flow'
+            value, the 'cut' as a list of (src, dst) links and whether
+            'residual' capacity was used.
+
+        Raises:
+            ValueError: If either switch is unknown or they are the same
+        """
+        return self.max_flows([(source, destination)], residual, processes=1)[0]
+
+    def max_flows(self, pairs, residual=False, processes=None):
+        """Return max_flow results for many (source, destination) pairs, computing new ones in parallel."""
+        return self.bind(pairs, residual)(processes)
+
+    def bind(self, pairs, residual=False):
+        """Check pairs against the current network and return a function that computes their results.
+
+        The returned function takes an optional process count and only
+        reads the network as it was when bind was called, so it can run in
+        another thread while the controller keeps changing. Its results are
+        cached only if the network is still current when they are ready.
+
+        Raises:
+            ValueError: If a switch is unknown or a pair names the same switch twice
+        """
+        pairs = [tuple(pair) for pair in pairs]
+        with self._lock:
+            # A shallow copy keeps the spare capacities of this moment when set_loads replaces them
+            network = copy.copy(self._prepare(residual))
+            versions = (self.graph_version, self.load_version if residual else None)
+            # Another query's compute may be evicting from the cache in its thread
+            cache = self.results[residual]
+            known = {pair: cache[pair] for pair in pairs if pair in cache}
+        for source, destination in pairs:
+            for switch in (source, destination):
+                if switch not in network.index:
+                    raise ValueError(f"unknown switch: {switch}")
+            if source == destination:
+                raise ValueError(f"source and destination are the same switch: {source}")
+        missing = list(dict.fromkeys(pair for pair in pairs if pair not in known))
+        self.counters['queries'] += len(pairs)
+        self.counters['cache_hits'] += len(pairs) - len(missing)
+
+        def compute(processes=None):
+            computed = self._compute(network, missing, residual, processes)
+            with self._lock:
+                if versions == (self.graph_version, self.load_version if residual else None):
+                    for pair, result in zip(missing, computed):
+                        if len(cache) >= CACHE_MAX:
+                            cache.pop(next(iter(cache)))
+                        cache[pair] = result
+            known.update(zip(missing, computed))
+            return [known[pair] for pair in pairs]
+
+        return compute
+
+    def _compute(self, network, missing, residual, processes):
+        """Run max_flow for each pair in missing over network, in worker processes if there are enough."""
+        global _NETWORK
+        processes = min(processes or self.processes, len(missing))
+        if processes <= 1:
+            computed = [network.result(source, destination, residual) for source, destination in missing]
+        else:
+            methods = multiprocessing.get_all_start_methods()
+            if 'fork' in methods and threading.active_count() == 1:
+                # Workers inherit the network without pickling it; as in FailureAnalyzer.run,
+                # only while no other thread could be holding a lock across the fork
+                _NETWORK = network
+                pool = ProcessPoolExecutor(processes, mp_context=multiprocessing.get_context('fork'))
+            else:
+                context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+                pool = ProcessPoolExecutor(processes, mp_context=context, initializer=_init_worker,
+                                           initargs=(network,))
+            try:
+                with pool:
+                    computed = list(pool.map(_evaluate, missing, [residual] * len(missing),
+                                             chunksize=max(1, len(missing) // (processes * 4))))
+            finally:
+                _NETWORK = None
+        return computed
+
+    def stats(self):
+        network = self.network
+        return dict(self.counters,
+                    cached=sum(len(cache) for cache in self.results.values()),
+                    switches=len(network) if network else 0,
+                    arcs=len(network.heads) if network else 0,
+                    last_build_seconds=self.last_build_seconds)
+
+    def clear(self):
+        """Drop the network and every cached result."""
+        self.network = None
+        self.graph_version = None
+        self.load_version = None
+        for cache in self.results.values():
+            cache.clear()
+
+    def _prepare(self, residual):
+        """Return the network, rebuilding whatever topology or load changes made stale."""
+        controller = self.controller
+        graph = controller.topology.graph
+        if self.network is None or self.graph_version != graph.version:
+            self.clear()
+            start = time.perf_counter()
+            self.network = FlowNetwork(graph)
+            self.last_build_seconds = time.perf_counter() - start
+            self.graph_version = graph.version
+            self.counters['builds'] += 1
+        if residual and self.load_version != controller.utilization.version:
+            # Residual results only hold for the loads they were computed from
+            self.network.set_loads(controller.link_index.loads)
+            self.load_version = controller.utilization.version
+            self.results[True].clear()
+        return self.network
+
+
+def _init_worker(network):
+    global _NETWORK
+    _NETWORK = network
+
+
+def _evaluate(pair, residual):
+    return _NETWORK.result(pair[0], pair[1], residual)
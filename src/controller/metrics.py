@@ -0,0 +1,235 @@
+import bisect
+import functools
+import io
+import threading
+import time
+
+# Upper bounds in seconds, roughly three buckets per decade from 1us to 10s
+LATENCY_BUCKETS = tuple(m * 10.0 ** e for e in range(-6, 1) for m in (1, 2.5, 5)) + (10.0,)
+# Upper bounds for count-valued distributions (nodes popped, flows rerouted)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 20000, 50000, 100000)
+
+# (attribute path on the controller, method name, operation label)
+INSTRUMENTED = (
+    ((), 'add_flow', 'add_flow'),
+    ((), 'add_flows', 'add_flows'),
+    ((), 'remove_flow', 'remove_flow'),
+    ((), 'expire_flows', 'expire_flows'),
+    ((), 'remove_link', 'remove_link'),
+    ((), '_reconfigure_affected_flows', 'reconfigure_affected_flows'),
+    ((), '_shortest_paths', 'shortest_paths'),
+    ((), '_generate_flow_entries', 'generate_flow_entries'),
+    (('topology',), 'get_shortest_path', 'get_shortest_path'),
+    (('topology', 'graph'), 'shortest_path_tree', 'dijkstra'),
+    (('southbound',), 'flush', 'southbound_flush'),
+    (('max_flow_engine',), '_compute', 'max_flows'),
+)
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus style."""
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # last bucket is +Inf
+        self.total = 0.0
+        self.count = 0
+
+    def clear(self):
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.total += value
+        self.count += 1
+
+    def quantile(self, q):
+        """Estimate a quantile as the upper bound of the bucket that contains it."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.bounds + (float('infinity'),), self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float('infinity')
+
+
+class Metrics:
+    """Per-operation counters and histograms for an SDNController.
+
+    Instrumentation works by shadowing the listed methods with timing
+    wrappers on the controller's own instances. While disabled no wrappers
+    are installed, so the hot paths run exactly as without metrics.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.errors = {}  # {operation: count}
+        self.latency = {}  # {operation: Histogram of seconds}
+        self.distributions = {
+            'dijkstra_nodes_popped': Histogram(COUNT_BUCKETS),
+            'flows_rerouted_per_failure': Histogram(COUNT_BUCKETS),
+        }
+        self.gauges = {}  # {name: callable returning the current value}
+        self._wrapped = []
+        self._profiler = None
+        self._server = None
+
+    def enable(self, controller):
+        """Install timing wrappers on the controller, topology and graph."""
+        if self.enabled:
+            return
+        for path, method, operation in INSTRUMENTED:
+            target = controller
+            for attribute in path:
+                target = getattr(target, attribute)
+            original = getattr(target, method)
+            setattr(target, method, self._wrap(original, operation, target))
+            self._wrapped.append((target, method))
+        self.enabled = True
+
+    def disable(self):
+        """Remove the wrappers, restoring the plain methods."""
+        for target, method in self._wrapped:
+            delattr(target, method)
+        self._wrapped = []
+        self.enabled = False
+
+    def reset(self):
+        """Zero every histogram in place, keeping installed wrappers attached."""
+        self.errors.clear()
+        for histogram in list(self.latency.values()) + list(self.distributions.values()):
+            histogram.clear()
+
+    def _wrap(self, original, operation, target):
+        latency = self.latency.setdefault(operation, Histogram(LATENCY_BUCKETS))
+        errors = self.errors
+        pops = self.distributions['dijkstra_nodes_popped']
+        rerouted = self.distributions['flows_rerouted_per_failure']
+
+        @functools.wraps(original)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                result = original(*args, **kwargs)
+            except Exception:
+                errors[operation] = errors.get(operation, 0) + 1
+                raise
+            finally:
+                latency.observe(time.perf_counter() - start)
+            if operation == 'dijkstra':
+                pops.observe(target.last_pops)
+            elif operation == 'reconfigure_affected_flows':
+                rerouted.observe(len(result))
+            return result
+
+        return wrapper
+
+    def render_text(self):
+        """Human-readable summary for the CLI."""
+        lines = [f"{'operation':<28} {'calls':>8} {'errors':>6} {'mean ms':>9} {'p50 ms':>8} {'p99 ms':>8}"]
+        for operation, histogram in sorted(self.latency.items()):
+            if not histogram.count:
+                continue
+            lines.append(f"{operation:<28} {histogram.count:>8} {self.errors.get(operation, 0):>6} "
+                         f"{histogram.total / histogram.count * 1000:>9.3f} "
+                         f"{histogram.quantile(0.5) * 1000:>8.3f} {histogram.quantile(0.99) * 1000:>8.3f}")
+        for name, histogram in self.distributions.items():
+            if histogram.count:
+                lines.append(f"{name}: mean {histogram.total / histogram.count:.3g}, "
+                             f"p99 <= {histogram.quantile(0.99):g} over {histogram.count} samples")
+        for name, gauge in self.gauges.items():
+            lines.append(f"{name}: {gauge()}")
+        return "\n".join(lines)
+
+    def render_prometheus(self):
+        """Prometheus text exposition format."""
+        lines = [
+            "# HELP sdn_operation_seconds Latency of controller operations.",
+            "# TYPE sdn_operation_seconds histogram",
+        ]
+        for operation, histogram in sorted(self.latency.items()):
+            lines.extend(_histogram_lines('sdn_operation_seconds', histogram, f'op="{operation}"'))
+        lines.append("# HELP sdn_operation_errors_total Controller operations that raised.")
+        lines.append("# TYPE sdn_operation_errors_total counter")
+        for operation, count in sorted(self.errors.items()):
+            lines.append(f'sdn_operation_errors_total{{op="{operation}"}} {count}')
+        for name, histogram in self.distributions.items():
+            lines.append(f"# TYPE sdn_{name} histogram")
+            lines.extend(_histogram_lines(f"sdn_{name}", histogram, ''))
+        for name, gauge in self.gauges.items():
+            lines.append(f"# TYPE sdn_{name} gauge")
+            lines.append(f"sdn_{name} {gauge()}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        """Dump the Prometheus text format to a file (e.g. for a node-exporter textfile collector)."""
+        with open(path, 'w') as f:
+            f.write(self.render_prometheus())
+
+    def serve(self, port, host='127.0.0.1'):
+        """Serve /metrics over HTTP from a daemon thread; return the bound port."""
+        if self._server is not None:
+            return self._server.server_address[1]
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = metrics.render_prometheus().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self._server.server_address[1]
+
+    def stop_serving(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def start_profiling(self):
+        """Start collecting a cProfile profile of everything the controller does."""
+        if self._profiler is None:
+            import cProfile
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+
+    def stop_profiling(self, path=None, limit=20):
+        """Stop profiling; dump raw stats to path if given and return the top entries as text."""
+        profiler, self._profiler = self._profiler, None
+        if profiler is None:
+            return ""
+        profiler.disable()
+        if path:
+            profiler.dump_stats(path)
+        import pstats
+        out = io.StringIO()
+        pstats.Stats(profiler, stream=out).sort_stats('cumulative').print_stats(limit)
+        return out.getvalue()
+
+
+def _histogram_lines(name, histogram, labels):
+    separator = ',' if labels else ''
+    lines = []
+    cumulative = 0
+    for bound, count in zip(histogram.bounds, histogram.counts):
+        cumulative += count
+        lines.append(f'{name}_bucket{{{labels}{separator}le="{bound:g}"}} {cumulative}')
+    lines.append(f'{name}_bucket{{{labels}{separator}le="+Inf"}} {histogram.count}')
+    suffix = f'{{{labels}}}' if labels else ''
+    lines.append(f"{name}_sum{suffix} {histogram.total}")
+    lines.append(f"{name}_count{suffix} {histogram.count}")
+    return lines
@@ -0,0 +1,690 @@
+"""Partitioned routing: per-domain path computation in worker processes.
+
+The topology is split into domains, either by a graph partitioner or from
+user-given regions. Each domain is served by its own worker process, which
+holds the domain's subgraph and the shortest-path trees of its border
+switches (those with a link into another domain). From those trees a
+worker reports the distance between every pair of its borders. Together
+with the inter-domain links these distances form the border graph, an
+abstraction of the whole network that every worker keeps a copy of.
+
+A batch of (source, destination) pairs is routed in three rounds, each
+spread over all the workers at once:
+
+1. attach: the workers of the destinations' domains report each
+   destination's distance to the borders of its domain;
+2. search: the worker of each source's domain runs Dijkstra from the
+   source's borders over the border graph and picks, per destination, the
+   cheapest border to enter its domain by (or a path that never leaves
+   the domain) and returns the sequence of borders crossed;
+3. expand: the workers fill in the switches between consecutive borders
+   in their domain, and the segments are stitched into one path.
+
+Since the border graph carries exact intra-domain distances, the stitched
+paths are as short as the ones Dijkstra finds on the whole topology.
+"""
+import heapq
+import multiprocessing
+import os
+import threading
+import time
+import traceback
+from array import array
+from collections import deque
+
+from controller.graph_core import INFINITY, CompactGraph
+
+TREE_CACHE_MAX = 4096  # endpoint shortest-path trees kept per worker
+BALANCE = 1.1  # refinement may grow a domain to this factor of the ideal size
+
+
+def partition_graph(graph, domains):
+    """Split a CompactGraph into domains of about equal size with few links between them.
+
+    Seeds are spread out by hop count, grown breadth-first, always growing
+    the smallest domain next, then refined by moving boundary switches to
+    the neighboring domain most of their links lead to.
+
+    Returns:
+        A list of domain numbers indexed by node index
+    """
+    n = len(graph)
+    if domains < 1:
+        raise ValueError(f"need at least one domain, got {domains}")
+    if not n:
+        return []
+    domains = min(domains, n)
+    neighbors = [[v for v, _, _ in graph.neighbors(u)] for u in range(n)]
+
+    # Seeds: each one the node farthest (in hops) from those picked so far
+    seeds = [0]
+    hops = _hop_distances(neighbors, seeds)
+    while len(seeds) < domains:
+        seed = max(range(n), key=lambda u: hops[u])
+        seeds.append(seed)
+        for u, distance in enumerate(_hop_distances(neighbors, [seed])):
+            hops[u] = min(hops[u], distance)
+
+    # Balanced growth: the smallest domain takes the frontier switch with the most links into it
+    assignment = [-1] * n
+    sizes = [0] * domains
+    links_into = [{} for _ in range(domains)]  # per domain {unassigned switch: links into the domain}
+    frontiers = [[(0, seed)] for seed in seeds]  # heaps of (-links into the domain, switch)
+    queue = [(0, domain) for domain in range(domains)]
+    unassigned = n
+    while unassigned:
+        if not queue:
+            # Switches unreachable from every seed start the smallest domain growing again
+            domain = sizes.index(min(sizes))
+            frontiers[domain].append((0, assignment.index(-1)))
+            queue.append((sizes[domain], domain))
+        _, domain = heapq.heappop(queue)
+        frontier = frontiers[domain]
+        while frontier and assignment[frontier[0][1]] != -1:
+            heapq.heappop(frontier)
+        if not frontier:
+            continue
+        node = heapq.heappop(frontier)[1]
+        assignment[node] = domain
+        sizes[domain] += 1
+        unassigned -= 1
+        counts = links_into[domain]
+        counts.pop(node, None)
+        for v in neighbors[node]:
+            if assignment[v] == -1:
+                counts[v] = counts.get(v, 0) + 1
+                heapq.heappush(frontier, (-counts[v], v))
+        heapq.heappush(queue, (sizes[domain], domain))
+
+    # Refinement: move boundary switches to cut fewer links while staying balanced
+    limit = int(BALANCE * n / domains) + 1
+    for _ in range(2):
+        moved = 0
+        for u in range(n):
+            current = assignment[u]
+            counts = {}
+            for v in neighbors[u]:
+                counts[assignment[v]] = counts.get(assignment[v], 0) + 1
+            best = max(counts, key=counts.get, default=current)
+            if (best != current and counts[best] > counts.get(current, 0)
+                    and sizes[best] < limit and sizes[current] > 1):
+                assignment[u] = best
+                sizes[current] -= 1
+                sizes[best] += 1
+                moved += 1
+        if not moved:
+            break
+    return assignment
+
+
+def load_regions(filename):
+    """Read a 'switch region' pair per line into {switch: region}; '#' starts a comment."""
+    regions = {}
+    with open(filename) as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.split('#', 1)[0].strip()
+            if not line:
+                continue
+            parts = line.replace(',', ' ').split()
+            if len(parts) != 2:
+                raise ValueError(f"{filename}:{line_no}: expected <switch> <region>")
+            regions[parts[0]] = parts[1]
+    return regions
+
+
+class PartitionedRouter:
+    """Routes shortest paths over a partitioned topology with one worker process per domain.
+
+    The router follows topology changes through ``node_added``,
+    ``link_added`` and ``link_removed``; only the workers of the domains a
+    change touches recompute their border distances.
+    """
+
+    def __init__(self, topology, domains=None, regions=None):
+        self.topology = topology
+        graph = topology.graph
+        if regions is not None:
+            missing = [node for node in graph.names if node not in regions]
+            if missing:
+                raise ValueError(f"switches without a region: {', '.join(map(str, missing[:10]))}")
+            self.labels = sorted(set(regions[node] for node in graph.names), key=str)
+            numbers = {label: domain for domain, label in enumerate(self.labels)}
+            assignment = [numbers[regions[node]] for node in graph.names]
+        else:
+            domains = domains or os.cpu_count() or 1
+            assignment = partition_graph(graph, domains)
+            self.labels = list(range(max(assignment, default=0) + 1))
+        self.domain_of = {graph.names[u]: domain for u, domain in enumerate(assignment)}
+        self.members = [set() for _ in self.labels]
+        for node, domain in self.domain_of.items():
+            self.members[domain].add(node)
+
+        self.tables = [{} for _ in self.labels]  # per domain {(border, border): intra-domain distance}
+        self.attachments = {}  # {switch: {border of its domain: distance}}, cached between batches
+        self.totals = {'batches': 0, 'pairs': 0, 'updates': 0, 'attach_seconds': 0.0, 'search_seconds': 0.0,
+                       'expand_seconds': 0.0, 'update_seconds': 0.0}
+        self.workers = []
+        self._processes = []
+        self._start(graph)
+
+    def __len__(self):
+        return len(self.labels)
+
+    def close(self):
+        """Stop the worker processes."""
+        for connection in self.workers:
+            try:
+                connection.send(('close', ()))
+            except (BrokenPipeError, OSError):
+                pass
+        for process in self._processes:
+            process.join(timeout=1)
+            if process.is_alive():
+                process.terminate()
+        self.workers = []
+        self._processes = []
+
+    def route_many(self, pairs):
+        """Return the shortest path (a list of switch IDs) for each (source, destination), or None."""
+        pairs = list(pairs)
+        paths = [None] * len(pairs)
+        domain_of = self.domain_of
+
+        # Round 1: distances from the destinations to the borders of their domains
+        started = time.perf_counter()
+        wanted = {}
+        for _, destination in pairs:
+            domain = domain_of.get(destination)
+            if domain is not None and destination not in self.attachments:
+                wanted.setdefault(domain, {})[destination] = None
+        if wanted:
+            for found in self._call({domain: ('attach', (list(nodes),)) for domain, nodes in wanted.items()}).values():
+                self.attachments.update(found)
+        searched = time.perf_counter()
+        self.totals['attach_seconds'] += searched - started
+
+        # Round 2: border sequences, searched by the worker of each source's domain
+        by_domain = {}
+        for position, (source, destination) in enumerate(pairs):
+            domain = domain_of.get(source)
+            if domain is None or destination not in domain_of:
+                continue
+            targets = by_domain.setdefault(domain, {}).setdefault(source, [])
+            targets.append((position, destination, self.attachments[destination]))
+        results = self._call({domain: ('search', (list(sources.items()),)) for domain, sources in by_domain.items()})
+        expanded = time.perf_counter()
+        self.totals['search_seconds'] += expanded - searched
+
+        # Round 3: expand the segments between consecutive borders inside each domain, then stitch
+        sequences = []
+        segments = {}
+        for found in results.values():
+            for position, kind, nodes in found:
+                if kind == 'path':
+                    paths[position] = nodes
+                elif kind == 'via':
+                    sequences.append((position, nodes))
+                    for a, b in zip(nodes, nodes[1:]):
+                        if domain_of[a] == domain_of[b]:
+                            segments.setdefault(domain_of[a], {})[(a, b)] = None
+        if segments:
+            calls = {domain: ('expand', (list(wanted),)) for domain, wanted in segments.items()}
+            for domain, found in self._call(calls).items():
+                segments[domain] = dict(zip(segments[domain], found))
+        # Sequences made only of inter-domain links need no segments at all
+        for position, nodes in sequences:
+            path = [nodes[0]]
+            for a, b in zip(nodes, nodes[1:]):
+                if domain_of[a] != domain_of[b]:
+                    path.append(b)  # inter-domain link
+                    continue
+                segment = segments[domain_of[a]][(a, b)]
+                if segment is None:
+                    path = None
+                    break
+                path.extend(segment[1:])
+            paths[position] = path
+        self.totals['expand_seconds'] += time.perf_counter() - expanded
+        self.totals['batches'] += 1
+        self.totals['pairs'] += len(pairs)
+        return paths
+
+    def node_added(self, node):
+        """Place a new switch in the smallest domain."""
+        if node in self.domain_of:
+            return
+        domain = min(range(len(self.members)), key=lambda d: len(self.members[d]))
+        self.domain_of[node] = domain
+        self.members[domain].add(node)
+        self._update({domain: [('node', node)]})
+
+    def link_added(self, source, destination, bandwidth):
+        """Follow a link added (or re-weighted) in the topology."""
+        for node, other in ((source, destination), (destination, source)):
+            if node not in self.domain_of:
+                domain = self.domain_of.get(other)
+                if domain is None:
+                    self.node_added(node)
+                else:
+                    # A new switch joins the domain it is attached to
+                    self.domain_of[node] = domain
+                    self.members[domain].add(node)
+                    self._update({domain: [('node', node)]})
+        self._link_changed(source, destination, bandwidth)
+
+    def link_removed(self, source, destination):
+        """Follow a link removed from the topology."""
+        if source in self.domain_of and destination in self.domain_of:
+            self._link_changed(source, destination, None)
+
+    def stats(self):
+        sizes = [len(members) for members in self.members]
+        borders = sum(len(self._borders(domain)) for domain in range(len(self.members)))
+        cut = sum(1 for u, v in self.topology.edges
+                  if self.domain_of.get(u) != self.domain_of.get(v)) // 2
+        return dict(self.totals, domains=len(self.labels), min_size=min(sizes, default=0),
+                    max_size=max(sizes, default=0), borders=borders, cut_links=cut,
+                    border_edges=sum(len(table) for table in self.tables) + 2 * cut)
+
+    def _start(self, graph):
+        """Start one worker per domain and hand every worker the border graph."""
+        names = graph.names
+        domain_edges = [[] for _ in self.labels]
+        cut_links = []
+        for u, v, bandwidth in graph.iter_edges():
+            a, b = self.domain_of[names[u]], self.domain_of[names[v]]
+            if a == b:
+                domain_edges[a].append((names[u], names[v], bandwidth))
+            else:
+                cut_links.append((names[u], names[v], bandwidth))
+        methods = multiprocessing.get_all_start_methods()
+        if 'fork' in methods and threading.active_count() == 1:
+            context = multiprocessing.get_context('fork')
+        else:
+            # A lock another thread holds across a fork would stay held in these long-lived workers;
+            # the other start methods pickle each DomainRouter instead
+            context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+        for domain in range(len(self.labels)):
+            worker = DomainRouter(domain, sorted(self.members[domain], key=graph.index.get), domain_edges[domain],
+                                  self._borders(domain))
+            parent, child = context.Pipe()
+            process = context.Process(target=_serve, args=(child, worker), daemon=True,
+                                      name=f'domain-{self.labels[domain]}')
+            process.start()
+            child.close()
+            self.workers.append(parent)
+            self._processes.append(process)
+
+        self.tables = [None] * len(self.labels)
+        for domain, table in self._call({d: ('border_table', ()) for d in range(len(self.labels))}).items():
+            self.tables[domain] = table
+        edges = list(cut_links)
+        for table in self.tables:
+            edges.extend((a, b, 1 / distance) for (a, b), distance in table.items())
+        self._broadcast('set_border_graph', (edges,))
+
+    def _borders(self, domain):
+        """Return the switches of a domain with a link into another domain."""
+        adjacency, domain_of = self.topology.adjacency, self.domain_of
+        return [node for node in self.members[domain]
+                if any(domain_of.get(other, domain) != domain for other in adjacency[node])]
+
+    def _link_changed(self, source, destination, bandwidth):
+        a, b = self.domain_of[source], self.domain_of[destination]
+        if a == b:
+            change = ('remove', source, destination) if bandwidth is None else ('add', source, destination, bandwidth)
+            self._update({a: [change]})
+            return
+        # An inter-domain link is an edge of the border graph and may make or unmake borders
+        self._update({a: [], b: []}, [(source, destination, bandwidth), (destination, source, bandwidth)])
+
+    def _update(self, changes, border_edges=()):
+        """Apply graph changes to the workers of the given domains and spread the new border distances.
+
+        Args:
+            changes: {domain: [change, ...]} with ('add', u, v, bandwidth),
+                ('remove', u, v) or ('node', switch) changes
+            border_edges: Inter-domain (u, v, bandwidth or None) edges to set in the border graph
+        """
+        started = time.perf_counter()
+        calls = {domain: ('update', (domain_changes, self._borders(domain)))
+                 for domain, domain_changes in changes.items()}
+        delta = list(border_edges)
+        for domain, table in self._call(calls).items():
+            old = self.tables[domain]
+            delta.extend((a, b, None) for (a, b) in old if (a, b) not in table)
+            delta.extend((a, b, 1 / distance) for (a, b), distance in table.items() if old.get((a, b)) != distance)
+            self.tables[domain] = table
+            for node in self.members[domain]:
+                self.attachments.pop(node, None)
+        if delta:
+            self._broadcast('update_border_graph', (delta,))
+        self.totals['updates'] += 1
+        self.totals['update_seconds'] += time.perf_counter() - started
+
+    def _broadcast(self, op, args):
+        self._call({domain: (op, args) for domain in range(len(self.workers))})
+
+    def _call(self, calls):
+        """Send {domain: (op, args)} to all the workers at once, then collect {domain: result}."""
+        for domain, message in calls.items():
+            self.workers[domain].send(message)
+        results = {}
+        failure = None
+        for domain in calls:
+            status, result = self.workers[domain].recv()
+            if status == 'error':
+                failure = failure or f"domain {self.labels[domain]} worker failed:\n{result}"
+            results[domain] = result
+        if failure:
+            raise RuntimeError(failure)
+        return results
+
+
+class DomainRouter:
+    """Path computation for one domain; lives in the domain's worker process.
+
+    Paths are searched on the domain's own subgraph, or across domains on
+    the border graph. Every switch ID handled is one of this domain's,
+    except for the border graph, which spans all domains.
+    """
+
+    def __init__(self, domain, nodes, edges, borders):
+        self.domain = domain
+        self.graph = CompactGraph()
+        for node in nodes:
+            self.graph.add_node(node)
+        index = self.graph.index
+        for u, v, bandwidth in edges:
+            self.graph.set_edge(index[u], index[v], bandwidth)
+        self.borders = list(borders)
+        self.border_trees = {}  # {border: shortest-path tree within the domain}
+        self.border_graph = CompactGraph()
+        self.trees = {}  # {switch: shortest-path tree within the domain}
+
+    def border_table(self, stale=None):
+        """Bring the border trees up to date; return {(border, border): distance} for every connected pair.
+
+        Only trees of new borders, and of those in ``stale`` (all of them if
+        it is None), are recomputed. A pair whose shortest path passes
+        through a third border is left out: the two border graph edges to
+        and from that border already carry the same distance, and the border
+        graph stays sparse.
+        """
+        index = self.graph.index
+        trees = self.border_trees
+        self.border_trees = {}
+        for border in self.borders:
+            tree = trees.get(border)
+            if tree is None or stale is None or border in stale:
+                tree = self.graph.shortest_path_tree(index[border])
+            self.border_trees[border] = tree
+        border_ids = {index[border] for border in self.borders}
+        table = {}
+        for a, (distances, previous) in self.border_trees.items():
+            root = index[a]
+            crosses = {root: False}  # {node: whether its tree path from a passes through another border}
+            for b in self.borders:
+                v = index[b]
+                if v == root or distances[v] == INFINITY:
+                    continue
+                # Walk up to the first node already classified, then classify the walked nodes top-down
+                walked = []
+                u = previous[v]
+                while u not in crosses:
+                    walked.append(u)
+                    u = previous[u]
+                for w in reversed(walked):
+                    crosses[w] = crosses[u] or u != root and u in border_ids
+                    u = w
+                if not (crosses[u] or u != root and u in border_ids):
+                    table[(a, b)] = distances[v]
+        return table
+
+    def update(self, changes, borders):
+        """Apply ('add', u, v, bandwidth), ('remove', u, v) and ('node', switch) changes.
+
+        Returns:
+            The domain's new border table
+        """
+        graph = self.graph
+        size = len(graph)
+        for change in changes:
+            if change[0] == 'node':
+                graph.add_node(change[1])
+                continue
+            u, v = graph.add_node(change[1]), graph.add_node(change[2])
+            if change[0] == 'add':
+                graph.set_edge(u, v, change[3])
+                graph.set_edge(v, u, change[3])
+            else:
+                graph.remove_edge(u, v)
+                graph.remove_edge(v, u)
+            if len(graph) == size:
+                for tree in self.border_trees.values():
+                    _repair_tree(graph, tree, u, v)
+        self.borders = list(borders)
+        self.trees.clear()
+        # Trees are arrays over the domain's nodes, so new switches need them all rebuilt
+        return self.border_table(None if len(graph) != size else ())
+
+    def set_border_graph(self, edges):
+        self.border_graph = CompactGraph()
+        self.update_border_graph(edges)
+        self.border_graph.compact()
+
+    def update_border_graph(self, edges):
+        """Set (u, v, bandwidth) edges of the border graph; a bandwidth of None removes the edge."""
+        graph = self.border_graph
+        for u, v, bandwidth in edges:
+            u, v = graph.add_node(u), graph.add_node(v)
+            if bandwidth is None:
+                graph.remove_edge(u, v)
+            else:
+                graph.set_edge(u, v, bandwidth)
+
+    def attach(self, nodes):
+        """Return {switch: {border: distance}} for switches of this domain."""
+        return {node: self._attachment(node) for node in nodes}
+
+    def search(self, requests):
+        """Route (source, [(position, destination, destination attachment), ...]) requests.
+
+        Returns:
+            (position, kind, nodes) per destination: kind 'path' with the
+            whole path when it never leaves this domain, 'via' with the
+            sequence of switches where it enters or leaves a domain, or
+            None with no nodes when the destination is unreachable.
+        """
+        names, index = self.graph.names, self.graph.index
+        border_index = self.border_graph.index
+        results = []
+        for source, targets in requests:
+            tree = distances = previous = None
+            for position, destination, attachment in targets:
+                best, via = INFINITY, None
+                if destination in index:
+                    if tree is None:
+                        tree = self._tree(source)
+                    best = tree[0][index[destination]]
+                if attachment:
+                    if distances is None:
+                        distances, previous = _seeded_tree(self.border_graph, self._attachment(source))
+                    for border, tail in attachment.items():
+                        b = border_index.get(border)
+                        if b is not None and distances[b] + tail < best:
+                            best, via = distances[b] + tail, b
+                if best == INFINITY:
+                    results.append((position, None, None))
+                elif via is None:
+                    path = self.graph.path_from_tree(tree, index[destination])
+                    results.append((position, 'path', [names[u] for u in path]))
+                else:
+                    sequence = []
+                    while via != -1:
+                        sequence.append(self.border_graph.names[via])
+                        via = previous[via]
+                    sequence.reverse()
+                    if sequence[0] != source:
+                        sequence.insert(0, source)
+                    if sequence[-1] != destination:
+                        sequence.append(destination)
+                    results.append((position, 'via', sequence))
+        return results
+
+    def expand(self, segments):
+        """Return the path within this domain for each (u, v) segment, or None where there is none."""
+        names, index = self.graph.names, self.graph.index
+        paths = []
+        for u, v in segments:
+            # Links are symmetric, so a tree rooted at either end gives a shortest path
+            tree = self.border_trees.get(u)
+            reverse = tree is None and v in self.border_trees
+            if reverse:
+                u, v, tree = v, u, self.border_trees[v]
+            elif tree is None:
+                tree = self._tree(u)
+            path = self.graph.path_from_tree(tree, index[v])
+            if path is not None:
+                path = [names[w] for w in path]
+                if reverse:
+                    path.reverse()
+            paths.append(path)
+        return paths
+
+    def _tree(self, node):
+        tree = self.border_trees.get(node) or self.trees.get(node)
+        if tree is None:
+            if len(self.trees) >= TREE_CACHE_MAX:
+                self.trees.pop(next(iter(self.trees)))
+            tree = self.trees[node] = self.graph.shortest_path_tree(self.graph.index[node])
+        return tree
+
+    def _attachment(self, node):
+        """Return {border: distance} from a switch of this domain to the borders it reaches within it."""
+        # Links are symmetric, so the border trees already hold the distances
+        u = self.graph.index[node]
+        attachment = {}
+        for border, (distances, _) in self.border_trees.items():
+            distance = distances[u]
+            if distance != INFINITY:
+                attachment[border] = distance
+        return attachment
+
+
+def _serve(connection, router):
+    """Worker process loop: answer (op, args) messages until told to close."""
+    while True:
+        try:
+            op, args = connection.recv()
+        except EOFError:
+            break
+        if op == 'close':
+            break
+        try:
+            connection.send(('ok', getattr(router, op)(*args)))
+        except Exception:
+            connection.send(('error', traceback.format_exc()))
+    connection.close()
+
+
+def _repair_tree(graph, tree, u, v):
+    """Update a shortest-path tree in place after the link u <-> v was added, re-weighted or removed.
+
+    If the link was part of the tree, only the subtree hanging below it is
+    searched again, starting from its neighbors outside the subtree.
+    """
+    distances, previous = tree
+    priority_queue = []
+    if previous[v] == u or previous[u] == v:
+        top = v if previous[v] == u else u
+        children = {}
+        for node, parent in enumerate(previous):
+            if parent != -1:
+                children.setdefault(parent, []).append(node)
+        subtree = [top]
+        for node in subtree:
+            subtree.extend(children.get(node, ()))
+        cut = set(subtree)
+        for node in subtree:
+            distances[node] = INFINITY
+            previous[node] = -1
+        for node in subtree:
+            for other, weight, _ in graph.neighbors(node):
+                if other not in cut and distances[other] + weight < distances[node]:
+                    distances[node] = distances[other] + weight
+                    previous[node] = other
+            if distances[node] != INFINITY:
+                priority_queue.append((distances[node], node))
+    # A new or cheaper link may shorten the paths through it
+    for a, b in ((u, v), (v, u)):
+        bandwidth = graph.get_bandwidth(a, b)
+        if bandwidth is not None and distances[a] + 1 / bandwidth < distances[b]:
+            distances[b] = distances[a] + 1 / bandwidth
+            previous[b] = a
+            priority_queue.append((distances[b], b))
+    heapq.heapify(priority_queue)
+    heappush, heappop = heapq.heappush, heapq.heappop
+    while priority_queue:
+        current_distance, node = heappop(priority_queue)
+        if current_distance > distances[node]:
+            continue
+        for other, weight, _ in graph.neighbors(node):
+            distance = current_distance + weight
+            if distance < distances[other]:
+                distances[other] = distance
+                previous[other] = node
+                heappush(priority_queue, (distance, other))
+
+
+def _seeded_tree(graph, seeds):
+    """Dijkstra from several {node ID: starting distance} seeds; return (distances, previous) arrays."""
+    n = len(graph)
+    distances = array('d', [INFINITY]) * n
+    previous = array('l', [-1]) * n
+    priority_queue = []
+    index = graph.index
+    for node, distance in seeds.items():
+        u = index.get(node)
+        if u is not None and distance < distances[u]:
+            distances[u] = distance
+            priority_queue.append((distance, u))
+    heapq.heapify(priority_queue)
+
+    offsets, targets, weights, extra = graph.offsets, graph.targets, graph.weights, graph.extra
+    heappush, heappop = heapq.heappush, heapq.heappop
+    while priority_queue:
+        current_distance, u = heappop(priority_queue)
+        if current_distance > distances[u]:
+            continue
+        for slot in range(offsets[u], offsets[u + 1]):
+            distance = current_distance + weights[slot]
+            v = targets[slot]
+            if distance < distances[v]:
+                distances[v] = distance
+                previous[v] = u
+                heappush(priority_queue, (distance, v))
+        overlay = extra.get(u)
+        if overlay:
+            for v, bandwidth in overlay.items():
+                distance = current_distance + 1 / bandwidth
+                if distance < distances[v]:
+                    distances[v] = distance
+                    previous[v] = u
+                    heappush(priority_queue, (distance, v))
+    return distances, previous
+
+
+def _hop_distances(neighbors, sources):
+    """Breadth-first hop counts from the sources; unreachable nodes get infinity."""
+    hops = [INFINITY] * len(neighbors)
+    queue = deque(sources)
+    for source in sources:
+        hops[source] = 0
+    while queue:
+        u = queue.popleft()
+        for v in neighbors[u]:
+            if hops[v] == INFINITY:
+                hops[v] = hops[u] + 1
+                queue.append(v)
+    return hops
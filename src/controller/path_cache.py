@@ -0,0 +1,90 @@
+from collections import OrderedDict
+
+INFINITY = float('infinity')
+
+
+class ShortestPathCache:
+    """LRU cache of shortest-path trees keyed by source node.
+
+    A tree is a ``(distances, previous)`` pair of arrays indexed by interned
+    node ID, as produced by ``CompactGraph.shortest_path_tree``. Nodes added
+    after a tree was built fall outside its arrays and count as unreachable.
+    Trees are only dropped when an edge change can actually alter them.
+    """
+
+    def __init__(self, max_size=128):
+        self.max_size = max_size
+        self.trees = OrderedDict()  # {source: (distances, previous)}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, source):
+        """Return the cached tree for source, or None on a miss."""
+        tree = self.trees.get(source)
+        if tree is None:
+            self.misses += 1
+            return None
+        self.trees.move_to_end(source)
+        self.hits += 1
+        return tree
+
+    def put(self, source, tree):
+        """Store a tree, evicting the least recently used one if full."""
+        if self.max_size <= 0:
+            return
+        self.trees[source] = tree
+        self.trees.move_to_end(source)
+        while len(self.trees) > self.max_size:
+            self.trees.popitem(last=False)
+            self.evictions += 1
+
+    def edge_removed(self, source, destination):
+        """Drop trees that route over the removed edge in either direction."""
+        stale = []
+        for root, (distances, previous) in self.trees.items():
+            if _parent(previous, destination) == source or _parent(previous, source) == destination:
+                stale.append(root)
+        self._drop(stale)
+
+    def edge_added(self, source, destination, weight):
+        """Drop trees in which the new edge would shorten some distance."""
+        stale = []
+        for root, (distances, previous) in self.trees.items():
+            dist_src = _distance(distances, source)
+            dist_dst = _distance(distances, destination)
+            if dist_src + weight < dist_dst or dist_dst + weight < dist_src:
+                stale.append(root)
+        self._drop(stale)
+
+    def clear(self):
+        """Drop every cached tree."""
+        self.invalidations += len(self.trees)
+        self.trees.clear()
+
+    def stats(self):
+        """Return hit/miss counters and the current cache size."""
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self.trees),
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations
+        }
+
+    def _drop(self, sources):
+        for root in sources:
+            del self.trees[root]
+        self.invalidations += len(sources)
+
+
+def _parent(previous, node):
+    return previous[node] if node < len(previous) else -1
+
+
+def _distance(distances, node):
+    return distances[node] if node < len(distances) else INFINITY
@@ -0,0 +1,441 @@
+"""Controller state snapshots and the mutation journal.
+
+A snapshot is one binary file: a header, a table of section offsets and
+8-byte aligned sections holding flat arrays (node names, the compacted CSR
+graph, flow columns, flow paths, flow timeouts and the flow table order). Loading maps the
+file and copies each section into an array in one step, so nothing is
+parsed object by object; only the controller's own dicts are rebuilt.
+
+The journal is an append-only file of JSON-array records describing the
+effects of each mutation since the snapshot named in its first line.
+Records carry results, not requests (a flow record holds the path that was
+chosen), so replaying it never runs Dijkstra.
+"""
+import gc
+import json
+import logging
+import mmap
+import os
+import struct
+from array import array
+
+from controller.flow_store import normalize_priority
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'SDNSNAP\x03'
+HEADER = struct.Struct('<8sQI4x')  # magic, snapshot id, section count
+SECTION = struct.Struct('<QQ')  # offset, length in bytes
+SECTIONS = (
+    'meta',
+    'names',
+    'offsets',
+    'targets',
+    'weights',
+    'bandwidths',
+    'link_slots',
+    'flow_ids',
+    'flow_groups',
+    'flow_sources',
+    'flow_destinations',
+    'flow_bandwidths',
+    'flow_priorities',
+    'path_offsets',
+    'path_nodes',
+    'entry_flows',
+    'entry_hops',
+    'timeout_flows',
+    'timeout_idle',
+    'timeout_hard',
+)
+
+
+def write_snapshot(controller, path):
+    """Write the controller's state to path atomically; return the snapshot ID."""
+    graph = controller.topology.graph.copy()
+    names = graph.names
+    index = graph.index
+    for name in names:
+        if not isinstance(name, str) or '\n' in name:
+            raise ValueError(f"switch IDs must be strings without newlines: {name!r}")
+
+    link_slots = array('q', (graph.find_slot(index[source], index[destination])
+                             for source, destination in controller.link_stats))
+
+    # The flow store's columns are written as they are, minus deleted rows
+    flows = controller.active_flows
+    flows.compact()
+    flow_positions = {flow_id: position for position, flow_id in enumerate(flows.ids)}
+    flow_groups = array('q', [flows.groups.get(flow_id, 0) for flow_id in flows.ids])
+    path_offsets = array('q', [0])
+    path_nodes = array('q')
+    hops = []
+    for packed in flows.paths:
+        nodes = memoryview(packed).cast('i').tolist()
+        hops.append(nodes)
+        path_nodes.extend(nodes)
+        path_offsets.append(len(path_nodes))
+
+    # Entries in table order, so buckets can be refilled without re-sorting
+    entry_flows = array('q')
+    entry_hops = array('q')
+    for switch, buckets in controller.flow_table.switches.items():
+        node = index[switch]
+        for bucket in buckets.values():
+            for (_, flow_id), _ in bucket:
+                position = flow_positions.get(flow_id)
+                if position is None:
+                    continue
+                entry_flows.append(position)
+                entry_hops.append(hops[position].index(node))
+
+    # Timeouts restart on restore: the full idle timeout, and whatever was left of the hard one
+    timeout_flows = array('q')
+    timeout_idle = array('d')
+    timeout_hard = array('d')
+    now = controller.flow_timeouts.clock()
+    for flow_id in controller.flow_timeouts.timeouts:
+        position = flow_positions.get(flow_id)
+        if position is None:
+            continue
+        idle, hard = controller.flow_timeouts.remaining(flow_id, now)
+        timeout_flows.append(position)
+        timeout_idle.append(idle)
+        timeout_hard.append(hard)
+
+    meta = {
+        'routing_mode': controller.routing_mode,
+        'utilization_weight': controller.capacity_router.utilization_weight,
+        'rebalance_every': controller.rebalance_every,
+        'next_flow_id': flows.next_id,
+    }
+    sections = {
+        'meta': json.dumps(meta).encode(),
+        'names': '\n'.join(names).encode(),
+        'offsets': array('q', graph.offsets),
+        'targets': array('q', graph.targets),
+        'weights': graph.weights,
+        'bandwidths': graph.bandwidths,
+        'link_slots': link_slots,
+        'flow_ids': flows.ids,
+        'flow_groups': flow_groups,
+        'flow_sources': array('q', flows.sources),
+        'flow_destinations': array('q', flows.destinations),
+        'flow_bandwidths': flows.bandwidths,
+        'flow_priorities': flows.priorities,
+        'path_offsets': path_offsets,
+        'path_nodes': path_nodes,
+        'entry_flows': entry_flows,
+        'entry_hops': entry_hops,
+        'timeout_flows': timeout_flows,
+        'timeout_idle': timeout_idle,
+        'timeout_hard': timeout_hard,
+    }
+
+    snapshot_id = int.from_bytes(os.urandom(8), 'little') >> 1
+    position = _align(HEADER.size + SECTION.size * len(SECTIONS))
+    table = []
+    for name in SECTIONS:
+        length = len(sections[name]) * getattr(sections[name], 'itemsize', 1)
+        table.append((position, length))
+        position = _align(position + length)
+
+    temporary = path + '.tmp'
+    with open(temporary, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, snapshot_id, len(SECTIONS)))
+        for offset, length in table:
+            f.write(SECTION.pack(offset, length))
+        for name, (offset, length) in zip(SECTIONS, table):
+            f.write(b'\0' * (offset - f.tell()))
+            f.write(sections[name])
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporary, path)
+    return snapshot_id
+
+
+def load_snapshot(controller, path):
+    """Restore a snapshot into an empty controller; return the snapshot ID."""
+    if len(controller.topology.graph) or controller.active_flows:
+        raise ValueError("snapshots can only be loaded into an empty controller")
+    # Rebuilding allocates millions of acyclic containers; cyclic GC passes
+    # over them would only slow the restore down
+    collecting = gc.isenabled()
+    gc.disable()
+    try:
+        return _load_snapshot(controller, path)
+    finally:
+        if collecting:
+            gc.enable()
+
+
+def _load_snapshot(controller, path):
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        magic, snapshot_id, count = HEADER.unpack_from(mapped, 0)
+        if magic != MAGIC or count != len(SECTIONS):
+            raise ValueError(f"{path} is not a controller snapshot")
+        sections = {}
+        with memoryview(mapped) as view:
+            for i, name in enumerate(SECTIONS):
+                offset, length = SECTION.unpack_from(mapped, HEADER.size + i * SECTION.size)
+                sections[name] = view[offset:offset + length]
+            try:
+                meta = json.loads(bytes(sections['meta']))
+                names = _strings(sections['names'], len(sections['offsets']) // 8 - 1)
+                offsets = _array('l', sections['offsets'])
+                targets = _array('l', sections['targets'])
+                weights = _array('d', sections['weights'])
+                bandwidths = _array('d', sections['bandwidths'])
+                link_slots = _array('q', sections['link_slots'])
+                flow_ids = _array('q', sections['flow_ids'])
+                flow_groups = _array('q', sections['flow_groups'])
+                sources = _array('q', sections['flow_sources'])
+                destinations = _array('q', sections['flow_destinations'])
+                flow_bandwidths = _array('d', sections['flow_bandwidths'])
+                priorities = _array('d', sections['flow_priorities'])
+                path_offsets = _array('q', sections['path_offsets'])
+                path_nodes = _array('q', sections['path_nodes'])
+                entry_flows = _array('q', sections['entry_flows'])
+                entry_hops = _array('q', sections['entry_hops'])
+                timeout_flows = _array('q', sections['timeout_flows'])
+                timeout_idle = _array('d', sections['timeout_idle'])
+                timeout_hard = _array('d', sections['timeout_hard'])
+            finally:
+                for section in sections.values():
+                    section.release()
+
+    # Topology: install the CSR arrays directly
+    graph = controller.topology.graph
+    graph.names = names
+    graph.index = dict(zip(names, range(len(names))))
+    graph.offsets, graph.targets = offsets, targets
+    graph.weights, graph.bandwidths = weights, bandwidths
+    graph.extra = {}
+    graph.edge_count = len(targets)
+    graph.extra_count = graph.dead_count = 0
+    # Caches keyed on the graph version (max-flow networks) rebuild on their next query
+    graph.version += 1
+    controller.topology.path_cache.clear()
+    if controller.topology.all_pairs is not None:
+        controller.topology.all_pairs.invalidate()
+
+    controller.routing_mode = meta['routing_mode']
+    controller.capacity_router.utilization_weight = meta['utilization_weight']
+    controller.rebalance_every = meta['rebalance_every']
+
+    # Link statistics first, so they share membership dicts with the index
+    link_index = controller.link_index
+    slot_sources = array('l', [0]) * len(targets)
+    for u in range(len(names)):
+        for slot in range(offsets[u], offsets[u + 1]):
+            slot_sources[slot] = u
+    for slot in link_slots:
+        link_id = (names[slot_sources[slot]], names[targets[slot]])
+        controller.link_stats[link_id] = {
+            'bandwidth': bandwidths[slot],
+            'utilization': 0,
+            'flows': link_index.members(link_id)
+        }
+
+    # Flows go straight into the store's columns
+    nodes = path_nodes.tolist()
+    node_paths = [nodes[start:end] for start, end in zip(path_offsets, path_offsets[1:])]
+    groups = {flow_id: group for flow_id, group in zip(flow_ids, flow_groups) if group}
+    controller.active_flows.load_columns(flow_ids, sources, destinations, flow_bandwidths, priorities,
+                                         node_paths, groups, meta['next_flow_id'])
+
+    # The reverse index; one int object per flow ID is shared by every structure keyed by it
+    flow_ids = flow_ids.tolist()
+    links, loads = link_index.links, link_index.loads
+    lookup = names.__getitem__
+    paths = []
+    match_keys = []
+    for position, flow_id in enumerate(flow_ids):
+        path = list(map(lookup, node_paths[position]))
+        source, destination = names[sources[position]], names[destinations[position]]
+        bandwidth = flow_bandwidths[position]
+        paths.append(path)
+        match_keys.append((source, destination))
+        for link in zip(path, path[1:]):
+            members = links.get(link)
+            if members is None:
+                members = links[link] = {}
+                loads[link] = 0
+            members[flow_id] = None
+            loads[link] += bandwidth
+    for link_id, stats in controller.link_stats.items():
+        stats['utilization'] = link_index.load(link_id)
+    # The utilization index covers both directions of every link, and reset bumps its version so
+    # residual capacities are recomputed from the restored loads; history is not part of a snapshot
+    edge_links = [(names[slot_sources[slot]], names[targets[slot]]) for slot in range(len(targets))]
+    controller.utilization.reset((link, bandwidth, link_index.load(link))
+                                 for link, bandwidth in zip(edge_links, bandwidths))
+    controller.utilization_history.clear()
+
+    # Flow table: entries arrive bucket by bucket in priority order, so
+    # buckets are refilled by appending instead of insort
+    table = controller.flow_table
+    switches, by_flow = table.switches, table.by_flow
+    records = [None] * len(flow_ids)
+    bucket_switch = bucket_key = bucket = None
+    for position, hop in zip(entry_flows, entry_hops):
+        path = paths[position]
+        switch = path[hop]
+        record = records[position]
+        if record is None:
+            flow_id = flow_ids[position]
+            sort_key = (-normalize_priority(priorities[position]), flow_id)
+            record = records[position] = by_flow[flow_id] = (match_keys[position], sort_key, [])
+        match_key, sort_key, installed = record
+        if switch != bucket_switch or match_key != bucket_key:
+            buckets = switches.get(switch)
+            if buckets is None:
+                buckets = switches[switch] = {}
+            bucket = buckets.get(match_key)
+            if bucket is None:
+                bucket = buckets[match_key] = []
+            bucket_switch, bucket_key = switch, match_key
+        bucket.append((sort_key, path[hop + 1]))
+        installed.append(switch)
+    table.size += len(entry_flows)
+    # Older snapshots broke priority ties by install order rather than flow ID
+    for buckets in switches.values():
+        for bucket in buckets.values():
+            if len(bucket) > 1:
+                bucket.sort()
+
+    timeouts = controller.flow_timeouts
+    now = timeouts.clock()
+    for position, idle, hard in zip(timeout_flows, timeout_idle, timeout_hard):
+        timeouts.add(flow_ids[position], idle, hard, now)
+    return snapshot_id
+
+
+def read_journal_id(path):
+    """Return the snapshot ID a journal continues from, or None if it is missing or empty."""
+    try:
+        with open(path) as f:
+            header = f.readline()
+    except FileNotFoundError:
+        return None
+    if not header.strip():
+        return None
+    record = json.loads(header)
+    return record[1] if record[0] == 'journal' else None
+
+
+def replay_journal(controller, path):
+    """Apply every complete record after the journal header; return how many were applied."""
+    applied = 0
+    with open(path) as f:
+        f.readline()
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # A torn final write from a crash; everything before it is intact
+                logger.warning("Ignoring truncated journal record at the end of %s", path)
+                break
+            _apply(controller, record)
+            applied += 1
+    return applied
+
+
+def _apply(controller, record):
+    op = record[0]
+    if op == 'node':
+        controller.topology.add_node(record[1])
+    elif op == 'link':
+        controller._install_link(record[1], record[2], record[3])
+    elif op == 'unlink':
+        controller.topology.remove_edge(record[1], record[2])
+        controller._drop_link_stats(record[1], record[2])
+    elif op == 'flow':
+        _, flow_id, source, destination, path, bandwidth, priority, group = record
+        flow = controller.active_flows.get(flow_id)
+        if flow is None:
+            flow = {
+                'id': flow_id,
+                'source': source,
+                'destination': destination,
+                'path': path,
+                'bandwidth': bandwidth,
+                'priority': priority
+            }
+            if group:
+                flow['group'] = group
+            controller.active_flows[flow_id] = flow
+            controller._update_link_stats(flow, add=True)
+            controller.flow_table.add_entries(controller._build_flow_entries(flow))
+        else:
+            controller._move_flow(flow, path)
+    elif op == 'unflow':
+        flow = controller.active_flows.pop(record[1], None)
+        if flow is not None:
+            controller._update_link_stats(flow, add=False)
+            controller.flow_table.remove_flow(record[1])
+        controller.flow_timeouts.remove(record[1])
+    elif op == 'timeout':
+        controller.flow_timeouts.add(record[1], record[2], record[3])
+    elif op == 'mode':
+        controller.routing_mode = record[1]
+        controller.capacity_router.utilization_weight = record[2]
+        controller.rebalance_every = record[3]
+    else:
+        raise ValueError(f"unknown journal record: {op}")
+
+
+class Journal:
+    """Append-only, line-buffered log of the mutations since a snapshot."""
+
+    def __init__(self, path, snapshot_id=0):
+        self.path = path
+        self.records = 0
+        if read_journal_id(path) == snapshot_id:
+            self.file = open(path, 'a', buffering=1)
+        else:
+            self.file = None
+            self.reset(snapshot_id)
+
+    def reset(self, snapshot_id):
+        """Start over after a snapshot: truncate and write a header naming it."""
+        if self.file is not None:
+            self.file.close()
+        self.file = open(self.path, 'w', buffering=1)
+        self.file.write(json.dumps(['journal', snapshot_id]) + "\n")
+        self.records = 0
+
+    def append(self, record):
+        self.file.write(json.dumps(record) + "\n")
+        self.records += 1
+
+    def extend(self, records):
+        """Append several records with a single write."""
+        lines = [json.dumps(record) for record in records]
+        if lines:
+            self.file.write("\n".join(lines) + "\n")
+            self.records += len(lines)
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+def _align(position):
+    return (position + 7) & ~7
+
+
+def _array(typecode, section):
+    """Copy a little-endian 8-byte section into an array of typecode."""
+    values = array(typecode)
+    if values.itemsize == 8:
+        values.frombytes(section)
+    else:
+        values.extend(section.cast('q'))
+    return values
+
+
+def _strings(section, count):
+    """Split a newline-joined section holding count strings."""
+    return str(section, 'utf-8').split('\n') if count else []
@@ -0,0 +1,320 @@
+"""Topology rendering on a background worker.
+
+The controller thread only captures a snapshot (a copy of the graph arrays,
+link loads and a handful of flow paths); aggregation, layout and drawing all
+happen on the worker. SVG is written directly with the standard library;
+PNG and PDF use matplotlib, imported on first use. NumPy, if installed, is
+used for a force-directed layout; without it nodes are laid out in BFS
+layers.
+"""
+import logging
+import math
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+logger = logging.getLogger(__name__)
+
+MAX_NODES = 400  # larger topologies are aggregated down to about this many nodes
+MAX_FLOWS = 12  # flows drawn as overlays
+LAYOUT_ITERATIONS = 80
+LABEL_LIMIT = 60  # node labels are drawn only for topologies up to this size
+
+UTILIZATION_COLORS = ((0.0, (44, 160, 44)), (0.5, (255, 191, 0)), (1.0, (214, 39, 40)))
+FLOW_COLORS = ('#1f77b4', '#9467bd', '#e377c2', '#17becf', '#8c564b', '#7f7f7f', '#bcbd22', '#ff7f0e')
+
+
+class RenderSnapshot:
+    """What a render needs, copied from the live topology so the worker never reads shared state."""
+
+    def __init__(self, graph, link_stats=None, active_flows=None, max_flows=MAX_FLOWS):
+        # Compacting is left to the worker; the copy itself is a few array copies
+        self.graph = graph.copy(compact=False)
+        self.loads = {link: stats['utilization'] for link, stats in (link_stats or {}).items()}
+        # The most recently admitted flows, without scanning all of them
+        flow_ids = islice(reversed(active_flows), max_flows) if active_flows else ()
+        self.flows = [(str(flow_id), tuple(active_flows[flow_id]['path'])) for flow_id in flow_ids]
+
+
+class TopologyRenderer:
+    """Renders topology snapshots to image files on a single worker thread."""
+
+    def __init__(self, max_nodes=MAX_NODES, max_flows=MAX_FLOWS):
+        self.max_nodes = max_nodes
+        self.max_flows = max_flows
+        self._executor = None
+
+    def submit(self, graph, filename, link_stats=None, active_flows=None):
+        """Capture the topology now and render it to filename in the background; return a Future."""
+        snapshot = RenderSnapshot(graph, link_stats, active_flows, self.max_flows)
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='render')
+        return self._executor.submit(render, snapshot, filename, self.max_nodes)
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+def render(snapshot, filename, max_nodes=MAX_NODES):
+    """Lay out and draw a snapshot; return a summary dict."""
+    start = time.perf_counter()
+    graph = snapshot.graph
+    names = graph.names
+    n = len(names)
+
+    # Undirected links with the utilization of the busier direction
+    links = {}
+    for u, v, bandwidth in graph.iter_edges():
+        if u == v:
+            continue
+        key = (u, v) if u < v else (v, u)
+        load = snapshot.loads.get((names[u], names[v]), 0)
+        utilization = load / bandwidth if bandwidth > 0 else 0.0
+        if key not in links or utilization > links[key][1]:
+            links[key] = (bandwidth, utilization)
+
+    clusters, labels, sizes = aggregate(graph, max_nodes)
+    edges = {}
+    for (u, v), (bandwidth, utilization) in links.items():
+        a, b = clusters[u], clusters[v]
+        if a == b:
+            continue
+        key = (a, b) if a < b else (b, a)
+        total, peak = edges.get(key, (0.0, 0.0))
+        edges[key] = (total + bandwidth, max(peak, utilization))
+
+    flows = []
+    for flow_id, path in snapshot.flows:
+        points = []
+        for node in path:
+            c = clusters[graph.index[node]] if node in graph.index else None
+            if c is not None and (not points or points[-1] != c):
+                points.append(c)
+        if len(points) > 1:
+            flows.append((flow_id, points))
+
+    positions = layout(len(labels), list(edges))
+    title = f"{n} switches, {len(links)} links"
+    if len(labels) < n:
+        title += f" (aggregated into {len(labels)} groups)"
+
+    extension = os.path.splitext(filename)[1].lower()
+    if extension in ('.png', '.pdf') and not _draw_matplotlib(filename, positions, labels, sizes, edges, flows, title):
+        filename = os.path.splitext(filename)[0] + '.svg'
+        logger.warning("matplotlib is not installed; writing %s instead", filename)
+        extension = '.svg'
+    if extension not in ('.png', '.pdf'):
+        _draw_svg(filename, positions, labels, sizes, edges, flows, title)
+
+    return {
+        'filename': filename,
+        'switches': n,
+        'links': len(links),
+        'nodes_drawn': len(labels),
+        'links_drawn': len(edges),
+        'flows_drawn': len(flows),
+        'seconds': time.perf_counter() - start
+    }
+
+
+def aggregate(graph, max_nodes):
+    """Group nodes into at most max_nodes clusters of nearby nodes.
+
+    Nodes are numbered in breadth-first order, component by component, and
+    each run of consecutive positions becomes a cluster, so clusters follow
+    the topology and their count is bounded. Returns ``(clusters, labels,
+    sizes)``: the cluster of every node, and a label and member count per
+    cluster. Small graphs map each node to itself.
+    """
+    n = len(graph.names)
+    if n <= max_nodes:
+        return list(range(n)), list(graph.names), [1] * n
+
+    target = math.ceil(n / max_nodes)
+    order = []
+    seen = bytearray(n)
+    for root in range(n):
+        if seen[root]:
+            continue
+        seen[root] = 1
+        head = len(order)
+        order.append(root)
+        while head < len(order):
+            u = order[head]
+            head += 1
+            for v, _, _ in graph.neighbors(u):
+                if not seen[v]:
+                    seen[v] = 1
+                    order.append(v)
+
+    clusters = [0] * n
+    for position, u in enumerate(order):
+        clusters[u] = position // target
+    labels = []
+    sizes = []
+    for start in range(0, n, target):
+        size = min(target, n - start)
+        labels.append(f"{graph.names[order[start]]} +{size - 1}")
+        sizes.append(size)
+    return clusters, labels, sizes
+
+
+def layout(n, edges, iterations=LAYOUT_ITERATIONS, seed=0):
+    """Return [(x, y)] in the unit square: force-directed with NumPy, BFS layers without."""
+    if n == 0:
+        return []
+    try:
+        import numpy as np
+    except ImportError:
+        return _layered_layout(n, edges)
+
+    rng = np.random.default_rng(seed)
+    positions = rng.random((n, 2))
+    if not edges:
+        return [tuple(p) for p in positions]
+    sources = np.array([a for a, _ in edges])
+    targets = np.array([b for _, b in edges])
+    k = 1 / math.sqrt(n)
+    temperature = 0.1
+    for _ in range(iterations):
+        # Fruchterman-Reingold: all-pairs repulsion, attraction along links
+        delta = positions[:, None, :] - positions[None, :, :]
+        distance = np.maximum(np.linalg.norm(delta, axis=2), 1e-4)
+        displacement = (delta * (k * k / distance ** 2)[:, :, None]).sum(axis=1)
+        pull = positions[sources] - positions[targets]
+        length = np.maximum(np.linalg.norm(pull, axis=1), 1e-4)
+        force = pull * (length / k)[:, None]
+        np.add.at(displacement, sources, -force)
+        np.add.at(displacement, targets, force)
+        step = np.maximum(np.linalg.norm(displacement, axis=1), 1e-4)
+        positions += displacement / step[:, None] * np.minimum(step, temperature)[:, None]
+        temperature *= 0.95
+    low = positions.min(axis=0)
+    span = np.maximum(positions.max(axis=0) - low, 1e-9)
+    return [tuple(p) for p in (positions - low) / span]
+
+
+def _layered_layout(n, edges):
+    """Place nodes in rows by BFS depth from the best-connected node of each component."""
+    adjacency = [[] for _ in range(n)]
+    for a, b in edges:
+        adjacency[a].append(b)
+        adjacency[b].append(a)
+    depth = [-1] * n
+    rows = []
+    for root in sorted(range(n), key=lambda u: -len(adjacency[u])):
+        if depth[root] >= 0:
+            continue
+        depth[root] = 0
+        frontier = [root]
+        level = 0
+        while frontier:
+            if len(rows) <= level:
+                rows.append([])
+            rows[level].extend(frontier)
+            following = []
+            for u in frontier:
+                for v in adjacency[u]:
+                    if depth[v] < 0:
+                        depth[v] = level + 1
+                        following.append(v)
+            frontier = following
+            level += 1
+    positions = [None] * n
+    for level, row in enumerate(rows):
+        for i, u in enumerate(row):
+            positions[u] = ((i + 0.5) / len(row), level / max(1, len(rows) - 1))
+    return positions
+
+
+def utilization_color(utilization):
+    """Green at 0%, amber at 50%, red at 100% or more."""
+    utilization = max(0.0, min(1.0, utilization))
+    for (low, low_rgb), (high, high_rgb) in zip(UTILIZATION_COLORS, UTILIZATION_COLORS[1:]):
+        if utilization <= high:
+            t = (utilization - low) / (high - low)
+            return '#%02x%02x%02x' % tuple(round(a + (b - a) * t) for a, b in zip(low_rgb, high_rgb))
+    return '#%02x%02x%02x' % UTILIZATION_COLORS[-1][1]
+
+
+def _line_width(bandwidth):
+    return 0.5 + min(4.0, math.log10(1 + bandwidth))
+
+
+def _node_radius(size):
+    return 3 + min(6.0, 1.5 * math.log2(size))
+
+
+def _draw_svg(filename, positions, labels, sizes, edges, flows, title, width=1200, height=900, margin=40):
+    def point(c):
+        x, y = positions[c]
+        return margin + x * (width - 2 * margin), margin + y * (height - 2 * margin)
+
+    out = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+        f'viewBox="0 0 {width} {height}" font-family="sans-serif" font-size="10">',
+        '<rect width="100%" height="100%" fill="white"/>',
+        f'<text x="{margin}" y="24" font-size="14">{_escape(title)}</text>',
+    ]
+    for (a, b), (bandwidth, utilization) in edges.items():
+        (x1, y1), (x2, y2) = point(a), point(b)
+        out.append(f'<line x1="{x1:.1f}" y1="{y1:.1f}" x2="{x2:.1f}" y2="{y2:.1f}" '
+                   f'stroke="{utilization_color(utilization)}" stroke-width="{_line_width(bandwidth):.2f}">'
+                   f'<title>{utilization * 100:.1f}% of {bandwidth:g}</title></line>')
+    for i, (flow_id, points) in enumerate(flows):
+        coordinates = ' '.join('%.1f,%.1f' % point(c) for c in points)
+        out.append(f'<polyline points="{coordinates}" fill="none" stroke="{FLOW_COLORS[i % len(FLOW_COLORS)]}" '
+                   f'stroke-width="2" stroke-dasharray="6,3" opacity="0.8"><title>{_escape(flow_id)}</title>'
+                   f'</polyline>')
+    for c, label in enumerate(labels):
+        x, y = point(c)
+        out.append(f'<circle cx="{x:.1f}" cy="{y:.1f}" r="{_node_radius(sizes[c]):.1f}" fill="#444">'
+                   f'<title>{_escape(label)}</title></circle>')
+        if len(labels) <= LABEL_LIMIT:
+            out.append(f'<text x="{x + 6:.1f}" y="{y - 6:.1f}">{_escape(label)}</text>')
+    out.append('</svg>')
+    with open(filename, 'w') as f:
+        f.write('\n'.join(out))
+
+
+def _draw_matplotlib(filename, positions, labels, sizes, edges, flows, title):
+    """Draw with matplotlib's object API (no pyplot, so it is safe off the main thread)."""
+    try:
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.collections import LineCollection
+        from matplotlib.figure import Figure
+    except ImportError:
+        return False
+
+    figure = Figure(figsize=(12, 9))
+    FigureCanvasAgg(figure)
+    axes = figure.add_subplot()
+    axes.set_axis_off()
+    axes.set_title(title)
+    # Match the SVG orientation (y grows downwards)
+    axes.set_xlim(-0.05, 1.05)
+    axes.set_ylim(1.05, -0.05)
+    segments = [(positions[a], positions[b]) for a, b in edges]
+    colors = [utilization_color(utilization) for _, utilization in edges.values()]
+    widths = [_line_width(bandwidth) for bandwidth, _ in edges.values()]
+    axes.add_collection(LineCollection(segments, colors=colors, linewidths=widths, zorder=1))
+    for i, (flow_id, points) in enumerate(flows):
+        axes.plot([positions[c][0] for c in points], [positions[c][1] for c in points],
+                  linestyle='--', linewidth=2, alpha=0.8, color=FLOW_COLORS[i % len(FLOW_COLORS)],
+                  label=flow_id, zorder=2)
+    axes.scatter([p[0] for p in positions], [p[1] for p in positions],
+                 s=[_node_radius(size) ** 2 for size in sizes], color='#444', zorder=3)
+    if len(labels) <= LABEL_LIMIT:
+        for (x, y), label in zip(positions, labels):
+            axes.annotate(label, (x, y), xytext=(4, 4), textcoords='offset points', fontsize=8)
+    if flows:
+        axes.legend(loc='lower right', fontsize=7)
+    figure.savefig(filename, dpi=100)
+    return True
+
+
+def _escape(text):
+    return str(text).replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
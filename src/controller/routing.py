@@ -0,0 +1,130 @@
+import heapq
+
+INFINITY = float('infinity')
+
+
+class CapacityRouter:
+    """Capacity-aware path selection over a Topology.
+
+    Residual capacity of a directed link is its bandwidth minus the load the
+    LinkFlowIndex has recorded on it. Links without enough residual capacity
+    for a demand are skipped. With ``utilization_weight`` > 0, a link's
+    1/bandwidth weight is scaled by ``1 + utilization_weight * utilization``
+    so lightly loaded links are preferred.
+    """
+
+    def __init__(self, topology, link_index, utilization_weight=0.0, ecmp_slack=0.05, max_paths=4):
+        self.topology = topology
+        self.link_index = link_index
+        self.utilization_weight = utilization_weight
+        self.ecmp_slack = ecmp_slack  # paths within this fraction of the best cost count as equal
+        self.max_paths = max_paths
+
+    def residual(self, source, destination):
+        """Return the unreserved bandwidth on a directed link."""
+        edge = self.topology.edges.get((source, destination))
+        if edge is None:
+            return 0
+        return edge['bandwidth'] - self.link_index.load((source, destination))
+
+    def find_path(self, source, destination, demand, banned_links=(), released=None, enforce_capacity=True):
+        """Return the cheapest path whose links all have demand spare capacity, or None.
+
+        ``released`` is an optional path whose reservation of ``demand`` should
+        be treated as freed, e.g. the current path of a flow being moved.
+        With ``enforce_capacity`` False, full links are not skipped, only
+        penalized by the utilization weighting.
+        """
+        graph = self.topology.graph
+        start = graph.index.get(source)
+        target = graph.index.get(destination)
+        if start is None or target is None:
+            return None
+
+        names = graph.names
+        loads = self.link_index.loads
+        freed = set(zip(released, released[1:])) if released else ()
+        utilization_weight = self.utilization_weight
+        if not enforce_capacity:
+            utilization_weight = utilization_weight or 1.0
+
+        distances = {start: 0.0}
+        previous = {start: -1}
+        priority_queue = [(0.0, start)]
+        while priority_queue:
+            current_distance, u = heapq.heappop(priority_queue)
+            if current_distance > distances[u]:
+                continue
+            if u == target:
+                path = []
+                while u != -1:
+                    path.append(names[u])
+                    u = previous[u]
+                return path[::-1]
+
+            for v, weight, bandwidth in graph.neighbors(u):
+                link = (names[u], names[v])
+                if link in banned_links:
+                    continue
+                load = loads.get(link, 0)
+                if link in freed:
+                    load -= demand
+                if enforce_capacity and bandwidth - load < demand:
+                    continue
+                if utilization_weight:
+                    weight *= 1 + utilization_weight * load / bandwidth
+                distance = current_distance + weight
+                if distance < distances.get(v, INFINITY):
+                    distances[v] = distance
+                    previous[v] = u
+                    heapq.heappush(priority_queue, (distance, v))
+        return None
+
+    def find_split(self, source, destination, demand):
+        """Split demand across equal- or near-equal-cost paths with spare capacity.
+
+        Returns a list of ``(path, bandwidth)`` shares summing to demand, or
+        None if the candidate paths cannot carry it together.
+        """
+        candidates = []
+        best_cost = None
+        for path in self.topology.iter_shortest_paths(source, destination):
+            cost = self._path_cost(path)
+            if best_cost is None:
+                best_cost = cost
+            elif cost > best_cost * (1 + self.ecmp_slack):
+                break
+            candidates.append(path)
+            if len(candidates) >= self.max_paths:
+                break
+        if not candidates:
+            return None
+
+        # Fill paths in cost order, each up to its fair share of the demand,
+        # then top up with whatever capacity is left
+        reserved = {}
+        shares = [0] * len(candidates)
+        remaining = demand
+        fair_share = demand / len(candidates)
+        for cap in (fair_share, demand):
+            for i, path in enumerate(candidates):
+                if remaining <= 0:
+                    break
+                room = self._bottleneck(path, reserved)
+                amount = min(room, cap - shares[i], remaining)
+                if amount <= 0:
+                    continue
+                shares[i] += amount
+                remaining -= amount
+                for link in zip(path, path[1:]):
+                    reserved[link] = reserved.get(link, 0) + amount
+        if remaining > 1e-9:
+            return None
+        return [(path, share) for path, share in zip(candidates, shares) if share > 0]
+
+    def _bottleneck(self, path, reserved):
+        return min(self.residual(*link) - reserved.get(link, 0) for link in zip(path, path[1:]))
+
+    def _path_cost(self, path):
+        edges = self.topology.edges
+        return sum(edges[link]['weight'] for link in zip(path, path[1:]))
@@ -1,40 +1,92 @@
+import bisect
+import logging
+import os
+import time
+
+from controller.failure_analysis import FailureAnalyzer
+from controller.fast_reroute import FastReroute
+from controller.flow_store import FlowStore, normalize_priority
+from controller.flow_timeouts import FlowTimeouts
+from controller.link_index import LinkFlowIndex
+from controller.max_flow import MaxFlowEngine
+from controller.metrics import Metrics
+from controller.partition import PartitionedRouter, load_regions
+from controller.persistence import Journal, load_snapshot, read_journal_id, replay_journal, write_snapshot
+from controller.routing import CapacityRouter
+from controller.southbound import SouthboundPipeline
 from controller.topology import Topology
+from controller.utilization import UtilizationHistory, UtilizationIndex
+
+logger = logging.getLogger(__name__)
 
 #My supercool hash: c2580be5458f4d194050d82cadd899e8e22c8ef869bc98ca264e8fa9e65a5a99
 
 class SDNController:
     def __init__(self):
         self.topology = Topology()
-        self.flow_table = FlowTable()
-        self.active_flows = {}
+        self.southbound = SouthboundPipeline()  # pushes flow table deltas to the switches
+        self.flow_table = FlowTable(southbound=self.southbound)
+        self.active_flows = FlowStore(self.topology.graph)  # {flow_id: flow}, stored as columns
         self.link_stats = {}
+        self.link_index = LinkFlowIndex()  # {(src, dst): flows routed over the link}
+        self.utilization = UtilizationIndex()  # utilization of every directed link, for top-k queries
+        self.utilization_history = UtilizationHistory(self.utilization)  # sampled by sample_utilization
+        self.max_flow_engine = MaxFlowEngine(self)  # max throughput between switches, cached per topology
+        self.routing_mode = 'shortest'  # or 'capacity' to route around full links
+        self.capacity_router = CapacityRouter(self.topology, self.link_index)
+        self.fast_reroute = FastReroute(self.topology)  # backup paths for failover, off until enabled
+        self.flow_timeouts = FlowTimeouts()  # idle/hard timeouts of the flows that have them
+        self.partition = None  # PartitionedRouter computing shortest paths per domain, while enabled
+        self._partition_config = None  # (domains, regions) the partition was built with
+        self.rebalance_every = 0  # run a rebalancing pass after this many admissions (0 = never)
+        self._admitted_since_rebalance = 0
+        self.metrics = Metrics()  # instrumentation, installed only while enabled
+        self.journal = None  # append-only Journal of mutations since the last snapshot
+        self.snapshot_id = 0  # ID of the snapshot last written or loaded (0 = none)
+        self.metrics.gauges.update({
+            'active_flows': lambda: len(self.active_flows),
+            'flow_table_entries': lambda: len(self.flow_table),
+            'flow_store_bytes': lambda: self.active_flows.memory_usage(),
+            'flows_with_timeouts': lambda: len(self.flow_timeouts),
+            'flows_expired': lambda: sum(self.flow_timeouts.expired.values()),
+            'peak_link_utilization': lambda: self.utilization.peak(),
+            'path_cache_hits': lambda: self.topology.path_cache.hits,
+            'path_cache_misses': lambda: self.topology.path_cache.misses,
+            'southbound_messages': lambda: self.southbound.totals['messages'],
+            'southbound_bytes': lambda: self.southbound.totals['bytes_sent'],
+        })
+        self.metrics.distributions['failover_seconds'] = self.fast_reroute.latency
         
     def add_switch(self, switch_id):
         """Add a switch to the network topology."""
-        self.topology.add_node(switch_id)
+        if self.topology.add_node(switch_id):
+            self._record('node', switch_id)
+            if self.partition is not None:
+                self.partition.node_added(switch_id)
         
     def add_link(self, source, destination, bandwidth):
         """Add a link between two switches with specified bandwidth."""
-        self.topology.add_edge(source, destination, bandwidth=bandwidth)
-        # Initialize link statistics
-        link_id = (source, destination)
-        self.link_stats[link_id] = {
-            'bandwidth': bandwidth,
-            'utilization': 0,
-            'flows': []
-        }
-        print(f"Link added between {source} and {destination} with bandwidth {bandwidth}")
+        self._install_link(source, destination, bandwidth)
+        self._record('link', source, destination, bandwidth)
+        if self.partition is not None:
+            self.partition.link_added(source, destination, bandwidth)
+        self.fast_reroute.link_added()
+        logger.info("Link added between %s and %s with bandwidth %s", source, destination, bandwidth,
+                    extra={'event': 'link_added', 'source': source, 'destination': destination,
+                           'bandwidth': bandwidth})
         
     def remove_link(self, source, destination):
         """Remove a link between two switches."""
         self.topology.remove_edge(source, destination)
-        # Remove link statistics
-        link_id = (source, destination)
-        if link_id in self.link_stats:
-            del self.link_stats[link_id]
-        # Reconfigure affected flows
+        self._record('unlink', source, destination)
+        if self.partition is not None:
+            self.partition.link_removed(source, destination)
+        # Reconfigure affected flows and push the reconvergence to the switches
         self._reconfigure_affected_flows(source, destination)
-        print(f"Link removed between {source} and {destination}")
+        self._drop_link_stats(source, destination)
+        self.fast_reroute.link_removed(source, destination)
+        logger.info("Link removed between %s and %s", source, destination,
+                    extra={'event': 'link_removed', 'source': source, 'destination': destination})
         
     def list_switches(self):
         """List all switches in the network."""
@@ -50,26 +102,33 @@ class SDNController:
         """Compute the shortest path between source and destination."""
         return self.topology.get_shortest_path(source, destination)
         
-    def add_flow(self, source, destination, bandwidth, priority):
-        """Add a new flow between source and destination."""
+    def add_flow(self, source, destination, bandwidth, priority, idle_timeout=0, hard_timeout=0):
+        """Add a new flow between source and destination.
+        
+        The flow is removed once it has been idle for idle_timeout seconds
+        or hard_timeout seconds after it was added; 0 disables either.
+        """
+        _check_timeouts(idle_timeout, hard_timeout)
         # Compute path for the flow
-        path = self.compute_shortest_path(source, destination)
+        path = self._route_flow(source, destination, bandwidth)
         if not path:
-            print(f"Cannot add flow: no path exists between {source} and {destination}")
-            return
+            if self.routing_mode == 'capacity':
+                logger.warning("Cannot add flow: no path with %s spare capacity between %s and %s",
+                               bandwidth, source, destination,
+                               extra={'event': 'flow_rejected', 'source': source, 'destination': destination})
+            else:
+                logger.warning("Cannot add flow: no path exists between %s and %s", source, destination,
+                               extra={'event': 'flow_rejected', 'source': source, 'destination': destination})
+            return None
             
-        flow_id = f"flow-{source}-{destination}-{len(self.active_flows)}"
-        flow = {
-            'id': flow_id,
-            'source': source,
-            'destination': destination,
-            'path': path,
-            'bandwidth': bandwidth,
-            'priority': priority
-        }
+        flow = self._new_flow(source, destination, path, bandwidth, priority)
+        flow_id = flow['id']
         
         # Add flow to active flows
         self.active_flows[flow_id] = flow
+        self._record_flow(flow)
+        self._set_timeouts(flow_id, idle_timeout, hard_timeout)
+        self.fast_reroute.flows_routed([flow])
         
         # Update link utilization
         self._update_link_stats(flow, add=True)
@@ -77,22 +136,296 @@ class SDNController:
         # Generate flow table entries
         self._generate_flow_entries(flow)
         
-        print(f"Flow {flow_id} added from {source} to {destination} with priority {priority}")
+        logger.info("Flow %s added from %s to %s with priority %s", flow_id, source, destination, priority,
+                    extra={'event': 'flow_added', 'flow_id': flow_id, 'source': source,
+                           'destination': destination, 'priority': priority})
+        self._after_admission(1)
+        return flow_id
+        
+    def add_flow_split(self, source, destination, bandwidth, priority, idle_timeout=0, hard_timeout=0):
+        """Add a flow split ECMP-style across equal- or near-equal-cost paths with spare capacity."""
+        _check_timeouts(idle_timeout, hard_timeout)
+        shares = self.capacity_router.find_split(source, destination, bandwidth)
+        if not shares:
+            logger.warning("Cannot add flow: equal-cost paths between %s and %s cannot carry %s",
+                           source, destination, bandwidth,
+                           extra={'event': 'flow_rejected', 'source': source, 'destination': destination})
+            return []
+            
+        flow_ids = []
+        group = None
+        for path, share in shares:
+            flow = self._new_flow(source, destination, path, share, priority)
+            group = group or flow['id']
+            flow['group'] = group
+            self.active_flows[flow['id']] = flow
+            self._record_flow(flow)
+            self._set_timeouts(flow['id'], idle_timeout, hard_timeout)
+            self._update_link_stats(flow, add=True)
+            self.flow_table.replace_flow_entries(flow['id'], self._build_flow_entries(flow))
+            self.fast_reroute.flow_routed(flow)
+            flow_ids.append(flow['id'])
+            logger.debug("  %s: %g via %s", flow['id'], share, ' -> '.join(path))
+        logger.info("Flow group %s added from %s to %s over %d paths", group, source, destination, len(shares),
+                    extra={'event': 'flow_group_added', 'flow_id': group, 'flow_ids': flow_ids,
+                           'source': source, 'destination': destination})
+        self.fast_reroute.schedule()
+        self._after_admission(len(flow_ids))
+        return flow_ids
+        
+    def remove_flow(self, flow_id):
+        """Remove an active flow and delete its flow table entries from the switches."""
+        if not self._remove_flows([flow_id]):
+            logger.warning("Cannot remove flow %s: no such active flow", flow_id)
+            return False
+        self.southbound.flush('remove_flow')
+        logger.info("Flow %s removed", flow_id, extra={'event': 'flow_removed', 'flow_id': flow_id})
+        return True
+        
+    def flow_activity(self, flow_ids):
+        """Note traffic on flows (e.g. from switch counters), restarting their idle timeouts."""
+        self.flow_timeouts.touch(flow_ids)
+        
+    def expire_flows(self, now=None):
+        """Remove every flow whose idle or hard timeout has passed; return how many expired.
+        
+        Only the flows that are due are looked at. Their link statistics and
+        flow table entries are cleaned up together and pushed to the
+        switches in one batch.
+        """
+        expired = self.flow_timeouts.expire(now)
+        if not expired:
+            return 0
+        removed = self._remove_flows(expired)
+        self.southbound.flush('expire_flows')
+        logger.info("%d flows expired", len(removed), extra={'event': 'flows_expired'})
+        return len(removed)
+        
+    def set_routing_mode(self, mode, utilization_weight=None, rebalance_every=None):
+        """Switch between 'shortest' (static 1/bandwidth) and 'capacity' (residual-aware) routing."""
+        if mode not in ('shortest', 'capacity'):
+            logger.warning("Unknown routing mode: %s (expected 'shortest' or 'capacity')", mode)
+            return
+        self.routing_mode = mode
+        if utilization_weight is not None:
+            self.capacity_router.utilization_weight = utilization_weight
+        if rebalance_every is not None:
+            self.rebalance_every = int(rebalance_every)
+        self._record('mode', mode, self.capacity_router.utilization_weight, self.rebalance_every)
+        logger.info("Routing mode set to %s", mode)
+        
+    def rebalance(self, max_moves=1000):
+        """Move flows off the most utilized link while that lowers the peak utilization.
+        
+        Returns a dict with the number of flows moved and the maximum link
+        utilization before and after the pass.
+        """
+        before, _ = self._max_link_utilization()
+        moves = 0
+        while moves < max_moves:
+            peak, hot_link = self._max_link_utilization()
+            if hot_link is None or peak <= 0:
+                break
+                
+            # Try the biggest flows on the hottest link first
+            candidates = sorted(self.link_index.flows_on(hot_link),
+                                key=lambda flow_id: self.active_flows[flow_id]['bandwidth'], reverse=True)
+            for flow_id in candidates:
+                flow = self.active_flows[flow_id]
+                new_path = self._rebalance_path(flow, hot_link)
+                if new_path and self._path_peak(new_path, flow) < peak - 1e-9:
+                    self._move_flow(flow, new_path)
+                    moves += 1
+                    break
+            else:
+                break
+                
+        after, _ = self._max_link_utilization()
+        self.fast_reroute.schedule()
+        self.southbound.flush('rebalance')
+        return {'moves': moves, 'max_utilization_before': before, 'max_utilization_after': after}
+        
+    def run_rebalance(self):
+        """Run a rebalancing pass and report the change in peak link utilization."""
+        result = self.rebalance()
+        print(f"Rebalanced {result['moves']} flows: max link utilization "
+              f"{result['max_utilization_before'] * 100:.2f}% -> {result['max_utilization_after'] * 100:.2f}%")
+        
+    def reoptimize(self, max_flows=None):
+        """Move flows that fast reroute left on backup paths back onto their best path.
+        
+        Failover installs backups without routing; this is the deferred
+        recomputation. Returns the number of flows moved.
+        """
+        moved = 0
+        for flow_id in self.fast_reroute.take_suboptimal(max_flows):
+            flow = self.active_flows.get(flow_id)
+            if flow is None:
+                continue
+            if self.routing_mode == 'capacity':
+                path = self.capacity_router.find_path(flow['source'], flow['destination'], flow['bandwidth'],
+                                                      released=flow['path'])
+            else:
+                path = self.compute_shortest_path(flow['source'], flow['destination'])
+            if path and path != flow['path']:
+                self._move_flow(flow, path)
+                moved += 1
+        self.fast_reroute.schedule()
+        self.southbound.flush('reoptimize')
+        return moved
+        
+    def run_reoptimize(self):
+        """Move flows off backup paths and report how many moved."""
+        moved = self.reoptimize()
+        print(f"Moved {moved} flows from backup paths back to their best path.")
+        
+    def add_flows(self, requests):
+        """Admit many flows at once.
+        
+        Args:
+            requests: Iterable of (source, destination, bandwidth, priority)
+                tuples or dicts with those keys, optionally followed by
+                (or holding) an idle_timeout and a hard_timeout
+            
+        Returns:
+            A list with one result dict per request, in request order, holding
+            'status' ('added' or 'rejected'), the flow 'id' and 'path' when
+            added, or a 'reason' when rejected.
+        """
+        requests = [_flow_request(request) for request in requests]
+        if self.routing_mode != 'shortest':
+            return self._add_flows_sequential(requests)
+        results = []
+        admitted = []
+        timed = []
+        paths = self._shortest_paths([request[:2] for request in requests])
+        for request, path in zip(requests, paths):
+            source, destination, bandwidth, priority, idle_timeout, hard_timeout = request
+            if not path:
+                results.append({
+                    'status': 'rejected',
+                    'source': source,
+                    'destination': destination,
+                    'reason': 'no path'
+                })
+                continue
+            flow = self._new_flow(source, destination, path, bandwidth, priority)
+            self.active_flows[flow['id']] = flow
+            admitted.append(flow)
+            if idle_timeout or hard_timeout:
+                timed.append((flow['id'], idle_timeout, hard_timeout))
+            results.append({
+                'status': 'added',
+                'id': flow['id'],
+                'source': source,
+                'destination': destination,
+                'path': path
+            })
+            
+        # Apply link statistics and flow table updates in bulk
+        if self.journal is not None:
+            self.journal.extend([_flow_record(flow) for flow in admitted])
+        for flow_id, idle_timeout, hard_timeout in timed:
+            self._set_timeouts(flow_id, idle_timeout, hard_timeout)
+        self._update_link_stats_bulk(admitted)
+        entries = []
+        for flow in admitted:
+            entries.extend(self._build_flow_entries(flow))
+        self.flow_table.add_entries(entries)
+        self.fast_reroute.flows_routed(admitted)
+        self._after_admission(len(admitted))
+        return results
         
     def simulate_link_failure(self, source, destination):
         """Simulate a link failure between two switches."""
-        print(f"Simulating failure of link between {source} and {destination}")
+        logger.info("Simulating failure of link between %s and %s", source, destination,
+                    extra={'event': 'link_failure', 'source': source, 'destination': destination})
         # Temporarily remove the link
         if self.topology.has_edge(source, destination):
+            # Removing the link also reconfigures the flows that used it
             self.remove_link(source, destination)
-            # Reconfigure affected flows
-            self._reconfigure_affected_flows(source, destination)
         else:
-            print(f"No link exists between {source} and {destination}")
+            logger.warning("No link exists between %s and %s", source, destination)
+            
+    def analyze_failures(self, depth=1, processes=None, links=None):
+        """Evaluate link failure scenarios on a snapshot without touching the live network.
+        
+        Args:
+            depth: 1 for every single-link failure (N-1), 2 to add every pair (N-2)
+            processes: Worker processes to spread scenarios over (default: all cores)
+            links: Optional list of (source, destination) links to restrict the sweep to
             
-    def visualize_topology(self):
-        """Visualize the network topology."""
-        self.topology.visualize(self.link_stats, self.active_flows)
+        Returns:
+            One dict per scenario with the 'failed_links', the 'rerouted' and
+            'dropped' flow IDs and the post-failure 'peak_utilization'.
+        """
+        analyzer = FailureAnalyzer(self, processes=processes)
+        if links is not None:
+            index = analyzer.snapshot.graph.index
+            links = [(index[source], index[destination]) for source, destination in links]
+        return analyzer.run(depth=int(depth), links=links)
+        
+    def show_failure_analysis(self, depth=1, top=10):
+        """Run a what-if failure sweep and print the worst scenarios."""
+        results = self.analyze_failures(depth=depth)
+        if not results:
+            print("No links to analyze.")
+            return
+        with_drops = sum(1 for result in results if result['dropped'])
+        print(f"Failure Analysis (N-{int(depth)}): {len(results)} scenarios, {with_drops} drop flows")
+        print("----------------------------------------")
+        worst = sorted(results, key=lambda r: (len(r['dropped']), r['peak_utilization']), reverse=True)
+        for result in worst[:top]:
+            failed = ', '.join(f"{src}-{dst}" for src, dst in result['failed_links'])
+            print(f"{failed}: {len(result['rerouted'])} rerouted, {len(result['dropped'])} dropped, "
+                  f"peak utilization {result['peak_utilization'] * 100:.2f}%")
+        
+    def max_flow(self, source, destination, residual=False):
+        """Compute how much bandwidth can be moved from source to destination, and the bottleneck links.
+        
+        Args:
+            source: Switch the traffic enters at
+            destination: Switch the traffic leaves at
+            residual: Only count the capacity the active flows leave on each link
+            
+        Returns:
+            A dict with the 'max_flow' value and the 'cut', the (src, dst)
+            links of a minimum cut. Results are cached until the topology,
+            or for residual capacity the link loads, change.
+        """
+        return self.max_flow_engine.max_flow(source, destination, bool(residual))
+        
+    def max_flows(self, pairs, residual=False, processes=None):
+        """Compute max_flow for many (source, destination) pairs, spread over worker processes."""
+        return self.max_flow_engine.max_flows(pairs, bool(residual), processes=processes)
+        
+    def show_max_flow(self, source, destination, residual=False):
+        """Show the max throughput from source to destination and the links that limit it."""
+        result = self.max_flow(source, destination, residual)
+        capacity = "spare capacity" if residual else "link bandwidth"
+        print(f"Max flow from {source} to {destination}: {result['max_flow']:g} ({capacity})")
+        print(f"Minimum cut: {len(result['cut'])} links")
+        for link in result['cut']:
+            src, dst = link
+            bandwidth = self.topology.edges[link]['bandwidth']
+            if residual:
+                spare = max(bandwidth - self.link_index.load(link), 0)
+                print(f"  {src} → {dst}: {spare:g} spare of {bandwidth:g}")
+            else:
+                print(f"  {src} → {dst}: {bandwidth:g}")
+                
+    def show_spare_capacity(self, source, destination):
+        """Show how much more traffic fits from source to destination on top of the active flows."""
+        self.show_max_flow(source, destination, residual=True)
+        
+    def visualize_topology(self, filename='topology.svg'):
+        """Render the topology to an image file in the background (SVG, or PNG/PDF with matplotlib)."""
+        future = self.topology.visualize(self.link_stats, self.active_flows, filename)
+        if future is None:
+            return None
+        logger.info("Rendering topology to %s in the background", filename)
+        future.add_done_callback(_log_render)
+        return future
         
     def show_link_stats(self):
         """Show link utilization statistics."""
@@ -107,112 +440,912 @@ class SDNController:
             util_percent = (stats['utilization'] / stats['bandwidth']) * 100 if stats['bandwidth'] > 0 else 0
             print(f"{source} → {dest}: {util_percent:.2f}% utilized ({stats['utilization']}/{stats['bandwidth']})")
             if stats['flows']:
-                print(f"  Flows: {', '.join(stats['flows'])}")
+                print(f"  Flows: {', '.join(map(str, stats['flows']))}")
+                
+    def top_links(self, k=20):
+        """Return the k most utilized directed links as (link, utilization) pairs, highest first."""
+        return self.utilization.top(int(k))
+        
+    def links_above(self, threshold):
+        """Return the directed links with at least the given utilization (1.0 = full), highest first."""
+        return self.utilization.above(float(threshold))
+        
+    def show_top_links(self, k=20):
+        """Show the k most utilized links."""
+        top = self.top_links(k)
+        if not top:
+            print("No links in the network.")
+            return
+        print(f"Top {len(top)} Links by Utilization:")
+        print("-----------------------------")
+        for link, utilization in top:
+            self._print_link_utilization(link, utilization)
+            
+    def show_links_above(self, percent):
+        """Show the links utilized at or above percent."""
+        links = self.links_above(float(percent) / 100)
+        print(f"{len(links)} links at or above {float(percent):g}% utilization")
+        for link, utilization in links:
+            self._print_link_utilization(link, utilization)
+            
+    def sample_utilization(self, now=None):
+        """Record every link's utilization in the history, at most once per sampling interval."""
+        try:
+            return self.utilization_history.sample(now)
+        except RuntimeError as e:
+            logger.warning("%s; utilization history disabled", e)
+            self.utilization_history.configure(samples=0)
+            return False
+            
+    def set_utilization_history(self, interval, samples):
+        """Sample link utilization every interval seconds, keeping samples per link (0 turns history off)."""
+        self.utilization_history.configure(float(interval), int(samples))
+        logger.info("Sampling link utilization every %g s, keeping %d samples per link", float(interval), int(samples))
+        
+    def show_link_history(self, source, destination, seconds=None):
+        """Show how a link's utilization has trended over the sampled history (or its last seconds)."""
+        link = (source, destination)
+        if link not in self.utilization:
+            print(f"No link exists from {source} to {destination}.")
+            return
+        summary = self.utilization_history.summary(seconds, links=[link])
+        if not summary['links']:
+            print(f"No utilization samples for {source} → {destination} yet.")
+            return
+        times, values = self.utilization_history.series(link, seconds)
+        print(f"Utilization History of {source} → {destination}:")
+        print("-----------------------------")
+        print(f"Samples: {len(values)} over {times[-1] - times[0]:.0f} s")
+        print(f"Current: {summary['current'][0] * 100:.2f}%  Mean: {summary['mean'][0] * 100:.2f}%  "
+              f"p50: {summary['p50'][0] * 100:.2f}%  p95: {summary['p95'][0] * 100:.2f}%  "
+              f"Max: {summary['max'][0] * 100:.2f}%")
+        print(f"Trend: {summary['trend'][0] * 100:+.2f} points per hour")
+        for when, value in list(zip(times, values))[-10:]:
+            print(f"  {when - times[-1]:7.0f} s: {value * 100:.2f}%")
+            
+    def show_link_trends(self, k=10):
+        """Show the k links whose utilization rose fastest over the sampled history, with their percentiles."""
+        stats = self.utilization_history.stats()
+        summary = self.utilization_history.summary()
+        print(f"Link Utilization Trends ({stats['samples']} samples over {stats['span_seconds']:.0f} s, "
+              f"every {stats['interval_seconds']:g} s):")
+        print("-----------------------------")
+        if not summary['links']:
+            print("No links have been sampled yet.")
+            return
+        order = sorted(range(len(summary['links'])), key=lambda i: summary['trend'][i], reverse=True)[:int(k)]
+        for i in order:
+            source, dest = summary['links'][i]
+            print(f"{source} → {dest}: {summary['trend'][i] * 100:+.2f} points/h, "
+                  f"now {summary['current'][i] * 100:.2f}%, p95 {summary['p95'][i] * 100:.2f}%, "
+                  f"max {summary['max'][i] * 100:.2f}%")
+            
+    def show_path_cache_stats(self):
+        """Show hit/miss counters for the shortest-path tree cache."""
+        stats = self.topology.path_cache_stats()
+        print("Path Cache Statistics:")
+        print("----------------------")
+        print(f"Trees cached: {stats['size']}/{stats['max_size']}")
+        print(f"Hits: {stats['hits']}  Misses: {stats['misses']}  Hit rate: {stats['hit_rate'] * 100:.2f}%")
+        print(f"Evictions: {stats['evictions']}  Invalidations: {stats['invalidations']}")
+                
+    def set_all_pairs_mode(self, mode):
+        """Turn all-pairs routing tables on or off."""
+        if mode == 'on':
+            self.topology.enable_all_pairs()
+            logger.info("All-pairs routing enabled; tables are being built in the background")
+        elif mode == 'off':
+            self.topology.disable_all_pairs()
+            logger.info("All-pairs routing disabled")
+        else:
+            logger.warning("Unknown mode: %s (expected 'on' or 'off')", mode)
+            
+    def show_all_pairs_stats(self):
+        """Show memory use and rebuild time of the all-pairs routing tables."""
+        router = self.topology.all_pairs
+        if router is None:
+            print("All-pairs routing is disabled.")
+            return
+        stats = router.stats()
+        state = "ready" if stats['ready'] else "rebuilding"
+        print("All-Pairs Routing Statistics:")
+        print("-----------------------------")
+        print(f"State: {state}  Nodes: {stats['nodes']}")
+        print(f"Memory: {stats['memory_bytes'] / (1024 * 1024):.2f} MiB")
+        print(f"Rebuilds: {stats['rebuilds']}  Last rebuild: {stats['last_rebuild_seconds'] * 1000:.1f} ms")
+        print(f"Incremental updates: {stats['incremental_updates']}")
                 
+    def set_fast_reroute(self, mode):
+        """Turn fast reroute on ('on' or 'link' for link-disjoint backups, 'node' for node-disjoint) or off."""
+        if mode in ('on', 'link', 'node'):
+            self.fast_reroute.enable(self.active_flows.values(), disjoint='link' if mode == 'on' else mode)
+            logger.info("Fast reroute enabled with %s-disjoint backups; computing backups in the background",
+                        self.fast_reroute.disjoint)
+        elif mode == 'off':
+            self.fast_reroute.disable()
+            logger.info("Fast reroute disabled")
+        else:
+            logger.warning("Unknown mode: %s (expected 'on', 'link', 'node' or 'off')", mode)
+            
+    def show_fast_reroute_stats(self):
+        """Show backup path coverage and the failover latency distribution."""
+        stats = self.fast_reroute.stats()
+        print("Fast Reroute Statistics:")
+        print("------------------------")
+        state = f"{stats['disjoint']}-disjoint" if stats['enabled'] else "disabled"
+        print(f"Mode: {state}  Flows: {stats['flows']}  Protected: {stats['protected']}  "
+              f"Unprotected: {stats['unprotected']}  Pending: {stats['pending']}")
+        print(f"Background refreshes: {stats['refreshes']}  "
+              f"Last refresh: {stats['last_refresh_seconds'] * 1000:.1f} ms")
+        print(f"Flows awaiting reoptimization: {stats['suboptimal']}")
+        print(f"Failover latency over {stats['failovers']} flows: p50 <= {stats['p50_seconds'] * 1000:g} ms, "
+              f"p99 <= {stats['p99_seconds'] * 1000:g} ms")
+        for event in list(self.fast_reroute.events)[-10:]:
+            source, destination = event['link']
+            print(f"  {source}-{destination}: {event['backup']} flows on backups in "
+                  f"{event['backup_seconds'] * 1000:.2f} ms, {event['recomputed']} recomputed and "
+                  f"{event['dropped']} dropped in {event['seconds'] * 1000:.2f} ms")
+            
+    def set_partitioning(self, domains, regions=None):
+        """Compute shortest paths with one worker process per domain of the topology, or stop.
+        
+        Args:
+            domains: Number of domains to partition the topology into, 'auto'
+                for one per core, or 'off'
+            regions: Optional {switch: region} mapping; each region becomes a
+                domain instead of running the partitioner
+        """
+        if self.partition is not None:
+            self.partition.close()
+            self.partition = None
+            self._partition_config = None
+        if domains == 'off':
+            logger.info("Partitioned routing disabled")
+            return
+        if domains != 'auto' and regions is None:
+            try:
+                count = int(domains)
+            except (TypeError, ValueError):
+                count = 0
+            if count < 1:
+                logger.warning("Unknown mode: %s (expected a number of domains, 'auto' or 'off')", domains)
+                return
+            domains = count
+        start = time.perf_counter()
+        self.partition = PartitionedRouter(self.topology, None if domains == 'auto' else domains, regions)
+        self._partition_config = (domains, regions)
+        stats = self.partition.stats()
+        logger.info("Partitioned routing over %d domains (%d border switches, %d links cut) started in %.2f s",
+                    stats['domains'], stats['borders'], stats['cut_links'], time.perf_counter() - start,
+                    extra={'event': 'partitioned'})
+        
+    def set_partition_regions(self, filename):
+        """Partition the topology into the regions listed in a file of 'switch region' lines."""
+        self.set_partitioning('regions', load_regions(filename))
+        
+    def show_partition_stats(self):
+        """Show the domains, their borders and the time spent in each routing round."""
+        if self.partition is None:
+            print("Partitioned routing is disabled.")
+            return
+        stats = self.partition.stats()
+        print("Partitioned Routing Statistics:")
+        print("-------------------------------")
+        print(f"Domains: {stats['domains']}  Switches per domain: {stats['min_size']}-{stats['max_size']}")
+        print(f"Border switches: {stats['borders']}  Links cut: {stats['cut_links']}  "
+              f"Border graph edges: {stats['border_edges']}")
+        print(f"Batches: {stats['batches']}  Pairs routed: {stats['pairs']}")
+        print(f"Round time: attach {stats['attach_seconds'] * 1000:.1f} ms, "
+              f"search {stats['search_seconds'] * 1000:.1f} ms, expand {stats['expand_seconds'] * 1000:.1f} ms")
+        print(f"Topology updates: {stats['updates']} in {stats['update_seconds'] * 1000:.1f} ms")
+        
+    def show_flow_timeouts(self):
+        """Show how many flows have timeouts and how many have expired."""
+        stats = self.flow_timeouts.stats()
+        print("Flow Timeouts:")
+        print("--------------")
+        print(f"Flows with timeouts: {stats['flows']}  Timers armed: {stats['timers']}")
+        print(f"Expired: {stats['expired_idle']} idle, {stats['expired_hard']} hard")
+        
+    def show_southbound_stats(self):
+        """Show flow-mod message counts and bytes for recent reconvergence events."""
+        totals = self.southbound.totals
+        print("Southbound Statistics:")
+        print("----------------------")
+        print(f"Events: {totals['events']}  Messages: {totals['messages']}  Flow-mods: {totals['flow_mods']}")
+        print(f"Bytes sent: {totals['bytes_sent']}  Bytes received: {totals['bytes_received']}")
+        for stats in list(self.southbound.events)[-10:]:
+            print(f"  {stats['event']}: {stats['flow_mods']} flow-mods (+{stats['add']} ~{stats['modify']} "
+                  f"-{stats['delete']}) to {stats['switches']} switches, {stats['messages']} messages, "
+                  f"{stats['bytes_sent']} bytes, {stats['seconds'] * 1000:.1f} ms")
+                  
+    def set_metrics(self, mode):
+        """Turn latency/throughput instrumentation on or off."""
+        if mode == 'on':
+            self.metrics.enable(self)
+            logger.info("Metrics collection enabled")
+        elif mode == 'off':
+            self.metrics.disable()
+            logger.info("Metrics collection disabled")
+        elif mode == 'reset':
+            self.metrics.reset()
+            logger.info("Metrics reset")
+        else:
+            logger.warning("Unknown mode: %s (expected 'on', 'off' or 'reset')", mode)
+            
+    def show_metrics(self):
+        """Show per-operation counters and latency percentiles."""
+        if not self.metrics.enabled:
+            print("Metrics collection is disabled; use 'metrics on' to enable it.")
+            return
+        print("Controller Metrics:")
+        print("-------------------")
+        print(self.metrics.render_text())
+        
+    def dump_metrics(self, filename):
+        """Write metrics in Prometheus text format to a file."""
+        self.metrics.write_prometheus(filename)
+        logger.info("Metrics written to %s", filename)
+        
+    def serve_metrics(self, port):
+        """Expose metrics in Prometheus text format over HTTP on localhost."""
+        bound = self.metrics.serve(int(port))
+        logger.info("Serving metrics on http://127.0.0.1:%d/metrics", bound)
+        
+    def set_profiling(self, mode):
+        """Start or stop the cProfile hook; stopping prints the top functions."""
+        if mode == 'on':
+            self.metrics.start_profiling()
+            logger.info("Profiling started")
+        elif mode == 'off':
+            print(self.metrics.stop_profiling(path='controller.prof') or "Profiler was not running")
+        else:
+            logger.warning("Unknown mode: %s (expected 'on' or 'off')", mode)
+        
+    def save_snapshot(self, filename):
+        """Write a binary snapshot of the controller state and restart the journal from it."""
+        start = time.perf_counter()
+        self.snapshot_id = write_snapshot(self, filename)
+        if self.journal is not None:
+            self.journal.reset(self.snapshot_id)
+        logger.info("Snapshot of %d switches and %d flows written to %s in %.2f s", len(self.topology.graph),
+                    len(self.active_flows), filename, time.perf_counter() - start,
+                    extra={'event': 'snapshot_written'})
+        
+    def load_snapshot(self, filename, journal=None):
+        """Restore state from a snapshot, then replay the journal written since it.
+        
+        Args:
+            filename: Snapshot file, or None to replay the journal onto an empty controller
+            journal: Optional journal file; it is only replayed if it continues this snapshot
+        """
+        start = time.perf_counter()
+        if filename is not None:
+            self.snapshot_id = load_snapshot(self, filename)
+        replayed = 0
+        if journal is not None:
+            journal_id = read_journal_id(journal)
+            if journal_id == self.snapshot_id:
+                recording, self.journal = self.journal, None
+                try:
+                    replayed = replay_journal(self, journal)
+                finally:
+                    self.journal = recording
+            elif journal_id is not None:
+                logger.warning("Journal %s does not continue snapshot %s; not replaying it", journal, filename)
+        # Switches keep their entries while the controller restarts, so there is nothing to push
+        self.southbound.discard()
+        self.fast_reroute.reset(self.active_flows.values())
+        if self.partition is not None:
+            # Domains are drawn afresh for the restored topology
+            self.set_partitioning(*self._partition_config)
+        logger.info("Restored %d switches and %d flows (%d journal records) in %.2f s", len(self.topology.graph),
+                    len(self.active_flows), replayed, time.perf_counter() - start,
+                    extra={'event': 'snapshot_loaded'})
+        
+    def start_journal(self, filename):
+        """Append every mutation to a journal so state can be restored after a restart.
+        
+        An existing journal that continues the current snapshot is appended to;
+        any other file is moved aside to ``<filename>.old`` first.
+        """
+        if self.journal is not None:
+            self.journal.close()
+        journal_id = read_journal_id(filename)
+        if journal_id is not None and journal_id != self.snapshot_id:
+            os.replace(filename, filename + '.old')
+            logger.warning("Moved unrelated journal %s aside to %s.old", filename, filename)
+        self.journal = Journal(filename, self.snapshot_id)
+        logger.info("Journaling mutations to %s", filename)
+        
+    def _record(self, *record):
+        """Append a mutation to the journal, if one is open."""
+        if self.journal is not None:
+            self.journal.append(record)
+            
+    def _record_flow(self, flow):
+        if self.journal is not None:
+            self.journal.append(_flow_record(flow))
+        
+    def _set_timeouts(self, flow_id, idle_timeout, hard_timeout):
+        """Arm a new flow's timeouts, if it has any."""
+        if idle_timeout or hard_timeout:
+            self.flow_timeouts.add(flow_id, idle_timeout, hard_timeout)
+            self._record('timeout', flow_id, idle_timeout, hard_timeout)
+            
+    def _remove_flows(self, flow_ids):
+        """Remove flows and their entries, refreshing each touched link once; return the IDs removed.
+        
+        The deletions are left pending in the southbound pipeline for the caller to flush.
+        """
+        flows = self.active_flows.remove(flow_ids)
+        removed = [flow[0] for flow in flows]
+        for link_id in self.link_index.remove_flows(flows):
+            self._refresh_link(link_id)
+        self.flow_table.remove_flows(removed)
+        if self.flow_timeouts:
+            for flow_id in removed:
+                self.flow_timeouts.remove(flow_id)
+        self.fast_reroute.flows_removed(removed)
+        if self.journal is not None:
+            self.journal.extend([('unflow', flow_id) for flow_id in removed])
+        return removed
+        
+    def _install_link(self, source, destination, bandwidth):
+        """Add a link to the topology and start tracking its statistics."""
+        self.topology.add_edge(source, destination, bandwidth=bandwidth)
+        # Initialize link statistics
+        link_id = (source, destination)
+        self.link_stats[link_id] = {
+            'bandwidth': bandwidth,
+            'utilization': self.link_index.load(link_id),
+            'flows': self.link_index.members(link_id)  # shared with the reverse index
+        }
+        # Links carry traffic both ways, so both directions are indexed
+        for link in (link_id, (destination, source)):
+            self.utilization.add_link(link, bandwidth, self.link_index.load(link))
+        
+    def _drop_link_stats(self, source, destination):
+        """Remove link statistics for both directions of a removed link."""
+        for link_id in ((source, destination), (destination, source)):
+            self.link_stats.pop(link_id, None)
+            self.link_index.drop_link(link_id)
+            self.utilization.remove_link(link_id)
+        
+    def _add_flows_sequential(self, requests):
+        """Admit flows one at a time so each sees the capacity reserved by the previous ones."""
+        results = []
+        admitted = 0
+        for source, destination, bandwidth, priority, idle_timeout, hard_timeout in requests:
+            path = self._route_flow(source, destination, bandwidth)
+            if not path:
+                results.append({
+                    'status': 'rejected',
+                    'source': source,
+                    'destination': destination,
+                    'reason': 'no path with enough capacity'
+                })
+                continue
+            flow = self._new_flow(source, destination, path, bandwidth, priority)
+            self.active_flows[flow['id']] = flow
+            self._record_flow(flow)
+            self._set_timeouts(flow['id'], idle_timeout, hard_timeout)
+            self._update_link_stats(flow, add=True)
+            self.flow_table.add_entries(self._build_flow_entries(flow))
+            self.fast_reroute.flow_routed(flow)
+            admitted += 1
+            results.append({
+                'status': 'added',
+                'id': flow['id'],
+                'source': source,
+                'destination': destination,
+                'path': path
+            })
+        self.fast_reroute.schedule()
+        self._after_admission(admitted)
+        return results
+        
+    def _route_flow(self, source, destination, bandwidth):
+        """Pick a path for a flow according to the routing mode."""
+        if self.routing_mode == 'capacity':
+            return self.capacity_router.find_path(source, destination, bandwidth)
+        if self.partition is not None:
+            return self.partition.route_many([(source, destination)])[0]
+        return self.compute_shortest_path(source, destination)
+        
+    def _shortest_paths(self, pairs):
+        """Return the shortest path (or None) for each (source, destination) pair.
+        
+        Partitioned routing spreads the batch over the domain workers;
+        otherwise paths are read from shortest-path trees. Links are
+        symmetric, so a tree rooted at either end of a pair holds its path:
+        each pair reuses a tree already built for one of its ends, or else
+        roots one at the end with a cached tree or the most pairs.
+        """
+        if self.partition is not None:
+            return self.partition.route_many(pairs)
+        topology = self.topology
+        index = topology.graph.index
+        cached = topology.path_cache.trees
+        ends = {}
+        for source, destination in pairs:
+            ends[source] = ends.get(source, 0) + 1
+            ends[destination] = ends.get(destination, 0) + 1
+        trees = {}
+        paths = []
+        for source, destination in pairs:
+            if source not in index or destination not in index:
+                paths.append(None)
+                continue
+            if source in trees:
+                root = source
+            elif destination in trees:
+                root = destination
+            elif (index[source] in cached) != (index[destination] in cached):
+                root = source if index[source] in cached else destination
+            else:
+                root = source if ends[source] >= ends[destination] else destination
+            tree = trees.get(root)
+            if tree is None:
+                tree = trees[root] = topology.get_shortest_path_tree(root)
+            if root == source:
+                paths.append(topology.path_from_tree(tree, destination))
+            else:
+                path = topology.path_from_tree(tree, source)
+                paths.append(path[::-1] if path else None)
+        return paths
+        
+    def _after_admission(self, count):
+        """Push new entries to the switches, rebalancing first once enough flows have been admitted."""
+        if self.rebalance_every:
+            self._admitted_since_rebalance += count
+            if self._admitted_since_rebalance >= self.rebalance_every:
+                self._admitted_since_rebalance = 0
+                self.rebalance()
+        self.southbound.flush('add_flow')
+            
+    def _max_link_utilization(self):
+        """Return (utilization, link) for the most utilized directed link."""
+        for link_id, utilization in self.utilization.top(1):
+            if utilization > 0:
+                return utilization, link_id
+        return 0.0, None
+        
+    def _rebalance_path(self, flow, hot_link):
+        """Find a path for flow that avoids hot_link, preferring ones with spare capacity."""
+        for enforce_capacity in (True, False):
+            path = self.capacity_router.find_path(flow['source'], flow['destination'], flow['bandwidth'],
+                                                  banned_links={hot_link}, released=flow['path'],
+                                                  enforce_capacity=enforce_capacity)
+            if path:
+                return path
+        return None
+        
+    def _path_peak(self, path, flow):
+        """Peak utilization along path if flow were moved onto it."""
+        old_links = set(zip(flow['path'], flow['path'][1:]))
+        peak = 0.0
+        for link_id in zip(path, path[1:]):
+            load = self.link_index.load(link_id)
+            if link_id not in old_links:
+                load += flow['bandwidth']
+            peak = max(peak, load / self.topology.edges[link_id]['bandwidth'])
+        return peak
+        
+    def _move_flow(self, flow, new_path):
+        """Reroute a flow onto new_path, updating statistics and flow table entries."""
+        self._update_link_stats(flow, add=False)
+        flow['path'] = new_path
+        self._record_flow(flow)
+        self._update_link_stats(flow, add=True)
+        self.flow_table.replace_flow_entries(flow['id'], self._build_flow_entries(flow))
+        self.fast_reroute.flow_routed(flow)
+        
+    def _new_flow(self, source, destination, path, bandwidth, priority):
+        """Build the record for a new flow."""
+        return {
+            'id': self.active_flows.allocate_id(),
+            'source': source,
+            'destination': destination,
+            'path': path,
+            'bandwidth': bandwidth,
+            'priority': normalize_priority(priority)
+        }
+        
+    def _update_link_stats_bulk(self, flows):
+        """Add several flows to the link statistics, refreshing each link once."""
+        touched = set()
+        for flow in flows:
+            path = flow['path']
+            self.link_index.add_flow(flow['id'], path, flow['bandwidth'])
+            touched.update(zip(path, path[1:]))
+        for link_id in touched:
+            self._refresh_link(link_id)
+        
     def _update_link_stats(self, flow, add=True):
         """Update link statistics for a flow."""
         path = flow['path']
         bandwidth = flow['bandwidth']
         flow_id = flow['id']
         
-        # Update statistics for each link in the path
-        for i in range(len(path) - 1):
-            source, dest = path[i], path[i+1]
-            link_id = (source, dest)
+        # Per-link flow membership lives in the reverse index
+        if add:
+            self.link_index.add_flow(flow_id, path, bandwidth)
+        else:
+            self.link_index.remove_flow(flow_id, path, bandwidth)
+        
+        # Update utilization for each link in the path
+        for link_id in zip(path, path[1:]):
+            self._refresh_link(link_id)
             
-            if link_id in self.link_stats:
-                if add:
-                    self.link_stats[link_id]['utilization'] += bandwidth
-                    self.link_stats[link_id]['flows'].append(flow_id)
-                else:
-                    self.link_stats[link_id]['utilization'] = max(0, self.link_stats[link_id]['utilization'] - bandwidth)
-                    if flow_id in self.link_stats[link_id]['flows']:
-                        self.link_stats[link_id]['flows'].remove(flow_id)
+    def _print_link_utilization(self, link, utilization):
+        source, dest = link
+        print(f"{source} → {dest}: {utilization * 100:.2f}% utilized "
+              f"({self.link_index.load(link)}/{self.utilization.capacities[link]})")
+        
+    def _refresh_link(self, link_id):
+        """Copy a link's load from the reverse index into its statistics and the utilization index."""
+        load = self.link_index.load(link_id)
+        stats = self.link_stats.get(link_id)
+        if stats is not None:
+            stats['utilization'] = load
+        self.utilization.update(link_id, load)
                         
     def _reconfigure_affected_flows(self, source, destination):
-        """Reconfigure flows affected by a link failure."""
-        affected_flows = []
-        link_id = (source, destination)
+        """Reconfigure flows affected by a link failure and push the changes to the switches.
         
-        # Find flows that use the failed link
-        for flow_id, flow in self.active_flows.items():
-            path = flow['path']
-            for i in range(len(path) - 1):
-                if (path[i], path[i+1]) == link_id:
-                    affected_flows.append(flow_id)
-                    break
+        With fast reroute enabled, flows with a usable backup path are moved
+        onto it and pushed first, without any routing; only the rest wait for
+        a new path to be computed.
+        """
+        started = time.perf_counter()
+        # Links are bidirectional, so flows in either direction are affected
+        affected_flows = self.link_index.flows_on((source, destination))
+        affected_flows += self.link_index.flows_on((destination, source))
+        
+        recompute = affected_flows
+        backup_seconds = 0.0
+        if self.fast_reroute.enabled:
+            recompute = []
+            with self.fast_reroute.paused():
+                for flow_id in affected_flows:
+                    flow = self.active_flows[flow_id]
+                    backup = self.fast_reroute.backup_for(flow)
+                    if backup is None:
+                        recompute.append(flow_id)
+                        continue
+                    self._update_link_stats(flow, add=False)
+                    flow['path'] = backup
+                    self._record_flow(flow)
+                    self._update_link_stats(flow, add=True)
+                    self._generate_flow_entries(flow)
+                    self.fast_reroute.flow_routed(flow)
+                    self.fast_reroute.suboptimal[flow_id] = None
+                if len(recompute) < len(affected_flows):
+                    self.southbound.flush('fast_reroute')
+                    backup_seconds = time.perf_counter() - started
+                    logger.info("Fast reroute moved %d flows onto backup paths in %.3f ms",
+                                len(affected_flows) - len(recompute), backup_seconds * 1000,
+                                extra={'event': 'fast_reroute', 'source': source, 'destination': destination})
                     
-        # Reconfigure each affected flow
-        for flow_id in affected_flows:
+        # Partitioned routing computes the new shortest paths as one batch across the domain workers
+        new_paths = None
+        if self.partition is not None and self.routing_mode == 'shortest' and recompute:
+            flows = [self.active_flows[flow_id] for flow_id in recompute]
+            new_paths = self.partition.route_many([(flow['source'], flow['destination']) for flow in flows])
+            new_paths = dict(zip(recompute, new_paths))
+            
+        # Reconfigure each remaining affected flow
+        dropped = 0
+        for flow_id in recompute:
             flow = self.active_flows[flow_id]
             # Remove flow statistics from old path
             self._update_link_stats(flow, add=False)
             
-            # Compute new path
-            new_path = self.compute_shortest_path(flow['source'], flow['destination'])
+            # Compute new path, falling back to the plain shortest path if none has spare capacity
+            if new_paths is not None:
+                new_path = new_paths[flow_id]
+            else:
+                new_path = self._route_flow(flow['source'], flow['destination'], flow['bandwidth'])
+            if not new_path and self.routing_mode != 'shortest':
+                new_path = self.compute_shortest_path(flow['source'], flow['destination'])
             if new_path:
                 # Update flow with new path
                 flow['path'] = new_path
+                self._record_flow(flow)
                 # Update flow statistics for new path
                 self._update_link_stats(flow, add=True)
                 # Update flow table entries
                 self._generate_flow_entries(flow)
-                print(f"Flow {flow_id} reconfigured with new path: {' -> '.join(new_path)}")
+                self.fast_reroute.flow_routed(flow)
+                logger.info("Flow %s reconfigured with new path: %s", flow_id, ' -> '.join(new_path),
+                            extra={'event': 'flow_rerouted', 'flow_id': flow_id, 'path': new_path})
             else:
-                # Remove flow if no alternative path exists
+                # Remove flow and its entries if no alternative path exists
                 del self.active_flows[flow_id]
-                print(f"Flow {flow_id} removed: no alternative path available")
+                self.flow_table.remove_flow(flow_id)
+                self._record('unflow', flow_id)
+                self.flow_timeouts.remove(flow_id)
+                self.fast_reroute.flow_removed(flow_id)
+                dropped += 1
+                logger.warning("Flow %s removed: no alternative path available", flow_id,
+                               extra={'event': 'flow_dropped', 'flow_id': flow_id})
+        # Push the reconvergence to the switches as one batch per switch
+        self.southbound.flush('remove_link')
+        if affected_flows:
+            self.fast_reroute.record_failover((source, destination), backup_seconds,
+                                              len(affected_flows) - len(recompute), time.perf_counter() - started,
+                                              len(recompute) - dropped, dropped)
+        return affected_flows
                 
     def _generate_flow_entries(self, flow):
         """Generate flow table entries for switches along the path."""
-        path = flow['path']
-        flow_id = flow['id']
+        entries = self._build_flow_entries(flow)
+        # Per-hop detail is debug-only; skip building the messages entirely otherwise
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Generating flow table entries for %s", flow['id'])
+            for entry in entries:
+                logger.debug("  Switch %s: Forward %s→%s to %s", entry['switch'], flow['source'],
+                             flow['destination'], entry['action']['forward'])
+            
+        # Replace any entries left over from the flow's previous path
+        self.flow_table.replace_flow_entries(flow['id'], entries)
         
-        print(f"Generating flow table entries for {flow_id}")
+    def _build_flow_entries(self, flow):
+        """Build one flow table entry per switch along the flow's path."""
+        path = flow['path']
+        match = {
+            'src': flow['source'],
+            'dst': flow['destination']
+        }
+        priority = normalize_priority(flow['priority'])
+        entries = []
         for i in range(len(path) - 1):
-            switch = path[i]
-            next_hop = path[i+1]
-            # Create flow table entry
-            entry = {
-                'switch': switch,
-                'match': {
-                    'src': flow['source'],
-                    'dst': flow['destination']
-                },
+            entries.append({
+                'flow_id': flow['id'],
+                'switch': path[i],
+                'match': match,
                 'action': {
-                    'forward': next_hop
+                    'forward': path[i+1]
                 },
-                'priority': flow['priority']
-            }
-            
-            # Add entry to flow table
-            self.flow_table.add_entry(entry)
-            print(f"  Switch {switch}: Forward {flow['source']}→{flow['destination']} to {next_hop}")
+                'priority': priority
+            })
+        return entries
+
+
+def _log_render(future):
+    error = future.exception()
+    if error is not None:
+        logger.error("Topology rendering failed: %s", error)
+        return
+    result = future.result()
+    logger.info("Topology written to %s: %d of %d switches drawn, %d flows, %.2f s", result['filename'],
+                result['nodes_drawn'], result['switches'], result['flows_drawn'], result['seconds'],
+                extra={'event': 'topology_rendered'})
+
+
+def _flow_record(flow):
+    """Journal record carrying everything needed to reinstall a flow without routing it."""
+    return ('flow', flow['id'], flow['source'], flow['destination'], flow['path'],
+            flow['bandwidth'], flow['priority'], flow.get('group'))
+
+
+def _flow_request(request):
+    """Normalize a flow request to a (source, destination, bandwidth, priority, idle_timeout, hard_timeout) tuple."""
+    if isinstance(request, dict):
+        request = (request['source'], request['destination'], request['bandwidth'], request.get('priority', 0),
+                   request.get('idle_timeout', 0), request.get('hard_timeout', 0))
+    else:
+        request = tuple(request)
+        if len(request) < 6:
+            request += (0,) * (6 - len(request))
+    _check_timeouts(request[4], request[5])
+    return request
+
+
+def _check_timeouts(idle_timeout, hard_timeout):
+    if idle_timeout < 0 or hard_timeout < 0:
+        raise ValueError(f"timeouts must not be negative: idle {idle_timeout}, hard {hard_timeout}")
 
 
 class FlowTable:
-    def __init__(self):
-        self.entries = []
+    """Flow table indexed by switch and match fields.
+    
+    Each switch maps ``(src, dst)`` match keys to a bucket of installed
+    entries kept in priority order, so lookups read the head of one bucket.
+    Ties go to the older flow. An installed entry is only a
+    ``(sort_key, next hop)`` pair: its flow, switch, match and priority
+    follow from where it is stored and from the sort key
+    ``(-priority, flow_id)``, which all entries of a flow share. Entry dicts
+    are built when entries are read. A second index by flow ID makes
+    replacing or deleting a flow's entries proportional to its path length.
+    """
+    
+    def __init__(self, southbound=None):
+        self.switches = {}  # {switch: {(src, dst): [((-priority, flow_id), next hop), ...]}}
+        self.by_flow = {}  # {flow_id: ((src, dst), (-priority, flow_id), [switch, ...])}
+        self.size = 0
+        self.southbound = southbound  # optional SouthboundPipeline told about every change
+        
+    def __len__(self):
+        return self.size
+        
+    @property
+    def entries(self):
+        """All entries, grouped by switch and match."""
+        return [_entry(switch, match_key, item) for switch, buckets in self.switches.items()
+                for match_key, bucket in buckets.items() for item in bucket]
         
     def add_entry(self, entry):
         """Add a flow table entry."""
-        self.entries.append(entry)
+        flow_id = entry['flow_id']
+        match_key = (entry['match']['src'], entry['match']['dst'])
+        record = self.by_flow.get(flow_id)
+        if record is None or record[0] != match_key or record[1][0] != -entry['priority']:
+            if record is not None:
+                self.remove_flow(flow_id)  # the flow's match or priority changed
+            record = self.by_flow[flow_id] = (match_key, (-entry['priority'], flow_id), [])
+        self._insert(entry['switch'], record, entry['action']['forward'])
+        if self.southbound is not None:
+            self.southbound.added(entry)
+        
+    def add_entries(self, entries):
+        """Add many flow table entries."""
+        for entry in entries:
+            self.add_entry(entry)
+            
+    def replace_flow_entries(self, flow_id, entries):
+        """Swap the entries installed for a flow, touching only switches whose entry changed.
+        
+        A flow has at most one entry per switch. Entries that are unchanged
+        are kept as they are, a changed next hop at the same priority is
+        modified in place, and everything else is deleted or added.
+        """
+        record = self.by_flow.get(flow_id)
+        if record is None or not entries:
+            self.remove_flow(flow_id)
+            self.add_entries(entries)
+            return
+        match_key, sort_key, installed = record
+        first = entries[0]
+        if match_key != (first['match']['src'], first['match']['dst']) or sort_key[0] != -first['priority']:
+            self.remove_flow(flow_id)
+            self.add_entries(entries)
+            return
+        old = set(installed)
+        for entry in entries:
+            switch = entry['switch']
+            forward = entry['action']['forward']
+            if switch not in old:
+                self._insert(switch, record, forward)
+                if self.southbound is not None:
+                    self.southbound.added(entry)
+                continue
+            old.discard(switch)
+            bucket = self.switches[switch][match_key]
+            position = bisect.bisect_left(bucket, sort_key, key=_sort_key)
+            current = bucket[position][1]
+            if current != forward:
+                bucket[position] = (sort_key, forward)
+                if self.southbound is not None:
+                    self.southbound.modified(_entry(switch, match_key, (sort_key, current)), entry)
+        if old:
+            installed[:] = [switch for switch in installed if switch not in old]
+            for switch in old:
+                self._delete(switch, match_key, sort_key)
+            
+    def remove_flow(self, flow_id):
+        """Remove all entries belonging to a flow; return how many were removed."""
+        record = self.by_flow.pop(flow_id, None)
+        if record is None:
+            return 0
+        match_key, sort_key, installed = record
+        for switch in installed:
+            self._delete(switch, match_key, sort_key)
+        return len(installed)
+        
+    def remove_flows(self, flow_ids):
+        """Remove all entries of many flows; return how many entries were removed.
+        
+        Each entry is found with a single search, and the deletions are
+        reported to the southbound pipeline in one call.
+        """
+        switches = self.switches
+        by_flow = self.by_flow
+        deleted = []
+        for flow_id in flow_ids:
+            record = by_flow.pop(flow_id, None)
+            if record is None:
+                continue
+            match_key, sort_key, installed = record
+            for switch in installed:
+                buckets = switches[switch]
+                bucket = buckets[match_key]
+                if len(bucket) > 1:
+                    item = bucket.pop(bisect.bisect_left(bucket, sort_key, key=_sort_key))
+                else:
+                    item = bucket[0]
+                    del buckets[match_key]
+                    if not buckets:
+                        del switches[switch]
+                deleted.append(_entry(switch, match_key, item))
+        self.size -= len(deleted)
+        if self.southbound is not None:
+            self.southbound.deleted_entries(deleted)
+        return len(deleted)
+        
+    def lookup(self, switch, src, dst):
+        """Return the highest-priority entry on switch matching src→dst, or None."""
+        buckets = self.switches.get(switch)
+        if not buckets:
+            return None
+        bucket = buckets.get((src, dst))
+        return _entry(switch, (src, dst), bucket[0]) if bucket else None
         
     def remove_entries_for_switch(self, switch_id):
         """Remove all entries for a specific switch."""
-        self.entries = [entry for entry in self.entries if entry['switch'] != switch_id]
+        buckets = self.switches.pop(switch_id, {})
+        for match_key, bucket in buckets.items():
+            for item in bucket:
+                if self.southbound is not None:
+                    self.southbound.deleted(_entry(switch_id, match_key, item))
+                flow_id = item[0][1]
+                installed = self.by_flow[flow_id][2]
+                installed.remove(switch_id)
+                if not installed:
+                    del self.by_flow[flow_id]
+                self.size -= 1
         
     def list_flows(self):
         """List all flow table entries."""
-        if not self.entries:
+        if not self.size:
             return []
             
         result = []
-        for entry in self.entries:
-            src = entry['match']['src']
-            dst = entry['match']['dst']
-            switch = entry['switch']
-            action = entry['action']['forward']
-            priority = entry['priority']
-            result.append(f"Switch {switch}: {src}→{dst} via {action} (priority: {priority})")
-        return result
\ No newline at end of file
+        for switch, buckets in self.switches.items():
+            for (src, dst), bucket in buckets.items():
+                for (negative_priority, _), action in bucket:
+                    result.append(f"Switch {switch}: {src}→{dst} via {action} (priority: {-negative_priority})")
+        return result
+        
+    def _insert(self, switch, record, forward):
+        match_key, sort_key, installed = record
+        buckets = self.switches.get(switch)
+        if buckets is None:
+            buckets = self.switches[switch] = {}
+        bucket = buckets.get(match_key)
+        if bucket is None:
+            buckets[match_key] = [(sort_key, forward)]
+        else:
+            bisect.insort(bucket, (sort_key, forward), key=_sort_key)
+        installed.append(switch)
+        self.size += 1
+        
+    def _delete(self, switch, match_key, sort_key):
+        """Remove one installed entry and report the deletion."""
+        buckets = self.switches[switch]
+        bucket = buckets[match_key]
+        item = bucket.pop(bisect.bisect_left(bucket, sort_key, key=_sort_key))
+        if not bucket:
+            del buckets[match_key]
+            if not buckets:
+                del self.switches[switch]
+        self.size -= 1
+        if self.southbound is not None:
+            self.southbound.deleted(_entry(switch, match_key, item))
+
+
+def _entry(switch, match_key, item):
+    """Build the entry dict of an installed (sort_key, next hop) item."""
+    (negative_priority, flow_id), forward = item
+    return {
+        'flow_id': flow_id,
+        'switch': switch,
+        'match': {'src': match_key[0], 'dst': match_key[1]},
+        'action': {'forward': forward},
+        'priority': -negative_priority
+    }
+
+
+def _sort_key(item):
+    return item[0]
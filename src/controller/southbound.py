@@ -0,0 +1,174 @@
+"""Southbound pipeline: push flow table changes to the switches as batched flow-mods.
+
+The controller's FlowTable reports every entry it adds, modifies or deletes.
+The pipeline coalesces those changes per (switch, flow) until ``flush``.
+Changes that cancel out (an entry added and deleted again, or rerouted back
+to its old next hop) are never sent. On flush each switch gets its
+flow-mods in batch messages followed by a barrier request, and the
+flush completes when every switch has acknowledged its barrier.
+"""
+import json
+import logging
+import time
+from collections import deque
+
+from network.switch import Switch
+
+logger = logging.getLogger(__name__)
+
+MAX_MODS_PER_MESSAGE = 512
+EVENT_HISTORY = 100
+
+
+class SouthboundPipeline:
+    """Coalesces flow table deltas and delivers them to switch agents."""
+
+    def __init__(self, max_mods_per_message=MAX_MODS_PER_MESSAGE):
+        self.max_mods_per_message = max_mods_per_message
+        self.switches = {}  # {switch_id: Switch agent}, created on first use
+        self.pending = {}  # {switch_id: {flow_id: [entry before the batch, entry after]}}
+        self.events = deque(maxlen=EVENT_HISTORY)  # stats of recent flushes
+        self.totals = {'events': 0, 'messages': 0, 'flow_mods': 0, 'bytes_sent': 0, 'bytes_received': 0}
+        self._xid = 0
+
+    def agent(self, switch_id):
+        """Return the agent for a switch, connecting a new one if needed."""
+        agent = self.switches.get(switch_id)
+        if agent is None:
+            agent = self.switches[switch_id] = Switch(switch_id)
+        return agent
+
+    def added(self, entry):
+        flows = self.pending.get(entry['switch'])
+        if flows is None:
+            flows = self.pending[entry['switch']] = {}
+        change = flows.get(entry['flow_id'])
+        if change is None:
+            flows[entry['flow_id']] = [None, entry]
+        else:
+            change[1] = entry
+
+    def modified(self, old, new):
+        self._change(new['switch'], new['flow_id'], old, new)
+
+    def deleted(self, entry):
+        self._change(entry['switch'], entry['flow_id'], entry, None)
+
+    def deleted_entries(self, entries):
+        """Note many deleted entries at once."""
+        pending = self.pending
+        for entry in entries:
+            flows = pending.get(entry['switch'])
+            if flows is None:
+                flows = pending[entry['switch']] = {}
+            change = flows.get(entry['flow_id'])
+            if change is None:
+                flows[entry['flow_id']] = [entry, None]
+            else:
+                change[1] = None
+
+    def _change(self, switch, flow_id, before, after):
+        flows = self.pending.get(switch)
+        if flows is None:
+            flows = self.pending[switch] = {}
+        change = flows.get(flow_id)
+        if change is None:
+            flows[flow_id] = [before, after]
+        else:
+            # Keep the state from before the batch; only the latest target matters
+            change[1] = after
+
+    def flush(self, event='update'):
+        """Send all pending changes, wait for the barriers and return the event's stats."""
+        if not self.pending:
+            return None
+        start = time.perf_counter()
+        pending, self.pending = self.pending, {}
+        stats = {
+            'event': event,
+            'switches': 0,
+            'messages': 0,
+            'barriers': 0,
+            'flow_mods': 0,
+            'add': 0,
+            'modify': 0,
+            'delete': 0,
+            'bytes_sent': 0,
+            'bytes_received': 0
+        }
+
+        outstanding = {}  # {barrier xid: switch_id}
+        for switch, flows in pending.items():
+            mods = []
+            deletes = 0
+            for flow_id, (before, after) in flows.items():
+                if after is None:
+                    # Deletions dominate flow expiry; build them inline
+                    if before is not None:
+                        mods.append(('delete', flow_id, before['match']['src'], before['match']['dst'],
+                                     before['priority']))
+                        deletes += 1
+                    continue
+                mod = _flow_mod(flow_id, before, after)
+                if mod is not None:
+                    mods.append(mod)
+                    stats[mod[0]] += 1
+            stats['delete'] += deletes
+            if not mods:
+                continue
+            agent = self.agent(switch)
+            stats['switches'] += 1
+            stats['flow_mods'] += len(mods)
+            for i in range(0, len(mods), self.max_mods_per_message):
+                self._send(agent, {'type': 'flow_mod_batch', 'xid': self._next_xid(),
+                                   'mods': mods[i:i + self.max_mods_per_message]}, stats, outstanding)
+            xid = self._next_xid()
+            outstanding[xid] = switch
+            self._send(agent, {'type': 'barrier_request', 'xid': xid}, stats, outstanding)
+            stats['barriers'] += 1
+
+        if outstanding:
+            raise RuntimeError(f"switches did not acknowledge barriers: {sorted(set(outstanding.values()))}")
+        if not stats['flow_mods']:
+            return None
+        stats['seconds'] = time.perf_counter() - start
+        self.events.append(stats)
+        self.totals['events'] += 1
+        for key in ('messages', 'flow_mods', 'bytes_sent', 'bytes_received'):
+            self.totals[key] += stats[key]
+        logger.info("%s: %d flow-mods (%d add, %d modify, %d delete) to %d switches in %d messages, "
+                    "%d bytes", event, stats['flow_mods'], stats['add'], stats['modify'], stats['delete'],
+                    stats['switches'], stats['messages'], stats['bytes_sent'],
+                    extra={'event': 'southbound_flush'})
+        return stats
+
+    def discard(self):
+        """Drop pending changes without sending them."""
+        self.pending = {}
+
+    def _send(self, agent, message, stats, outstanding):
+        data = json.dumps(message, separators=(',', ':')).encode()
+        stats['messages'] += 1
+        stats['bytes_sent'] += len(data)
+        for reply in agent.handle_message(data):
+            stats['bytes_received'] += len(reply)
+            reply = json.loads(reply)
+            if reply['type'] == 'barrier_reply':
+                outstanding.pop(reply['xid'], None)
+            elif reply['type'] == 'error':
+                logger.warning("Switch %s rejected a flow-mod: %s", agent.switch_id, reply['reason'])
+
+    def _next_xid(self):
+        self._xid += 1
+        return self._xid
+
+
+def _flow_mod(flow_id, before, after):
+    """Return the add or modify flow-mod that takes a switch from before to the entry after, or None."""
+    mod = (flow_id, after['match']['src'], after['match']['dst'], after['priority'], after['action']['forward'])
+    if before is None:
+        return ('add',) + mod
+    if (before['action'] == after['action'] and before['priority'] == after['priority']
+            and before['match'] == after['match']):
+        return None
+    return ('modify',) + mod
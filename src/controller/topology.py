@@ -1,164 +1,159 @@
-import matplotlib.pyplot as plt
-from collections import defaultdict
-import heapq
+from itertools import islice
+
+from algorithms.all_pairs import AllPairsRouter
+from algorithms.k_shortest import k_shortest_paths
+from controller.graph_core import AdjacencyView, CompactGraph, EdgeView, NodeView
+from controller.path_cache import ShortestPathCache
+from controller.rendering import TopologyRenderer
 
 class Topology:
-    def __init__(self):
+    def __init__(self, path_cache_size=128):
         """Initialize an empty network topology."""
-        self.nodes = set()
-        self.edges = {}  # {(src, dst): {'bandwidth': value, 'weight': value}}
-        self.adjacency = defaultdict(list)  # {node: [neighbors]}
+        # Switch IDs are interned to integers; weights and bandwidths live in CSR arrays
+        self.graph = CompactGraph()
+        self.nodes = NodeView(self.graph)
+        self.edges = EdgeView(self.graph)  # {(src, dst): {'bandwidth': value, 'weight': value}}
+        self.adjacency = AdjacencyView(self.graph)  # {node: [neighbors]}
+        self.path_cache = ShortestPathCache(max_size=path_cache_size)
+        self.all_pairs = None  # optional AllPairsRouter answering path queries by table lookup
+        self.renderer = TopologyRenderer()  # starts its worker thread on first use
         
     def add_node(self, node_id):
         """Add a node to the topology."""
-        if node_id not in self.nodes:
-            self.nodes.add(node_id)
+        if node_id not in self.graph.index:
+            self.graph.add_node(node_id)
             return True
         return False
         
     def add_edge(self, source, destination, bandwidth):
         """Add an edge between two nodes with given bandwidth."""
-        if source not in self.nodes:
-            self.add_node(source)
-        if destination not in self.nodes:
-            self.add_node(destination)
+        u = self.graph.add_node(source)
+        v = self.graph.add_node(destination)
+            
+        # Replacing an existing link may lengthen paths that used it
+        old_bandwidth = self.graph.get_bandwidth(u, v)
+        if old_bandwidth is not None:
+            self.path_cache.edge_removed(u, v)
             
-        # Add forward edge
-        self.edges[(source, destination)] = {
-            'bandwidth': bandwidth,
-            'weight': 1/bandwidth  # Inverse of bandwidth for shortest path calculation
-        }
-        self.adjacency[source].append(destination)
-        
-        # Add reverse edge for bidirectional links
-        self.edges[(destination, source)] = {
-            'bandwidth': bandwidth,
-            'weight': 1/bandwidth
-        }
-        self.adjacency[destination].append(source)
+        # Add forward and reverse edges for bidirectional links
+        self.graph.set_edge(u, v, bandwidth)
+        self.graph.set_edge(v, u, bandwidth)
+        
+        # Only trees the new link can shorten need to be recomputed
+        self.path_cache.edge_added(u, v, 1/bandwidth)  # Inverse of bandwidth for shortest path calculation
+        if self.all_pairs is not None:
+            old_weight = 1/old_bandwidth if old_bandwidth is not None else None
+            self.all_pairs.edge_added(u, v, old_weight, 1/bandwidth)
         
     def remove_edge(self, source, destination):
         """Remove an edge from the topology."""
         if self.has_edge(source, destination):
-            # Remove forward edge
-            if (source, destination) in self.edges:
-                del self.edges[(source, destination)]
-            if destination in self.adjacency[source]:
-                self.adjacency[source].remove(destination)
-                
-            # Remove reverse edge
-            if (destination, source) in self.edges:
-                del self.edges[(destination, source)]
-            if source in self.adjacency[destination]:
-                self.adjacency[destination].remove(source)
+            u = self.graph.index[source]
+            v = self.graph.index[destination]
+            weight = 1/self.graph.get_bandwidth(u, v)
+            self.graph.remove_edge(u, v)
+            self.graph.remove_edge(v, u)
+            
+            # Only trees that routed over the link need to be recomputed
+            self.path_cache.edge_removed(u, v)
+            if self.all_pairs is not None:
+                self.all_pairs.edge_removed(u, v, weight)
             return True
         return False
         
     def has_edge(self, source, destination):
         """Check if an edge exists between source and destination."""
-        return (source, destination) in self.edges
+        u = self.graph.index.get(source)
+        v = self.graph.index.get(destination)
+        if u is None or v is None:
+            return False
+        return self.graph.has_edge(u, v)
         
     def get_nodes(self):
         """Get all nodes in the topology."""
-        return list(self.nodes)
+        return list(self.graph.names)
         
     def get_edges(self):
         """Get all edges in the topology."""
-        return list(self.edges.keys())
+        return list(self.edges)
         
     def get_shortest_path(self, source, destination):
         """Compute the shortest path between source and destination using Dijkstra's algorithm."""
-        if source not in self.nodes or destination not in self.nodes:
+        if source not in self.graph.index or destination not in self.graph.index:
             return None
             
-        # Initialize distances and previous nodes
-        distances = {node: float('infinity') for node in self.nodes}
-        distances[source] = 0
-        previous = {node: None for node in self.nodes}
+        # Answer from the all-pairs tables when they reflect the current topology
+        if self.all_pairs is not None and self.all_pairs.ready:
+            path = self.all_pairs.path(self.graph.index[source], self.graph.index[destination])
+            if path is None:
+                return None
+            names = self.graph.names
+            return [names[i] for i in path]
+            
+        tree = self.get_shortest_path_tree(source)
+        return self.path_from_tree(tree, destination)
         
-        # Priority queue for Dijkstra's algorithm
-        priority_queue = [(0, source)]
+    def get_shortest_path_tree(self, source):
+        """Return the shortest-path tree rooted at source, using the cache."""
+        u = self.graph.index[source]
+        tree = self.path_cache.get(u)
+        if tree is None:
+            tree = self.graph.shortest_path_tree(u)
+            self.path_cache.put(u, tree)
+        return tree
         
-        while priority_queue:
-            current_distance, current_node = heapq.heappop(priority_queue)
-            
-            # If we reached the destination, reconstruct and return the path
-            if current_node == destination:
-                path = []
-                while current_node:
-                    path.append(current_node)
-                    current_node = previous[current_node]
-                return path[::-1]  # Reverse to get path from source to destination
-                
-            # If we've found a longer path to the current node, skip
-            if current_distance > distances[current_node]:
-                continue
-                
-            # Check all neighbors
-            for neighbor in self.adjacency[current_node]:
-                edge = (current_node, neighbor)
-                if edge in self.edges:
-                    weight = self.edges[edge]['weight']
-                    distance = current_distance + weight
-                    
-                    # If we found a shorter path to the neighbor
-                    if distance < distances[neighbor]:
-                        distances[neighbor] = distance
-                        previous[neighbor] = current_node
-                        heapq.heappush(priority_queue, (distance, neighbor))
-        
-        # If we get here, there's no path to the destination
-        return None
+    def path_from_tree(self, tree, destination):
+        """Reconstruct the path to destination from a tree returned by get_shortest_path_tree."""
+        v = self.graph.index.get(destination)
+        if v is None:
+            return None
+        path = self.graph.path_from_tree(tree, v)
+        if path is None:
+            return None
+        names = self.graph.names
+        return [names[i] for i in path]
+        
+    def path_cache_stats(self):
+        """Return hit/miss counters for the shortest-path tree cache."""
+        return self.path_cache.stats()
+        
+    def enable_all_pairs(self, background=True):
+        """Precompute all-pairs distance and next-hop matrices for O(1) path lookups."""
+        if self.all_pairs is None:
+            self.all_pairs = AllPairsRouter(self.graph, background=background)
+        return self.all_pairs
+        
+    def disable_all_pairs(self):
+        """Drop the all-pairs matrices and go back to per-query Dijkstra."""
+        if self.all_pairs is not None:
+            self.all_pairs.close()
+            self.all_pairs = None
+        
+    def memory_usage(self):
+        """Approximate bytes held by the adjacency arrays."""
+        return self.graph.memory_usage()
             
     def get_all_paths(self, source, destination, k=3):
-        """Get up to k paths between source and destination."""
-        if source not in self.nodes or destination not in self.nodes:
-            return []
-            
-        # Use a simple DFS to find paths
-        def dfs_paths(current, dest, path, visited, all_paths):
-            # Mark the current node as visited
-            visited.add(current)
-            path.append(current)
-            
-            # If current node is the destination, add path to results
-            if current == dest:
-                all_paths.append(path.copy())
-            else:
-                # Try all neighbors
-                for neighbor in self.adjacency[current]:
-                    if neighbor not in visited:
-                        dfs_paths(neighbor, dest, path, visited, all_paths)
-                        
-            # Backtrack
-            path.pop()
-            visited.remove(current)
-            
-        all_paths = []
-        dfs_paths(source, destination, [], set(), all_paths)
-        
-        # Sort paths by total weight (sum of edge weights)
-        def path_weight(path):
-            total = 0
-            for i in range(len(path) - 1):
-                edge = (path[i], path[i+1])
-                total += self.edges[edge]['weight']
-            return total
+        """Get up to k paths between source and destination, cheapest first."""
+        return list(islice(self.iter_shortest_paths(source, destination), k))
+        
+    def iter_shortest_paths(self, source, destination):
+        """Lazily yield loopless paths between source and destination in cost order."""
+        if source not in self.graph.index or destination not in self.graph.index:
+            return
             
-        all_paths.sort(key=path_weight)
-        return all_paths[:k]
+        names = self.graph.names
+        start = self.graph.index[source]
+        target = self.graph.index[destination]
+        for _, path in k_shortest_paths(self.graph, start, target):
+            yield [names[i] for i in path]
+        
+    def visualize(self, link_stats=None, active_flows=None, filename='topology.svg'):
+        """Render the topology with link utilization and flow overlays in the background.
         
-    def visualize(self, link_stats=None, active_flows=None):
-        """Visualize the network topology with link utilization and active flows."""
+        Returns a Future resolving to a summary dict, or None if the topology is empty.
+        """
         if not self.nodes:
             print("Network is empty, nothing to visualize.")
-            return
-        
-        print("NetworkX or matplotlib not available for visualization.")
-        print("Current topology:")
-        print(f"Nodes: {self.nodes}")
-        print("Edges:")
-        for edge, data in self.edges.items():
-            src, dst = edge
-            bw = data['bandwidth']
-            print(f"  {src} → {dst} (bandwidth: {bw})")
\ No newline at end of file
+            return None
+        return self.renderer.submit(self.graph, filename, link_stats, active_flows)
@@ -0,0 +1,354 @@
+"""Link utilization index and utilization history.
+
+``UtilizationIndex`` keeps the utilization (load over bandwidth) of every
+directed link in the leaves of a max segment tree, so the hottest links
+and the links above a threshold are found without looking at the others:
+an update costs O(log n), the top k links O(k log n).
+
+``UtilizationHistory`` samples the utilization of every link at once into
+a NumPy array with one ring buffer per link, all sharing one time axis, so
+percentiles and trends are computed for all links in a few vectorized
+operations. NumPy is only imported when the first sample is taken.
+"""
+import heapq
+import time
+
+from controller.graph_core import INFINITY
+
+np = None  # NumPy is optional and imported on first use; utilization history is unavailable without it
+
+EMPTY = -INFINITY  # value of a free slot, below any utilization
+HISTORY_INTERVAL = 10.0  # seconds between samples
+HISTORY_SAMPLES = 360  # samples kept per link: an hour at the default interval
+
+
+class UtilizationIndex:
+    """Utilization of each directed link in a max segment tree.
+
+    Every link gets a slot (a leaf of the tree); slots of removed links
+    are reused. Leaves hold the utilization and inner nodes the maximum of
+    their children, so the tree's root is the peak utilization.
+    """
+
+    def __init__(self):
+        self.capacities = {}  # {(src, dst): bandwidth}
+        self.slots = {}  # {(src, dst): slot}
+        self.links = []  # link in each slot, None if the slot is free
+        self.free = []  # free slots
+        self.recycled = []  # slots freed since the history last sampled
+        self.size = 1  # leaves in the tree, a power of two
+        self.tree = [EMPTY, EMPTY]  # tree[1] is the root; leaf of slot s is tree[size + s]
+        self.version = 0  # bumped by every change to a link or its load
+
+    def __len__(self):
+        return len(self.slots)
+
+    def __contains__(self, link):
+        return link in self.slots
+
+    def add_link(self, link, bandwidth, load=0):
+        """Start tracking a link, or change its bandwidth."""
+        slot = self.slots.get(link)
+        if slot is None:
+            if self.free:
+                slot = self.free.pop()
+                self.links[slot] = link
+            else:
+                slot = len(self.links)
+                self.links.append(link)
+                if slot >= self.size:
+                    self._grow()
+            self.slots[link] = slot
+        self.capacities[link] = bandwidth
+        self._set(slot, _utilization(load, bandwidth))
+
+    def remove_link(self, link):
+        """Stop tracking a link."""
+        slot = self.slots.pop(link, None)
+        if slot is None:
+            return
+        del self.capacities[link]
+        self.links[slot] = None
+        self.free.append(slot)
+        self.recycled.append(slot)
+        self._set(slot, EMPTY)
+
+    def update(self, link, load):
+        """Set a tracked link's utilization from its current load; other links are ignored."""
+        slot = self.slots.get(link)
+        if slot is not None:
+            self._set(slot, _utilization(load, self.capacities[link]))
+
+    def reset(self, links):
+        """Replace the contents with (link, bandwidth, load) triples, building the tree in O(n)."""
+        version = self.version
+        self.__init__()
+        self.version = version + 1
+        links = list(links)
+        while self.size < len(links):
+            self.size *= 2
+        tree = self.tree = [EMPTY] * (2 * self.size)
+        for slot, (link, bandwidth, load) in enumerate(links):
+            self.links.append(link)
+            self.slots[link] = slot
+            self.capacities[link] = bandwidth
+            tree[self.size + slot] = _utilization(load, bandwidth)
+        self._build()
+
+    def get(self, link):
+        """Return a link's utilization, or None if it is not tracked."""
+        slot = self.slots.get(link)
+        return None if slot is None else self.tree[self.size + slot]
+
+    def peak(self):
+        """Return the highest utilization of any link (0 with no links)."""
+        return max(self.tree[1], 0.0)
+
+    def top(self, k):
+        """Return the k most utilized links as (link, utilization), highest first."""
+        tree, size = self.tree, self.size
+        result = []
+        if k <= 0 or tree[1] == EMPTY:
+            return result
+        heappush, heappop = heapq.heappush, heapq.heappop
+        heap = [(-tree[1], 1)]
+        while heap and len(result) < k:
+            value, node = heappop(heap)
+            if node >= size:
+                result.append((self.links[node - size], -value))
+                continue
+            for child in (2 * node, 2 * node + 1):
+                if tree[child] != EMPTY:
+                    heappush(heap, (-tree[child], child))
+        return result
+
+    def above(self, threshold):
+        """Return the links with utilization of at least threshold as (link, utilization), highest first."""
+        tree, size = self.tree, self.size
+        result = []
+        stack = [1]
+        while stack:
+            node = stack.pop()
+            if tree[node] < threshold:
+                continue  # nothing in this subtree reaches the threshold
+            if node >= size:
+                result.append((self.links[node - size], tree[node]))
+            else:
+                stack.append(2 * node)
+                stack.append(2 * node + 1)
+        result.sort(key=lambda item: item[1], reverse=True)
+        return result
+
+    def values(self):
+        """Return the utilization of every slot in use so far (EMPTY for free slots)."""
+        return self.tree[self.size:self.size + len(self.links)]
+
+    def _set(self, slot, value):
+        self.version += 1
+        tree = self.tree
+        node = self.size + slot
+        tree[node] = value
+        node >>= 1
+        while node:
+            left, right = tree[2 * node], tree[2 * node + 1]
+            best = left if left >= right else right
+            if tree[node] == best:
+                break  # the maxima above are unchanged as well
+            tree[node] = best
+            node >>= 1
+
+    def _grow(self):
+        """Double the number of leaves."""
+        leaves = self.tree[self.size:]
+        self.size *= 2
+        self.tree = [EMPTY] * self.size + leaves + [EMPTY] * (self.size - len(leaves))
+        self._build()
+
+    def _build(self):
+        tree = self.tree
+        for node in range(self.size - 1, 0, -1):
+            left, right = tree[2 * node], tree[2 * node + 1]
+            tree[node] = left if left >= right else right
+
+
+class UtilizationHistory:
+    """Utilization samples of every link in NumPy ring buffers sharing one time axis.
+
+    Row r of ``samples`` belongs to the link in slot r of the index; a
+    sample is one column. Missing samples (before a link existed, or after
+    its slot was reused) are NaN.
+    """
+
+    def __init__(self, index, interval=HISTORY_INTERVAL, samples=HISTORY_SAMPLES, clock=time.monotonic):
+        self.index = index
+        self.clock = clock
+        self.interval = interval
+        self.capacity = samples  # samples kept per link; 0 turns the history off
+        self.clear()
+
+    def clear(self):
+        """Drop every sample."""
+        self.samples = None  # float32 array of shape (rows, capacity), allocated on the first sample
+        self.times = None  # sample times, one per column
+        self.head = 0  # column the next sample goes into
+        self.count = 0  # columns filled so far
+        self.last = None  # time of the last sample
+        self.index.recycled.clear()
+
+    def configure(self, interval=None, samples=None):
+        """Change the sampling interval (seconds) and/or the samples kept per link, dropping the history."""
+        if interval is not None:
+            if interval < 0:
+                raise ValueError(f"sampling interval must not be negative: {interval}")
+            self.interval = interval
+        if samples is not None:
+            if samples < 0:
+                raise ValueError(f"samples must not be negative: {samples}")
+            self.capacity = samples
+        self.clear()
+
+    def memory_usage(self):
+        return 0 if self.samples is None else self.samples.nbytes + self.times.nbytes
+
+    def sample(self, now=None, force=False):
+        """Record every link's current utilization, unless the interval since the last sample has not passed.
+
+        Returns:
+            True if a sample was taken
+
+        Raises:
+            RuntimeError: If NumPy is not installed
+        """
+        if not self.capacity:
+            return False
+        if now is None:
+            now = self.clock()
+        if not force and self.last is not None and now - self.last < self.interval:
+            return False
+        _import_numpy()
+        index = self.index
+        rows = len(index.links)
+        if self.samples is None:
+            self.samples = np.full((index.size, self.capacity), np.nan, dtype=np.float32)
+            self.times = np.zeros(self.capacity)
+        elif self.samples.shape[0] < rows:
+            grown = np.full((index.size, self.capacity), np.nan, dtype=np.float32)
+            grown[:self.samples.shape[0]] = self.samples
+            self.samples = grown
+        if index.recycled:
+            # Reused slots must not inherit the samples of the link that had them before
+            self.samples[index.recycled] = np.nan
+            index.recycled.clear()
+        values = np.array(index.values(), dtype=np.float32)
+        values[np.isneginf(values)] = np.nan
+        column = self.samples[:, self.head]
+        column[:rows] = values
+        column[rows:] = np.nan
+        self.times[self.head] = now
+        self.head = (self.head + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+        self.last = now
+        return True
+
+    def series(self, link, seconds=None):
+        """Return (times, utilizations) of one link's samples, oldest first, optionally only the last seconds."""
+        slot = self.index.slots.get(link)
+        if slot is None or self.samples is None or slot >= len(self.samples):
+            return [], []
+        times, values = self._window(seconds, rows=[slot])
+        keep = ~np.isnan(values[0])
+        return times[keep].tolist(), values[0][keep].tolist()
+
+    def summary(self, seconds=None, links=None):
+        """Summarize the samples of every link (or of the given links), optionally only over the last seconds.
+
+        Returns:
+            A dict of parallel sequences over the links with samples:
+            'links', sample 'count', 'current' (latest sample), 'mean',
+            'p50', 'p95', 'max' and 'trend', the least-squares slope of
+            utilization per hour.
+        """
+        empty = {key: [] for key in ('links', 'count', 'current', 'mean', 'p50', 'p95', 'max', 'trend')}
+        if self.samples is None or not self.count:
+            return empty
+        if links is None:
+            slots = np.arange(len(self.index.links))
+        else:
+            slots = self.index.slots
+            slots = np.array([slots[link] for link in links if link in slots], dtype=np.intp)
+        slots = slots[slots < len(self.samples)]  # links added since the last sample have none yet
+        slot_links = self.index.links
+        live = np.array([slot_links[slot] is not None for slot in slots], dtype=bool)
+        times, values = self._window(seconds, rows=slots)
+        valid = ~np.isnan(values)
+        counts = valid.sum(axis=1)
+        keep = live & (counts > 0)
+        if not keep.any():
+            return empty
+        values, valid, counts = values[keep], valid[keep], counts[keep]
+
+        filled = np.where(valid, values, 0.0)
+        mean = filled.sum(axis=1) / counts
+        p50, p95 = np.nanpercentile(values, [50, 95], axis=1)
+        peak = np.nanmax(values, axis=1)
+        # Latest sample per link: the last valid column of each row
+        last = values.shape[1] - 1 - np.argmax(valid[:, ::-1], axis=1)
+        current = values[np.arange(len(values)), last]
+        # Least-squares slope of utilization over time, per row, ignoring missing samples
+        offsets = np.where(valid, times - times[0], 0.0)
+        time_mean = offsets.sum(axis=1) / counts
+        time_dev = np.where(valid, offsets - time_mean[:, None], 0.0)
+        value_dev = np.where(valid, values - mean[:, None], 0.0)
+        variance = (time_dev * time_dev).sum(axis=1)
+        slope = np.divide((time_dev * value_dev).sum(axis=1), variance, out=np.zeros_like(variance),
+                          where=variance > 0)
+        return {
+            'links': [slot_links[slot] for slot in slots[keep]],
+            'count': counts,
+            'current': current,
+            'mean': mean,
+            'p50': p50,
+            'p95': p95,
+            'max': peak,
+            'trend': slope * 3600,
+        }
+
+    def stats(self):
+        span = 0.0
+        if self.count > 1:
+            times, _ = self._window(None, rows=())
+            span = float(times[-1] - times[0])
+        return {
+            'enabled': bool(self.capacity),
+            'interval_seconds': self.interval,
+            'capacity': self.capacity,
+            'samples': self.count,
+            'span_seconds': span,
+            'memory_bytes': self.memory_usage(),
+        }
+
+    def _window(self, seconds, rows):
+        """Return (times, values of the given rows) in chronological order, optionally only the last seconds."""
+        if self.count < self.capacity:
+            order = np.arange(self.count)
+        else:
+            order = (self.head + np.arange(self.capacity)) % self.capacity
+        times = self.times[order]
+        if seconds is not None and len(times):
+            recent = times >= times[-1] - seconds
+            order, times = order[recent], times[recent]
+        return times, self.samples[np.asarray(rows, dtype=np.intp)][:, order]
+
+
+def _utilization(load, bandwidth):
+    return load / bandwidth if bandwidth > 0 else 0.0
+
+
+def _import_numpy():
+    global np
+    if np is None:
+        try:
+            import numpy
+        except ImportError:
+            raise RuntimeError("NumPy is required for utilization history")
+        np = numpy
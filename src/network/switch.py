@@ -1,7 +1,14 @@
+import json
+
+from network.flow_table import FlowTable
+
 class Switch:
     def __init__(self, switch_id):
         self.switch_id = switch_id
         self.ports = []
+        self.flow_table = FlowTable()  # {flow_id: (src, dst, priority, forward)}
+        self.names = {}  # one shared copy of every switch ID seen in a flow-mod
+        self.messages_received = 0
 
     def add_port(self, port):
         if port not in self.ports:
@@ -14,5 +21,35 @@ class Switch:
     def get_ports(self):
         return self.ports
 
+    def handle_message(self, data):
+        """Process one encoded controller message and return the encoded replies.
+
+        Flow-mods in a batch are applied in order. A barrier is answered only
+        after everything received before it has been applied.
+        """
+        self.messages_received += 1
+        message = json.loads(data)
+        if message['type'] == 'barrier_request':
+            return [self._reply({'type': 'barrier_reply', 'xid': message['xid']})]
+        if message['type'] != 'flow_mod_batch':
+            return [self._reply({'type': 'error', 'xid': message.get('xid'),
+                                 'reason': f"unsupported message: {message['type']}"})]
+        replies = []
+        names = self.names
+        for mod in message['mods']:
+            command, flow_id = mod[0], mod[1]
+            if command == 'delete':
+                # Deleting an entry that is not installed is not an error
+                self.flow_table.remove_flow(flow_id)
+            else:
+                # Entries are compact tuples; decoded names are swapped for shared copies
+                src, dst, forward = mod[2], mod[3], mod[5]
+                self.flow_table.add_flow(flow_id, (names.setdefault(src, src), names.setdefault(dst, dst), mod[4],
+                                                   names.setdefault(forward, forward)))
+        return replies
+
+    def _reply(self, message):
+        return json.dumps(message, separators=(',', ':')).encode()
+
     def __repr__(self):
-        return f"Switch(id={self.switch_id}, ports={self.ports})"
\ No newline at end of file
+        return f"Switch(id={self.switch_id}, ports={self.ports})"
@@ -0,0 +1,71 @@
+import asyncio
+import itertools
+import json
+
+from northbound.server import MAX_LINE
+
+
+class NorthboundError(Exception):
+    """Raised when the controller answers a request with an error."""
+
+
+class NorthboundClient:
+    """Asyncio client for the northbound API.
+
+    Requests may be pipelined: several ``request`` calls can be awaited
+    concurrently on one connection, and responses are matched by ID.
+    """
+
+    def __init__(self):
+        self._reader = None
+        self._writer = None
+        self._pending = {}  # {request id: future}
+        self._ids = itertools.count(1)
+        self._receiver = None
+
+    @classmethod
+    async def connect(cls, host='127.0.0.1', port=None, path=None):
+        client = cls()
+        if path is not None:
+            client._reader, client._writer = await asyncio.open_unix_connection(path, limit=MAX_LINE)
+        else:
+            client._reader, client._writer = await asyncio.open_connection(host, port, limit=MAX_LINE)
+        client._receiver = asyncio.ensure_future(client._receive())
+        return client
+
+    async def request(self, op, **args):
+        """Send one request and return its result, raising NorthboundError on failure."""
+        request_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        self._writer.write(json.dumps({'id': request_id, 'op': op, 'args': args}).encode() + b"\n")
+        await self._writer.drain()
+        return await future
+
+    async def close(self):
+        self._writer.close()
+        await self._writer.wait_closed()
+        if self._receiver is not None:
+            await self._receiver
+
+    async def _receive(self):
+        try:
+            while True:
+                line = await self._reader.readline()
+                if not line:
+                    break
+                response = json.loads(line)
+                future = self._pending.pop(response.get('id'), None)
+                if future is None or future.done():
+                    continue
+                if response['ok']:
+                    future.set_result(response['result'])
+                else:
+                    future.set_exception(NorthboundError(response['error']))
+        except ConnectionError:
+            pass
+        finally:
+            for future in self._pending.values():
+                if not future.done():
+                    future.set_exception(NorthboundError("connection closed"))
+            self._pending.clear()
@@ -0,0 +1,125 @@
+"""Load generator for the northbound API.
+
+Usage (from the src directory, with a server running, e.g. ``python app.py --serve 6653``):
+    python -m northbound.loadgen --port 6653 --provision fat_tree --size 1000 --clients 64 --requests 50000
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+
+from benchmarks.generators import TOPOLOGIES, generate
+from benchmarks.run import Timer
+from northbound.client import NorthboundClient, NorthboundError
+
+
+async def provision(client, topology, size, seed=0):
+    """Build a synthetic topology through the API, pipelining the requests."""
+    switches, links = generate(topology, size, seed)
+    await asyncio.gather(*(client.request('add_link', source=source, destination=destination, bandwidth=bandwidth)
+                           for source, destination, bandwidth in links))
+    return switches
+
+
+async def _worker(client, count, switches, hot_pairs, write_ratio, pipeline, rng, timers, errors):
+    async def one():
+        source, destination = rng.choice(hot_pairs) if hot_pairs else rng.sample(switches, 2)
+        if rng.random() < write_ratio:
+            op, args = 'add_flow', {'source': source, 'destination': destination, 'bandwidth': 1, 'priority': 1}
+        else:
+            op, args = 'compute_path', {'source': source, 'destination': destination}
+        try:
+            with timers[op].time():
+                await client.request(op, **args)
+        except NorthboundError:
+            errors[op] = errors.get(op, 0) + 1
+
+    remaining = count
+    while remaining > 0:
+        window = min(pipeline, remaining)
+        await asyncio.gather(*(one() for _ in range(window)))
+        remaining -= window
+
+
+async def run_load(host, port, path, clients, requests, write_ratio, pipeline, hot_pairs, seed,
+                   topology=None, size=None):
+    """Drive the server from concurrent clients and return throughput and latency figures."""
+    rng = random.Random(seed)
+    admin = await NorthboundClient.connect(host, port, path)
+    if topology:
+        await provision(admin, topology, size, seed)
+    switches = await admin.request('list_switches')
+    if len(switches) < 2:
+        raise SystemExit("the controller needs at least two switches; use --provision")
+    # A small set of popular pairs makes identical concurrent queries likely
+    pairs = [tuple(rng.sample(switches, 2)) for _ in range(hot_pairs)]
+
+    connections = [await NorthboundClient.connect(host, port, path) for _ in range(clients)]
+    timers = {'add_flow': Timer(), 'compute_path': Timer()}
+    errors = {}
+    per_client = [requests // clients + (1 if i < requests % clients else 0) for i in range(clients)]
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        _worker(client, count, switches, pairs, write_ratio, pipeline, random.Random(seed + i + 1), timers, errors)
+        for i, (client, count) in enumerate(zip(connections, per_client))))
+    elapsed = time.perf_counter() - start
+
+    server_stats = await admin.request('server_stats')
+    for client in connections + [admin]:
+        await client.close()
+
+    overall = Timer()
+    for timer in timers.values():
+        overall.samples.extend(timer.samples)
+    return {
+        'meta': {
+            'clients': clients,
+            'requests': requests,
+            'write_ratio': write_ratio,
+            'pipeline': pipeline,
+            'hot_pairs': hot_pairs,
+            'switches': len(switches)
+        },
+        'elapsed_s': elapsed,
+        'requests_per_s': requests / elapsed if elapsed else None,
+        'latency': dict({name: timer.summary() for name, timer in timers.items()}, overall=overall.summary()),
+        'errors': errors,
+        'server': server_stats
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure northbound API throughput and latency")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int)
+    parser.add_argument('--unix-socket', help="connect over a Unix socket instead of TCP")
+    parser.add_argument('--provision', choices=TOPOLOGIES, help="first build this synthetic topology")
+    parser.add_argument('--size', type=int, default=1000, help="approximate number of switches to provision")
+    parser.add_argument('--clients', type=int, default=32)
+    parser.add_argument('--requests', type=int, default=10000, help="total requests across all clients")
+    parser.add_argument('--write-ratio', type=float, default=0.1, help="fraction of requests that add a flow")
+    parser.add_argument('--pipeline', type=int, default=1, help="requests each client keeps in flight")
+    parser.add_argument('--hot-pairs', type=int, default=0,
+                        help="draw path queries from this many fixed pairs (0 = uniform)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="write results as JSON to this file")
+    args = parser.parse_args(argv)
+    if args.port is None and args.unix_socket is None:
+        parser.error("one of --port or --unix-socket is required")
+
+    report = asyncio.run(run_load(args.host, args.port, args.unix_socket, args.clients, args.requests,
+                                  args.write_ratio, args.pipeline, args.hot_pairs, args.seed,
+                                  args.provision, args.size))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,393 @@
+"""Northbound API: the controller's operations as JSON lines over TCP or a Unix socket.
+
+Each request is one JSON object per line::
+
+    {"id": 7, "op": "compute_path", "args": {"source": "s1", "destination": "s9"}}
+
+and gets one response line, possibly out of order with respect to other
+requests on the same connection::
+
+    {"id": 7, "ok": true, "result": ["s1", "s4", "s9"], "version": 42}
+
+``args`` may be an object (keyword arguments) or a list (positional).
+Mutations go through a single writer that applies them in arrival order, in
+batches; queries run between write batches, so every query sees the state
+after a whole batch (reported as ``version``) and never a half-applied one.
+A connection's queries wait for that connection's earlier mutations.
+Max-flow queries read the state the same way but compute in a thread, so
+the writer and other queries carry on meanwhile; their ``version`` is the
+one they read.
+"""
+import asyncio
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+MAX_WRITE_BATCH = 1024
+EXPIRY_INTERVAL = 0.1  # seconds between flow expiry and utilization sampling passes while no mutations arrive
+MAX_LINE = 1 << 20
+
+
+class NorthboundServer:
+    """Serve an SDNController to many concurrent JSON-lines clients."""
+
+    def __init__(self, controller, max_write_batch=MAX_WRITE_BATCH):
+        self.controller = controller
+        self.max_write_batch = max_write_batch
+        self.version = 0  # number of write batches applied
+        self.stats = {
+            'clients': 0,
+            'requests': 0,
+            'errors': 0,
+            'writes': 0,
+            'write_batches': 0,
+            'reads': 0,
+            'reads_coalesced': 0
+        }
+        # Controller methods by name, looked up per call so metrics wrappers apply
+        self.mutations = {
+            'add_switch': 'add_switch',
+            'add_link': 'add_link',
+            'remove_link': 'remove_link',
+            'add_flow': None,  # batched into add_flows by the writer
+            'add_flows': 'add_flows',
+            'add_flow_split': 'add_flow_split',
+            'remove_flow': 'remove_flow',
+            'flow_activity': 'flow_activity',
+            'set_routing_mode': 'set_routing_mode',
+            'rebalance': 'rebalance',
+            'set_fast_reroute': 'set_fast_reroute',
+            'reoptimize': 'reoptimize',
+        }
+        self.queries = {
+            'compute_path': self._compute_path,
+            'k_shortest_paths': self._k_shortest_paths,
+            'list_switches': self._list_switches,
+            'get_flow': self._get_flow,
+            'flows_on_link': self._flows_on_link,
+            'lookup_entry': self._lookup_entry,
+            'link_stats': self._link_stats,
+            'max_flow': self._max_flow,
+            'max_flows': self._max_flows,
+            'top_links': self._top_links,
+            'links_above': self._links_above,
+            'link_history': self._link_history,
+            'path_cache_stats': lambda: self.controller.topology.path_cache_stats(),
+            'fast_reroute_stats': lambda: self.controller.fast_reroute.stats(),
+            'flow_timeout_stats': lambda: self.controller.flow_timeouts.stats(),
+            'metrics': lambda: self.controller.metrics.render_prometheus(),
+            'server_stats': lambda: dict(self.stats, version=self.version),
+        }
+        self._writes = None
+        self._writer_task = None
+        self._pending_reads = {}  # {(op, args key): (args, [future, ...])}
+        self._servers = []
+
+    async def start(self, host=None, port=None, path=None):
+        """Start listening on host:port and/or a Unix socket path; return the bound TCP port."""
+        self._writes = asyncio.Queue()
+        self._writer_task = asyncio.ensure_future(self._run_writes())
+        bound = None
+        if port is not None:
+            server = await asyncio.start_server(self._serve_client, host, port, limit=MAX_LINE)
+            bound = server.sockets[0].getsockname()[1]
+            self._servers.append(server)
+            logger.info("Northbound API listening on %s:%d", host or '0.0.0.0', bound)
+        if path is not None:
+            server = await asyncio.start_unix_server(self._serve_client, path, limit=MAX_LINE)
+            self._servers.append(server)
+            logger.info("Northbound API listening on %s", path)
+        return bound
+
+    async def serve_forever(self):
+        await asyncio.gather(*(server.serve_forever() for server in self._servers))
+
+    async def close(self):
+        for server in self._servers:
+            server.close()
+            await server.wait_closed()
+        self._servers = []
+        if self._writer_task is not None:
+            self._writer_task.cancel()
+            self._writer_task = None
+
+    async def _serve_client(self, reader, writer):
+        self.stats['clients'] += 1
+        loop = asyncio.get_running_loop()
+        last_write = None  # this connection's latest mutation, for read-your-writes
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                self.stats['requests'] += 1
+                request_id = None
+                try:
+                    request = json.loads(line)
+                    request_id = request.get('id')
+                    op = request['op']
+                    args = request.get('args', {})
+                except (ValueError, KeyError, AttributeError) as e:
+                    self._send(writer, request_id, error=f"malformed request: {e}")
+                    continue
+
+                future = loop.create_future()
+                if op in self.mutations:
+                    self._writes.put_nowait((op, args, future))
+                    last_write = future
+                elif op in self.queries:
+                    if last_write is not None and not last_write.done():
+                        last_write.add_done_callback(
+                            lambda _, op=op, args=args, future=future: self._submit_read(op, args, future))
+                    else:
+                        self._submit_read(op, args, future)
+                else:
+                    self._send(writer, request_id, error=f"unknown operation: {op}")
+                    continue
+                future.add_done_callback(lambda done, request_id=request_id: self._reply(writer, request_id, done))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError) as e:
+            logger.debug("Client connection closed: %s", e)
+        finally:
+            self.stats['clients'] -= 1
+            writer.close()
+
+    def _reply(self, writer, request_id, future):
+        if writer.is_closing():
+            return
+        error = future.exception()
+        if error is not None:
+            self._send(writer, request_id, error=str(error) or type(error).__name__)
+        else:
+            self._send(writer, request_id, result=future.result())
+
+    def _send(self, writer, request_id, result=None, error=None):
+        if writer.is_closing():
+            return
+        version = self.version
+        if isinstance(result, _Deferred):
+            result, version = result.result, result.version
+        if error is None:
+            response = {'id': request_id, 'ok': True, 'result': result, 'version': version}
+        else:
+            self.stats['errors'] += 1
+            response = {'id': request_id, 'ok': False, 'error': error}
+        writer.write(json.dumps(response, default=str).encode() + b"\n")
+
+    def _submit_read(self, op, args, future):
+        """Queue a query for the next read batch, merging it with identical pending queries."""
+        key = (op, json.dumps(args, sort_keys=True))
+        pending = self._pending_reads.get(key)
+        if pending is not None:
+            pending[1].append(future)
+            self.stats['reads_coalesced'] += 1
+            return
+        if not self._pending_reads:
+            asyncio.get_running_loop().call_soon(self._run_reads)
+        self._pending_reads[key] = (args, [future])
+
+    def _run_reads(self):
+        """Answer every pending query once; runs between write batches."""
+        pending, self._pending_reads = self._pending_reads, {}
+        for (op, _), (args, futures) in pending.items():
+            self.stats['reads'] += 1
+            try:
+                result = _call(self.queries[op], args)
+            except Exception as e:
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            if asyncio.isfuture(result):
+                # Still computing off the loop; answer with the version it was read at
+                result.add_done_callback(
+                    lambda done, futures=futures, version=self.version: _resolve(futures, done, version))
+                continue
+            for future in futures:
+                if not future.done():
+                    future.set_result(result)
+
+    async def _run_writes(self):
+        """The single writer: drain queued mutations in batches and apply them in order."""
+        while True:
+            if self.controller.expire_flows():
+                self.version += 1
+            self.controller.sample_utilization()
+            if self._writes.empty() and self.controller.fast_reroute.suboptimal:
+                # Idle: move flows that failed over onto backups back to their best path, a slice at a time
+                self.controller.reoptimize(max_flows=self.max_write_batch)
+                self.version += 1
+                await asyncio.sleep(0)
+                continue
+            if self.controller.flow_timeouts or self.controller.utilization_history.capacity:
+                # Wake up now and then to expire flows and sample utilization even if no mutation arrives
+                try:
+                    batch = [await asyncio.wait_for(self._writes.get(), EXPIRY_INTERVAL)]
+                except asyncio.TimeoutError:
+                    continue
+            else:
+                batch = [await self._writes.get()]
+            while len(batch) < self.max_write_batch and not self._writes.empty():
+                batch.append(self._writes.get_nowait())
+            self._apply(batch)
+            self.version += 1
+            self.stats['writes'] += len(batch)
+            self.stats['write_batches'] += 1
+            # Let queries answer against the new state before the next batch
+            await asyncio.sleep(0)
+
+    def _apply(self, batch):
+        i = 0
+        while i < len(batch):
+            op, args, future = batch[i]
+            if op != 'add_flow':
+                _settle(future, getattr(self.controller, self.mutations[op]), args)
+                i += 1
+                continue
+            # Admit a run of consecutive add_flow requests as one add_flows batch
+            requests = []
+            futures = []
+            while i < len(batch) and batch[i][0] == 'add_flow':
+                _, args, future = batch[i]
+                try:
+                    requests.append(_flow_args(args))
+                    futures.append(future)
+                except (KeyError, TypeError, ValueError) as e:
+                    future.set_exception(ValueError(f"invalid add_flow arguments: {e}"))
+                i += 1
+            if not requests:
+                continue
+            try:
+                results = self.controller.add_flows(requests)
+            except Exception as e:
+                for future in futures:
+                    future.set_exception(e)
+                continue
+            for future, result in zip(futures, results):
+                future.set_result(result)
+
+    def _compute_path(self, source, destination):
+        return self.controller.compute_shortest_path(source, destination)
+
+    def _k_shortest_paths(self, source, destination, k=3):
+        return self.controller.topology.get_all_paths(source, destination, k=int(k))
+
+    def _list_switches(self):
+        return list(self.controller.topology.get_nodes())
+
+    def _get_flow(self, flow_id):
+        flow = self.controller.active_flows.get(flow_id)
+        return dict(flow) if flow is not None else None
+
+    def _flows_on_link(self, source, destination):
+        return self.controller.link_index.flows_on((source, destination))
+
+    def _lookup_entry(self, switch, source, destination):
+        return self.controller.flow_table.lookup(switch, source, destination)
+
+    def _max_flow(self, source, destination, residual=False):
+        compute = self.controller.max_flow_engine.bind([(source, destination)], bool(residual))
+        return asyncio.get_running_loop().run_in_executor(None, lambda: compute(1)[0])
+
+    def _max_flows(self, pairs, residual=False):
+        # Pairs are checked and the network taken now, between write batches; Dinic runs in a thread
+        compute = self.controller.max_flow_engine.bind(pairs, bool(residual))
+        return asyncio.get_running_loop().run_in_executor(None, compute)
+
+    def _top_links(self, k=20):
+        return [_link_utilization(link, utilization) for link, utilization in self.controller.top_links(k)]
+
+    def _links_above(self, threshold):
+        return [_link_utilization(link, utilization) for link, utilization in self.controller.links_above(threshold)]
+
+    def _link_history(self, source, destination, seconds=None):
+        history = self.controller.utilization_history
+        link = (source, destination)
+        times, values = history.series(link, seconds)
+        summary = history.summary(seconds, links=[link])
+        result = {'times': times, 'utilization': values}
+        if summary['links']:
+            result.update({key: float(summary[key][0]) for key in ('current', 'mean', 'p50', 'p95', 'max', 'trend')})
+        return result
+
+    def _link_stats(self):
+        return [
+            {
+                'source': source,
+                'destination': destination,
+                'bandwidth': stats['bandwidth'],
+                'load': stats['utilization'],
+                'flows': len(stats['flows'])
+            }
+            for (source, destination), stats in self.controller.link_stats.items()
+        ]
+
+
+def _call(func, args):
+    if isinstance(args, dict):
+        return func(**args)
+    return func(*args)
+
+
+class _Deferred:
+    """A query result computed off the loop, with the version of the state it was read from."""
+
+    __slots__ = ('result', 'version')
+
+    def __init__(self, result, version):
+        self.result = result
+        self.version = version
+
+
+def _resolve(futures, done, version):
+    """Settle the requests waiting on a query that finished off the loop."""
+    error = done.exception()
+    for future in futures:
+        if future.done():
+            continue
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(_Deferred(done.result(), version))
+
+
+def _settle(future, func, args):
+    try:
+        future.set_result(_call(func, args))
+    except Exception as e:
+        future.set_exception(e)
+
+
+def _flow_args(args):
+    """Normalize add_flow arguments to a (source, destination, bandwidth, priority, idle, hard timeout) tuple."""
+    if isinstance(args, dict):
+        return (args['source'], args['destination'], float(args['bandwidth']), float(args.get('priority', 0)),
+                float(args.get('idle_timeout', 0)), float(args.get('hard_timeout', 0)))
+    if len(args) == 4:
+        args = (*args, 0, 0)
+    source, destination, bandwidth, priority, idle_timeout, hard_timeout = args
+    return (source, destination, float(bandwidth), float(priority), float(idle_timeout), float(hard_timeout))
+
+
+def _link_utilization(link, utilization):
+    source, destination = link
+    return {'source': source, 'destination': destination, 'utilization': utilization}
+
+
+def serve(controller, host='127.0.0.1', port=None, path=None):
+    """Run the northbound API until interrupted."""
+    async def main():
+        server = NorthboundServer(controller)
+        await server.start(host, port, path)
+        try:
+            await server.serve_forever()
+        finally:
+            await server.close()
+
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
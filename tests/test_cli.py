@@ -0,0 +1,40 @@
+import logging
+
+import pytest
+
+from cli.commands import run_script
+from controller.sdn_controller import SDNController
+
+SCRIPT = [
+    "add_link A B 10",
+    "add_link B C 10",
+    "add_flow A C 1 1",
+    "add_flow C A 1 1",
+    "list_flows",
+]
+
+
+@pytest.fixture
+def controller():
+    return SDNController()
+
+
+def test_batched_flows_run_the_dispatch_hooks(controller, monkeypatch):
+    calls = []
+    for hook in ('expire_flows', 'sample_utilization'):
+        original = getattr(controller, hook)
+        monkeypatch.setattr(controller, hook, lambda original=original, hook=hook: calls.append(hook) or original())
+    assert run_script(controller, SCRIPT) == (5, 0)
+    # Once per command for the two links and list_flows, once for the batch of two flows
+    assert calls.count('expire_flows') == calls.count('sample_utilization') == 4
+    assert len(controller.active_flows) == 2
+
+
+def test_batch_error_is_reported_at_its_first_line(controller, monkeypatch, caplog):
+    def fail(requests):
+        raise RuntimeError("southbound unavailable")
+    monkeypatch.setattr(controller, 'add_flows', fail)
+    with caplog.at_level(logging.ERROR):
+        assert run_script(controller, SCRIPT, stop_on_error=True) == (4, 1)
+    assert [record.getMessage() for record in caplog.records if record.levelno == logging.ERROR] == \
+        ["line 3: southbound unavailable"]
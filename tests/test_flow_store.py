@@ -0,0 +1,132 @@
+import pytest
+
+from controller import flow_store
+from controller.flow_store import FlowStore, normalize_priority
+from controller.graph_core import CompactGraph
+
+SWITCHES = ('s1', 's2', 's3', 's4')
+
+
+@pytest.fixture
+def store():
+    graph = CompactGraph()
+    for switch in SWITCHES:
+        graph.add_node(switch)
+    return FlowStore(graph)
+
+
+def add(store, path, bandwidth=1.0, priority=1, **fields):
+    flow_id = store.allocate_id()
+    store[flow_id] = dict(source=path[0], destination=path[-1], path=list(path), bandwidth=bandwidth,
+                          priority=priority, **fields)
+    return flow_id
+
+
+def test_mapping_round_trip(store):
+    first = add(store, ['s1', 's2', 's3'], bandwidth=2.5, priority=7)
+    second = add(store, ['s4', 's1'], group=9)
+    assert len(store) == 2 and list(store) == [first, second] and list(reversed(store)) == [second, first]
+    assert dict(store[first]) == {'id': first, 'source': 's1', 'destination': 's3', 'path': ['s1', 's2', 's3'],
+                                  'bandwidth': 2.5, 'priority': 7}
+    assert store[second]['group'] == 9 and 'group' not in store[first]
+
+    store[first] = {'bandwidth': 4.0, 'path': ['s1', 's4', 's3']}
+    assert store[first]['bandwidth'] == 4.0 and store[first]['path'] == ['s1', 's4', 's3']
+
+    assert store.pop(second)['group'] == 9
+    assert second not in store and 9 not in store.groups.values()
+    assert store.pop(second, None) is None
+    with pytest.raises(KeyError):
+        store[second]
+    with pytest.raises(KeyError):
+        del store[second]
+    assert list(store.items())[0][1]['destination'] == 's3'
+
+
+@pytest.mark.parametrize('key', ['1', 1.0, True, None, (1,)])
+def test_only_int_ids_are_found(store, key):
+    add(store, ['s1', 's2'])
+    assert key not in store
+    assert store.get(key) is None
+    with pytest.raises(KeyError):
+        store[key]
+
+
+def test_ids_are_not_reused(store):
+    first = add(store, ['s1', 's2'])
+    last = add(store, ['s2', 's3'])
+    del store[last]
+    assert add(store, ['s2', 's3']) > last
+    with pytest.raises(ValueError):
+        store[first + 1] = store.pop(first)
+    store.clear()
+    assert len(store) == 0 and store.allocate_id() > last + 1
+
+
+def test_rows_survive_compaction(store, monkeypatch):
+    monkeypatch.setattr(flow_store, 'COMPACT_MIN', 4)
+    flow_ids = [add(store, ['s1', 's2', 's3'] if i % 2 else ['s4', 's3'], bandwidth=float(i), priority=i)
+                for i in range(20)]
+    view = store[flow_ids[-1]]
+    for flow_id in flow_ids[:15]:
+        del store[flow_id]
+    # Compacted when the 11th deletion left more dead rows than live ones; 4 dead rows remain
+    assert len(store) == 5 and store.stats()['rows'] == 9
+    assert list(store) == flow_ids[15:]
+    assert [store[flow_id]['bandwidth'] for flow_id in store] == [15.0, 16.0, 17.0, 18.0, 19.0]
+    assert view['path'] == ['s1', 's2', 's3'] and view['priority'] == 19
+    view['priority'] = 3
+    assert store[flow_ids[-1]]['priority'] == 3
+
+    new = add(store, ['s2', 's4'])
+    assert new > flow_ids[-1] and list(store)[-1] == new
+    removed = store.remove(flow_ids[15:17] + [flow_ids[0]])
+    assert [(flow_id, path) for flow_id, path, _ in removed] == [(flow_ids[15], ['s1', 's2', 's3']),
+                                                                  (flow_ids[16], ['s4', 's3'])]
+    assert len(store) == 4
+
+
+def test_identical_paths_are_interned(store):
+    first = add(store, ['s1', 's2', 's3'])
+    second = add(store, ('s1', 's2', 's3'))
+    other = add(store, ['s3', 's2', 's1'])
+    assert store.packed_path(first) is store.packed_path(second)
+    assert store.packed_path(first) != store.packed_path(other)
+    assert store.stats()['distinct_paths'] == 2
+
+    del store[first]
+    assert store.stats()['distinct_paths'] == 2
+    store[second]['path'] = ['s3', 's2', 's1']
+    assert store.packed_path(second) is store.packed_path(other)
+    assert store.stats()['distinct_paths'] == 1
+    del store[second], store[other]
+    assert store.path_refs == {}
+
+
+def test_paths_decode_to_switch_ids(store):
+    path = ['s4', 's2', 's1', 's3']
+    packed = store.encode(path)
+    assert len(packed) == 4 * len(path)
+    assert store.decode(packed) == path
+    flow_id = add(store, path)
+    assert store[flow_id]['path'] == path
+    assert store.remove([flow_id]) == [(flow_id, path, 1.0)]
+
+
+def test_load_columns(store):
+    index = store.graph.index
+    paths = [[index['s1'], index['s2']], [index['s3'], index['s4']]]
+    store.load_columns([4, 9], [index['s1'], index['s3']], [index['s2'], index['s4']], [1.0, 2.0], [2.0, 0.5],
+                       paths, groups={9: 1}, next_id=12)
+    assert list(store) == [4, 9]
+    assert store[4]['priority'] == 2 and isinstance(store[4]['priority'], int)
+    assert store[9]['priority'] == 0.5 and store[9]['group'] == 1 and store[9]['path'] == ['s3', 's4']
+    assert store.allocate_id() == 12
+    with pytest.raises(ValueError):
+        store.load_columns([], [], [], [], [], [])
+
+
+@pytest.mark.parametrize('priority, expected', [(3, 3), (3.0, 3), (-2.0, -2), (0.0, 0), (2.5, 2.5)])
+def test_normalize_priority(priority, expected):
+    result = normalize_priority(priority)
+    assert result == expected and type(result) is type(expected)
@@ -0,0 +1,97 @@
+import random
+import time
+
+import pytest
+
+from controller.flow_timeouts import FlowTimeouts, TimingWheel
+from controller.sdn_controller import SDNController
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_timer_beyond_level_zero_cascades_and_fires_on_time():
+    wheel = TimingWheel(tick=0.01)
+    wheel.schedule('flow', 1000.0)  # 100000 ticks: filed on level 2, cascaded down twice
+    assert wheel.advance(999.99) == []
+    assert 'flow' in wheel
+    # Timers never fire early, and at most one tick late
+    assert wheel.advance(1000.0 + wheel.tick) == ['flow']
+    assert len(wheel) == 0
+
+
+def test_timer_beyond_the_top_level_is_refiled():
+    wheel = TimingWheel(tick=1, slots=4, levels=2)  # the levels cover 16 ticks
+    wheel.schedule('far', 40)
+    wheel.schedule('near', 3)
+    assert wheel.advance(39) == ['near']
+    assert wheel.advance(40) == ['far']
+
+
+def test_small_wheel_matches_sorting_deadlines():
+    rng = random.Random(7)
+    wheel = TimingWheel(tick=1, slots=4, levels=3)  # 64 ticks, so timers cascade and re-file often
+    deadlines = {}
+    for key in range(300):
+        deadlines[key] = rng.randint(1, 200)
+        wheel.schedule(key, deadlines[key])
+    for key in rng.sample(sorted(deadlines), 50):
+        if key % 2:
+            wheel.cancel(key)
+            del deadlines[key]
+        else:
+            deadlines[key] = rng.randint(1, 200)
+            wheel.schedule(key, deadlines[key])
+    fired = {}
+    for now in range(0, 205, 3):
+        for key in wheel.advance(now):
+            fired[key] = now
+    assert set(fired) == set(deadlines)
+    # Keys fire at the first advance that reaches their deadline, never before it
+    assert all(deadlines[key] <= now < deadlines[key] + 3 for key, now in fired.items())
+
+
+def test_idle_timer_is_rearmed_after_touch():
+    clock = Clock()
+    timeouts = FlowTimeouts(clock)
+    timeouts.add(1, idle_timeout=5)
+    clock.now = 4.0
+    timeouts.touch([1])
+    clock.now = 5.5
+    assert timeouts.expire() == []  # the timer fired, saw the activity and was filed for 9.0
+    assert 1 in timeouts and len(timeouts.wheel) == 1
+    clock.now = 8.9
+    assert timeouts.expire() == []
+    clock.now = 9.01
+    assert timeouts.expire() == [1]
+    assert timeouts.stats() == {'flows': 0, 'timers': 0, 'expired_idle': 1, 'expired_hard': 0}
+
+
+def test_hard_timeout_fires_despite_activity():
+    clock = Clock()
+    timeouts = FlowTimeouts(clock)
+    timeouts.add(2, idle_timeout=5, hard_timeout=8)
+    for clock.now in (3.0, 6.0, 7.9):
+        timeouts.touch([2])
+        assert timeouts.expire() == []
+    assert timeouts.remaining(2) == (5, pytest.approx(0.1))
+    clock.now = 8.01
+    assert timeouts.expire() == [2]
+    assert timeouts.expired == {'idle': 0, 'hard': 1}
+
+
+def test_remove_flow_cancels_its_timer():
+    controller = SDNController()
+    controller.add_link('a', 'b', 10)
+    flow_id = controller.add_flow('a', 'b', 1, 1, hard_timeout=0.5)
+    kept_id = controller.add_flow('a', 'b', 1, 1, idle_timeout=0.5)
+    controller.remove_flow(flow_id)
+    assert flow_id not in controller.flow_timeouts and flow_id not in controller.flow_timeouts.wheel
+    assert controller.expire_flows(time.monotonic() + 60) == 1
+    assert list(controller.active_flows) == [] and kept_id not in controller.flow_timeouts
+    assert controller.flow_timeouts.expired == {'idle': 1, 'hard': 0}
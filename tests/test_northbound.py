@@ -0,0 +1,39 @@
+import asyncio
+import json
+import threading
+
+from controller.sdn_controller import SDNController
+from northbound.server import NorthboundServer
+
+
+def test_max_flows_runs_off_the_event_loop(monkeypatch):
+    controller = SDNController()
+    controller.add_link('a', 'b', 10)
+    controller.add_link('b', 'c', 10)
+    engine = controller.max_flow_engine
+    release = threading.Event()
+    compute = engine._compute
+    monkeypatch.setattr(engine, '_compute', lambda *args: release.wait(5) and compute(*args))
+
+    async def main():
+        server = NorthboundServer(controller)
+        port = await server.start('127.0.0.1', 0)
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        for request_id, op, args in ((1, 'max_flows', {'pairs': [['a', 'c']]}),
+                                     (2, 'add_link', {'source': 'a', 'destination': 'c', 'bandwidth': 5}),
+                                     (3, 'list_switches', {})):
+            writer.write(json.dumps({'id': request_id, 'op': op, 'args': args}).encode() + b"\n")
+        # The writer and later queries answer while max_flows is still computing
+        replies = [json.loads(await asyncio.wait_for(reader.readline(), 5)) for _ in range(2)]
+        release.set()
+        replies.append(json.loads(await asyncio.wait_for(reader.readline(), 5)))
+        writer.close()
+        await server.close()
+        return replies
+
+    replies = asyncio.run(main())
+    assert [reply['id'] for reply in replies] == [2, 3, 1]
+    assert all(reply['ok'] for reply in replies)
+    # max_flows answers for the state it was read at, before the new link
+    assert replies[2]['result'][0]['max_flow'] == 10
+    assert replies[2]['version'] == 0 < replies[1]['version']
@@ -0,0 +1,58 @@
+import random
+
+import pytest
+
+from controller.partition import PartitionedRouter
+from controller.sdn_controller import SDNController
+
+
+def _cost(topology, path):
+    return sum(1 / topology.edges[link]['bandwidth'] for link in zip(path, path[1:]))
+
+
+@pytest.fixture
+def chain():
+    """A-B-C-D split into domains {A, B} and {C, D}, joined by the border link B-C."""
+    controller = SDNController()
+    for source, destination in (('A', 'B'), ('B', 'C'), ('C', 'D')):
+        controller.add_link(source, destination, 10)
+    controller.partition = PartitionedRouter(controller.topology, regions={'A': 0, 'B': 0, 'C': 1, 'D': 1})
+    yield controller
+    controller.partition.close()
+
+
+def test_direct_link_between_borders(chain):
+    # The only hop crosses domains, so there is no segment to expand
+    assert chain.partition.route_many([('B', 'C')]) == [['B', 'C']]
+    assert chain.add_flow('B', 'C', 1, 1) is not None
+
+
+def test_batch_mixing_direct_and_expanded_paths(chain):
+    assert chain.partition.route_many([('B', 'C'), ('A', 'D'), ('C', 'B')]) == [
+        ['B', 'C'], ['A', 'B', 'C', 'D'], ['C', 'B']]
+
+
+@pytest.mark.parametrize('seed', range(8))
+def test_paths_as_short_as_global_dijkstra(seed):
+    rng = random.Random(seed)
+    switches = [f"s{i}" for i in range(rng.randint(6, 14))]
+    topology_links = {}
+    for i, switch in enumerate(switches[1:], 1):
+        topology_links[(switches[rng.randrange(i)], switch)] = rng.choice([1, 10, 40])
+    for _ in range(len(switches) // 2):
+        source, destination = rng.sample(switches, 2)
+        if (destination, source) not in topology_links:
+            topology_links[(source, destination)] = rng.choice([1, 10, 40])
+    controller = SDNController()
+    for (source, destination), bandwidth in topology_links.items():
+        controller.add_link(source, destination, bandwidth)
+    router = PartitionedRouter(controller.topology, domains=rng.randint(2, 4))
+    try:
+        pairs = [tuple(rng.sample(switches, 2)) for _ in range(30)]
+        for (source, destination), path in zip(pairs, router.route_many(pairs)):
+            expected = controller.topology.get_shortest_path(source, destination)
+            assert path is not None, (source, destination)
+            assert path[0] == source and path[-1] == destination
+            assert _cost(controller.topology, path) == pytest.approx(_cost(controller.topology, expected))
+    finally:
+        router.close()
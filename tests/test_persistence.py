@@ -0,0 +1,45 @@
+import pytest
+
+from controller.sdn_controller import SDNController
+
+
+@pytest.fixture
+def snapshot(tmp_path):
+    """A snapshot of the chain A-B-C with one flow from A to C."""
+    controller = SDNController()
+    controller.add_link('A', 'B', 10)
+    controller.add_link('B', 'C', 4)
+    controller.add_flow('A', 'C', 1, 3)
+    path = str(tmp_path / 'controller.snapshot')
+    controller.save_snapshot(path)
+    return path
+
+
+def test_round_trip_restores_flows(snapshot):
+    controller = SDNController()
+    controller.load_snapshot(snapshot)
+    (flow,) = controller.active_flows.values()
+    assert flow['path'] == ['A', 'B', 'C']
+    assert flow['priority'] == 3 and isinstance(flow['priority'], int)
+    assert controller.flow_table.lookup('B', 'A', 'C')['action']['forward'] == 'C'
+
+
+def test_max_flow_after_load_sees_the_restored_topology(snapshot):
+    controller = SDNController()
+    for residual in (False, True):
+        with pytest.raises(ValueError, match='unknown switch'):
+            controller.max_flow('A', 'C', residual)
+    controller.load_snapshot(snapshot)
+    assert controller.max_flow('A', 'C')['max_flow'] == 4
+    # Residual capacity reflects the restored flow's load
+    assert controller.max_flow('A', 'C', residual=True)['max_flow'] == 3
+
+
+def test_all_pairs_after_load_sees_the_restored_topology(snapshot):
+    controller = SDNController()
+    controller.set_all_pairs_mode('on')
+    controller.load_snapshot(snapshot)
+    controller.topology.all_pairs.wait()
+    assert controller.topology.all_pairs.ready
+    assert controller.compute_shortest_path('A', 'C') == ['A', 'B', 'C']
+    controller.set_all_pairs_mode('off')
@@ -0,0 +1,67 @@
+import threading
+
+import pytest
+
+from benchmarks.generators import generate
+from controller import failure_analysis, max_flow
+from controller.failure_analysis import FailureAnalyzer
+from controller.partition import PartitionedRouter
+from controller.sdn_controller import SDNController
+
+
+@pytest.fixture(scope='module')
+def controller():
+    switches, links = generate('fat_tree', 20, 1)
+    controller = SDNController()
+    for source, destination, bandwidth in links:
+        controller.add_link(source, destination, bandwidth)
+    for source, destination in zip(switches, reversed(switches)):
+        if source != destination:
+            controller.add_flow(source, destination, 1, 1)
+    return controller
+
+
+@pytest.fixture
+def busy_thread(monkeypatch):
+    """A thread that stays alive for the test, so forking would be unsafe."""
+    contexts = []
+    original = failure_analysis.multiprocessing.get_context
+    monkeypatch.setattr(failure_analysis.multiprocessing, 'get_context',
+                        lambda method=None: contexts.append(method) or original(method))
+    done = threading.Event()
+    thread = threading.Thread(target=done.wait)
+    thread.start()
+    yield contexts
+    done.set()
+    thread.join()
+
+
+def test_failure_analysis_does_not_fork_with_threads_running(controller, busy_thread):
+    expected = FailureAnalyzer(controller, processes=1).run()
+    assert FailureAnalyzer(controller, processes=2).run() == expected
+    assert busy_thread and 'fork' not in busy_thread
+
+
+def test_max_flows_does_not_fork_with_threads_running(controller, busy_thread):
+    switches = sorted(controller.topology.nodes)
+    pairs = list(zip(switches, switches[1:]))
+    expected = [max_flow.FlowNetwork(controller.topology.graph).result(source, destination, False)
+                for source, destination in pairs]
+    assert max_flow.MaxFlowEngine(controller, processes=2).max_flows(pairs) == expected
+    assert busy_thread and 'fork' not in busy_thread
+
+
+def test_partitioned_router_does_not_fork_with_threads_running(controller, busy_thread):
+    topology = controller.topology
+    switches = sorted(topology.nodes)
+    pairs = list(zip(switches, reversed(switches)))[:len(switches) // 2]
+    router = PartitionedRouter(topology, domains=2)
+    try:
+        paths = router.route_many(pairs)
+    finally:
+        router.close()
+    assert busy_thread and 'fork' not in busy_thread
+    cost = lambda path: sum(1 / topology.edges[link]['bandwidth'] for link in zip(path, path[1:]))
+    for (source, destination), path in zip(pairs, paths):
+        assert (path[0], path[-1]) == (source, destination)
+        assert cost(path) == pytest.approx(cost(topology.get_shortest_path(source, destination)))